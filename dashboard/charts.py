@@ -0,0 +1,85 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("dashboard")
+
+# Roughly one point per horizontal pixel of a wide chart; more cannot be seen anyway
+DEFAULT_PIXEL_BUDGET = 1200
+MIN_POINTS_PER_SERIES = 3
+DEFAULT_MAX_SLICES = 12
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that preserve the visual shape.
+
+    x must be sorted ascending. The first and last points are always kept.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    # Bucket boundaries over the interior points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        if next_start >= next_end:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+
+        bx, by = x[start:end], y[start:end]
+        areas = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+def downsample_lines(df: pd.DataFrame, x: str, y: str, group: str | None = None,
+                     pixel_budget: int = DEFAULT_PIXEL_BUDGET) -> pd.DataFrame:
+    """Downsamples each line (one per `group` value) with LTTB to fit the pixel budget.
+
+    x is the ordering column (numeric or datetime); the returned rows keep all
+    original columns, so a categorical label can still be used on the axis.
+    Each series' minimum and maximum are always kept so peaks stay exact.
+    """
+    if df.empty:
+        return df
+    groups = [(None, df)] if group is None else list(df.groupby(group, sort=True))
+    per_series = max(MIN_POINTS_PER_SERIES, pixel_budget // max(len(groups), 1))
+
+    parts = []
+    for _, series in groups:
+        series = series.sort_values(x, kind="stable")
+        if len(series) <= per_series:
+            parts.append(series)
+            continue
+        x_values = series[x].to_numpy()
+        if np.issubdtype(x_values.dtype, np.datetime64):
+            x_values = x_values.astype("datetime64[ns]").astype(np.int64)
+        y_values = series[y].to_numpy(dtype=np.float64)
+        keep = lttb_indices(x_values, y_values, per_series)
+        keep = np.union1d(keep, [int(np.nanargmax(y_values)), int(np.nanargmin(y_values))])
+        parts.append(series.iloc[keep])
+
+    result = pd.concat(parts)
+    if len(result) < len(df):
+        logger.debug(f"Downsampled {len(df)} points to {len(result)} for {y}")
+    return result
+
+def bucket_distribution(df: pd.DataFrame, names: str, values: str, max_slices: int = DEFAULT_MAX_SLICES,
+                        other_label: str = "Other") -> pd.DataFrame:
+    """Pre-aggregates a distribution (pie/bar) into at most max_slices buckets; the smallest are merged into one."""
+    totals = df.groupby(names, as_index=False, sort=False)[values].sum().sort_values(values, ascending=False)
+    if len(totals) <= max_slices:
+        return totals.reset_index(drop=True)
+    head = totals.iloc[:max_slices - 1].copy()
+    head[names] = head[names].astype(str)
+    other = pd.DataFrame({names: [other_label], values: [totals.iloc[max_slices - 1:][values].sum()]})
+    return pd.concat([head, other], ignore_index=True)
@@ -0,0 +1,124 @@
+import sys
+import logging
+import argparse
+from pathlib import Path
+import pandas as pd
+from database.connection import get_connection
+
+logger = logging.getLogger("dashboard")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# Seek key; served by idx_fct_air_travel_year_month_fact in either direction
+KEY_COLUMNS = ("year_val", "month_id", "fact_id")
+EXPORT_COLUMNS = "f.fact_id, f.year_val, f.month_id, d.month_name, f.passenger_count, f.created_at"
+MONTHS_SQL = "SELECT month_id, month_name FROM dim_month ORDER BY month_id"
+# Answered from the ends of idx_fct_air_travel_year_month_fact
+YEAR_BOUNDS_SQL = "SELECT MIN(year_val), MAX(year_val) FROM fct_air_travel"
+
+def _where(filters: dict) -> tuple[list[str], list]:
+    """Translates explorer filters into indexed predicates on fct_air_travel."""
+    clauses, params = [], []
+    if filters.get("year_from") is not None:
+        clauses.append("f.year_val >= %s")
+        params.append(int(filters["year_from"]))
+    if filters.get("year_to") is not None:
+        clauses.append("f.year_val <= %s")
+        params.append(int(filters["year_to"]))
+    if filters.get("month_ids"):
+        clauses.append("f.month_id = ANY(%s)")
+        params.append([int(m) for m in filters["month_ids"]])
+    return clauses, params
+
+def _select_sql(clauses: list[str], descending: bool) -> str:
+    direction = "DESC" if descending else "ASC"
+    return f"""
+        SELECT {EXPORT_COLUMNS}
+        FROM fct_air_travel f
+        JOIN dim_month d ON d.month_id = f.month_id
+        {"WHERE " + " AND ".join(clauses) if clauses else ""}
+        ORDER BY f.year_val {direction}, f.month_id {direction}, f.fact_id {direction}
+    """
+
+def filter_options(conn) -> tuple[pd.DataFrame, tuple[int, int] | None]:
+    """The explorer's month choices (from dim_month) and year bounds, without reading the fact table.
+
+    Returns (months, (min_year, max_year)); the bounds are None while the table is empty.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(MONTHS_SQL)
+        months = pd.DataFrame(cur.fetchall(), columns=["month_id", "month_name"])
+        cur.execute(YEAR_BOUNDS_SQL)
+        low, high = cur.fetchone()
+    finally:
+        cur.close()
+    return months, None if low is None else (int(low), int(high))
+
+def page_query(filters: dict | None, after: tuple | None, descending: bool, page_size: int) -> tuple[str, list]:
+    """SQL and parameters of one explorer page: the rows after the seek key `after`, plus one."""
+    clauses, params = _where(filters or {})
+    if after is not None:
+        clauses.append(f"(f.year_val, f.month_id, f.fact_id) {'<' if descending else '>'} (%s, %s, %s)")
+        params.extend(after)
+    # One extra row tells whether another page exists without a COUNT(*)
+    return _select_sql(clauses, descending) + " LIMIT %s", params + [page_size + 1]
+
+def fetch_page(conn, filters: dict | None = None, after: tuple | None = None, descending: bool = False,
+               page_size: int = DEFAULT_PAGE_SIZE) -> tuple[pd.DataFrame, tuple | None]:
+    """Returns one page of facts after the seek key `after`, plus the key to request the next page (None on the last page).
+
+    Cost depends only on page_size: the row-value comparison lets PostgreSQL start the
+    index scan at the previous page's last key instead of counting through an OFFSET.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    sql, params = page_query(filters, after, descending, page_size)
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        columns = [c[0] for c in cur.description]
+    finally:
+        cur.close()
+
+    df = pd.DataFrame(rows[:page_size], columns=columns)
+    next_key = None
+    if len(rows) > page_size:
+        last = df.iloc[-1]
+        next_key = tuple(int(last[c]) for c in KEY_COLUMNS)
+    return df, next_key
+
+def copy_csv(conn, out, filters: dict | None = None, descending: bool = False):
+    """Streams every matching fact as CSV into a binary file object via COPY, in constant memory."""
+    clauses, params = _where(filters or {})
+    cur = conn.cursor()
+    try:
+        query = cur.mogrify(_select_sql(clauses, descending), params).decode()
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+    finally:
+        cur.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export fct_air_travel as CSV via COPY (streamed, constant memory).")
+    parser.add_argument("--output", type=Path, help="CSV path (default: stdout)")
+    parser.add_argument("--year-from", type=int)
+    parser.add_argument("--year-to", type=int)
+    parser.add_argument("--month-id", type=int, action="append", dest="month_ids")
+    parser.add_argument("--desc", action="store_true")
+    args = parser.parse_args()
+
+    filters = {"year_from": args.year_from, "year_to": args.year_to, "month_ids": args.month_ids}
+    conn = get_connection()
+    try:
+        if args.output:
+            with open(args.output, "wb") as f:
+                copy_csv(conn, f, filters, args.desc)
+            logger.info(f"Exported fct_air_travel to {args.output}")
+        else:
+            copy_csv(conn, sys.stdout.buffer, filters, args.desc)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
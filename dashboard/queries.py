@@ -0,0 +1,27 @@
+# Dashboard queries, shared by app.py and streamlit_app.py and planned by scripts/explain_queries.py
+
+WAREHOUSE_DATA_SQL = """
+    SELECT d.month_id, d.month_name, f.year_val, f.passenger_count
+    FROM fct_air_travel f
+    JOIN dim_month d ON f.month_id = d.month_id
+    ORDER BY f.year_val, d.month_id;
+"""
+
+# Headline metrics aggregated in the database, so the page never holds the fact table
+WAREHOUSE_SUMMARY_SQL = "SELECT COALESCE(SUM(passenger_count), 0) AS total_passengers, COUNT(*) AS row_count FROM fct_air_travel"
+
+RUN_HISTORY_SQL = "SELECT * FROM pipeline_run_history ORDER BY start_time DESC LIMIT 10"
+
+INGESTION_STATUS_SQL = "SELECT status, COUNT(*) as count FROM ingestion_log GROUP BY status"
+
+# Column statistics computed at ingestion time; no raw_records scan needed
+PROFILE_HISTORY_SQL = """
+    SELECT p.ingestion_id, p.source_name, p.created_at, c.key AS column_name,
+           (c.value->>'null_fraction')::float AS null_fraction,
+           (c.value->>'distinct')::bigint AS distinct_count,
+           (c.value->'quantiles'->>'p50')::float AS median,
+           p.dq_validated_at IS NOT NULL AS validated
+    FROM (SELECT * FROM ingestion_profile ORDER BY ingestion_id DESC LIMIT %s) p
+    CROSS JOIN LATERAL jsonb_each(p.profile->'columns') c
+    ORDER BY p.ingestion_id, c.key;
+"""
@@ -1,10 +1,15 @@
 import os
+import time
 import logging
+import threading
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
 import streamlit as st
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
+from monitoring.metrics import CONNECTION_ACQUIRE
 
 # Configure Logging
 logging.basicConfig(
@@ -42,9 +47,80 @@ def load_validated_env():
     
     return {v: os.getenv(v) for v in required_vars}
 
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection whose close() hands it back to the pool, so callers keep the get/close pattern."""
+
+    _pool = None
+    _returning = False
+
+    def close(self):
+        pool = self._pool
+        if pool is None or self._returning or getattr(pool, "shutting_down", False) or self.closed:
+            return super().close()
+        self._returning = True
+        try:
+            # Leave no session state behind: open transaction, autocommit, SET values, advisory locks
+            self.rollback()
+            self.autocommit = True
+            with self.cursor() as cur:
+                cur.execute("DISCARD ALL")
+            self.autocommit = False
+            pool.putconn(self)
+        except Exception:
+            pool.putconn(self, close=True)
+        finally:
+            self._returning = False
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def init_pool(minconn: int = 1, maxconn: int = 8):
+    """Keeps up to maxconn warm connections for get_connection() (used by the long-running scheduler)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            return
+        creds = load_validated_env()
+        _pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn, maxconn,
+            host=creds["DB_HOST"],
+            port=creds["DB_PORT"],
+            dbname=creds["DB_NAME"],
+            user=creds["DB_USER"],
+            password=creds["DB_PASSWORD"],
+            sslmode="require",
+            connect_timeout=10,
+            # TCP keepalives stop idle pooled connections from being dropped by NATs/proxies
+            keepalives=1,
+            keepalives_idle=60,
+            connection_factory=PooledConnection,
+        )
+        logger.info(f"Connection pool ready ({minconn}-{maxconn} connections).")
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            return
+        _pool.shutting_down = True
+        _pool.closeall()
+        _pool = None
+
 def get_connection():
-    """Returns a production-ready PostgreSQL connection."""
+    """Returns a production-ready PostgreSQL connection (from the pool when one is initialized)."""
     try:
+        started = time.perf_counter()
+        if _pool is not None:
+            conn = _pool.getconn()
+            conn._pool = _pool
+            if conn.closed:
+                # Dropped while idle in the pool; replace it
+                _pool.putconn(conn, close=True)
+                conn = _pool.getconn()
+                conn._pool = _pool
+            CONNECTION_ACQUIRE.observe(time.perf_counter() - started)
+            return conn
+
         creds = load_validated_env()
         # Connect using keyword arguments for better flexibility with SSL
         conn = psycopg2.connect(
@@ -56,6 +132,7 @@ def get_connection():
             sslmode="require",
             connect_timeout=10
         )
+        CONNECTION_ACQUIRE.observe(time.perf_counter() - started)
         return conn
     except Exception as e:
         logger.error(f"Failed to connect to database: {e}")
@@ -80,7 +157,8 @@ def log_pipeline_start(pipeline_name: str):
         cur.close()
         conn.close()
 
-def log_pipeline_end(run_id: int, status: str, error_message: str = None):
+def log_pipeline_end(run_id: int, status: str, error_message: str = None, lock_wait_seconds: float = None,
+                     unchanged_stages: str = None):
     """Logs the end of a pipeline run."""
     if run_id is None:
         return
@@ -98,10 +176,11 @@ def log_pipeline_end(run_id: int, status: str, error_message: str = None):
         cur.execute(
             """
             UPDATE pipeline_run_history 
-            SET end_time = %s, duration_seconds = %s, status = %s, error_message = %s 
+            SET end_time = %s, duration_seconds = %s, status = %s, error_message = %s, lock_wait_seconds = %s,
+                unchanged_stages = %s
             WHERE run_id = %s
             """,
-            (end_time, duration, status, error_message, run_id)
+            (end_time, duration, status, error_message, lock_wait_seconds, unchanged_stages, run_id)
         )
         conn.commit()
     except Exception as e:
@@ -0,0 +1,62 @@
+import json
+import hashlib
+import logging
+from pathlib import Path
+from database.connection import get_connection
+
+logger = logging.getLogger("fingerprints")
+
+def code_version(*modules) -> str:
+    """Hash of the modules' source files, so a logic change invalidates the memoized results of a stage."""
+    sha256_hash = hashlib.sha256()
+    for module in modules:
+        sha256_hash.update(Path(module.__file__).read_bytes())
+    return sha256_hash.hexdigest()[:16]
+
+def fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def stored_fingerprint(stage: str) -> str | None:
+    """Fingerprint of the stage's last successful run."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT fingerprint FROM stage_fingerprint WHERE stage_name = %s", (stage,))
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        cur.close()
+        conn.close()
+
+def store_fingerprint(stage: str, value: str):
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO stage_fingerprint (stage_name, fingerprint, updated_at)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (stage_name) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, updated_at = EXCLUDED.updated_at
+            """,
+            (stage, value)
+        )
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def run_if_changed(stage: str, compute_fingerprint, stats: dict, func, *args, force: bool = False) -> bool:
+    """Runs func(*args) unless the stage's inputs fingerprint to the same value as its last successful run.
+
+    Meant to be called while holding the stage's locks, so the inputs cannot change
+    between fingerprinting and running. Unchanged stages are added to stats["unchanged"].
+    Returns True if func ran.
+    """
+    value = compute_fingerprint()
+    if not force and value == stored_fingerprint(stage):
+        logger.info(f"Inputs of {stage} are unchanged since its last successful run; skipping.")
+        stats["unchanged"].append(stage)
+        return False
+    func(*args)
+    store_fingerprint(stage, value)
+    return True
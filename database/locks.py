@@ -0,0 +1,92 @@
+import time
+import logging
+from contextlib import contextmanager
+import psycopg2.errors
+from database.connection import get_connection
+
+logger = logging.getLogger("locks")
+
+LOCK_MODES = ("wait", "skip")
+
+class LockNotAcquired(Exception):
+    """Raised when a lock is held by another run and the mode is 'skip' (or the wait timed out)."""
+
+def dataset_lock(dataset_name: str) -> str:
+    return f"dataset:{dataset_name}"
+
+def table_lock(table_name: str) -> str:
+    return f"table:{table_name}"
+
+class AdvisoryLockSet:
+    """Session-level advisory locks held on a dedicated connection for the duration of a `with` block."""
+
+    def __init__(self, names: list[str]):
+        # Always acquired in sorted order, so two runs needing overlapping sets cannot deadlock
+        self.names = sorted(set(names))
+        self.wait_seconds = 0.0
+
+@contextmanager
+def advisory_locks(names: list[str], mode: str = "wait", timeout_seconds: float | None = None):
+    """Holds PostgreSQL advisory locks for the given names (e.g. 'dataset:x', 'table:y').
+
+    mode='wait' blocks until the locks are free (up to timeout_seconds if given);
+    mode='skip' raises LockNotAcquired immediately if any lock is taken.
+    The lock connection is separate from the work connections, so the locks
+    survive the many commits made inside the block and are released even if
+    the process dies (the session ends).
+    """
+    if mode not in LOCK_MODES:
+        raise ValueError(f"Unsupported lock mode '{mode}'. Expected one of {LOCK_MODES}.")
+
+    lock_set = AdvisoryLockSet(names)
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        if timeout_seconds:
+            cur.execute("SET lock_timeout = %s", (f"{int(timeout_seconds * 1000)}ms",))
+
+        started = time.monotonic()
+        for name in lock_set.names:
+            if mode == "skip":
+                cur.execute("SELECT pg_try_advisory_lock(hashtextextended(%s, 0))", (name,))
+                if not cur.fetchone()[0]:
+                    raise LockNotAcquired(f"Lock {name} is held by another run.")
+            else:
+                try:
+                    cur.execute("SELECT pg_advisory_lock(hashtextextended(%s, 0))", (name,))
+                except psycopg2.errors.LockNotAvailable as e:
+                    raise LockNotAcquired(f"Timed out after {timeout_seconds}s waiting for lock {name}.") from e
+        lock_set.wait_seconds = time.monotonic() - started
+
+        if lock_set.wait_seconds >= 1:
+            logger.info(f"Acquired {lock_set.names} after waiting {lock_set.wait_seconds:.1f}s")
+        yield lock_set
+    finally:
+        try:
+            cur.execute("SELECT pg_advisory_unlock_all()")
+        except Exception:
+            pass  # Closing the session releases them anyway
+        cur.close()
+        conn.close()
+
+def lock_settings(config: dict, mode_override: str | None = None) -> tuple[str, float | None]:
+    """Reads the `locking` section of config.yaml as (mode, timeout_seconds)."""
+    locking = config.get("locking", {})
+    return mode_override or locking.get("mode", "wait"), locking.get("timeout_seconds")
+
+def new_lock_stats() -> dict:
+    # "unchanged" collects stages skipped by input fingerprint (database.fingerprints.run_if_changed)
+    return {"lock_wait_seconds": 0.0, "skipped": [], "unchanged": []}
+
+def run_locked(names: list[str], stats: dict, func, *args, mode: str = "wait", timeout_seconds: float | None = None) -> bool:
+    """Runs func(*args) while holding the named locks. Returns False if the work was skipped because of a lock."""
+    try:
+        with advisory_locks(names, mode, timeout_seconds) as locks:
+            stats["lock_wait_seconds"] += locks.wait_seconds
+            func(*args)
+        return True
+    except LockNotAcquired as e:
+        logger.warning(f"Skipping work guarded by {sorted(names)}: {e}")
+        stats["skipped"].append(", ".join(sorted(names)))
+        return False
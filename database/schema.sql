@@ -6,20 +6,34 @@ CREATE TABLE IF NOT EXISTS ingestion_log (
     source_name VARCHAR(100) NOT NULL,
     file_name VARCHAR(255) NOT NULL,
     file_hash VARCHAR(64) NOT NULL,
-    status VARCHAR(20) NOT NULL, -- SUCCESS, FAILED, SKIPPED
+    status VARCHAR(20) NOT NULL, -- IN_PROGRESS, SUCCESS, FAILED, SKIPPED
     records_count INTEGER DEFAULT 0,
+    rows_committed BIGINT DEFAULT 0, -- Checkpointed row offset for resumable loads
     notes TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP,
+    completed_at TIMESTAMP -- Set when status becomes SUCCESS; staging only reads completed batches
 );
 
 -- 2. Raw Records Table (JSONB Storage - Immutable Raw Layer)
 CREATE TABLE IF NOT EXISTS raw_records (
     id SERIAL PRIMARY KEY,
     source_name VARCHAR(100) NOT NULL,
+    ingestion_id INTEGER REFERENCES ingestion_log(id),
     record JSONB NOT NULL,
     ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 2b. Column Profiles (one per successful ingestion, computed while streaming)
+CREATE TABLE IF NOT EXISTS ingestion_profile (
+    ingestion_id INTEGER PRIMARY KEY REFERENCES ingestion_log(id) ON DELETE CASCADE,
+    source_name VARCHAR(100) NOT NULL,
+    row_count BIGINT NOT NULL,
+    profile JSONB NOT NULL, -- {"rows": n, "columns": {col: {kind, nulls, null_fraction, min, max, distinct, quantiles}}}
+    dq_validated_at TIMESTAMP, -- Set once staging DQ accepted the batch; validated profiles form the baseline
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- 3. Staging Table (Structured Layer)
 CREATE TABLE IF NOT EXISTS stg_airtravel (
     stg_id SERIAL PRIMARY KEY,
@@ -38,13 +52,15 @@ CREATE TABLE IF NOT EXISTS dim_month (
 );
 
 -- Fact Table: Air Travel
+-- Range-partitioned by year; the warehouse loader creates fct_air_travel_y<year> partitions on demand
 CREATE TABLE IF NOT EXISTS fct_air_travel (
-    fact_id SERIAL PRIMARY KEY,
+    fact_id SERIAL,
     month_id INTEGER REFERENCES dim_month(month_id),
     year_val INTEGER NOT NULL,
     passenger_count INTEGER,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fact_id, year_val) -- Unique keys on a partitioned table must include the partition key
+) PARTITION BY RANGE (year_val);
 
 -- 5. Pipeline Monitoring Table
 CREATE TABLE IF NOT EXISTS pipeline_run_history (
@@ -53,11 +69,103 @@ CREATE TABLE IF NOT EXISTS pipeline_run_history (
     start_time TIMESTAMP NOT NULL,
     end_time TIMESTAMP,
     duration_seconds FLOAT,
-    status VARCHAR(20) NOT NULL, -- RUNNING, SUCCESS, FAILED
-    error_message TEXT
+    status VARCHAR(20) NOT NULL, -- RUNNING, SUCCESS, FAILED, SKIPPED
+    error_message TEXT,
+    lock_wait_seconds FLOAT, -- Time spent waiting for advisory locks held by overlapping runs
+    unchanged_stages TEXT -- Stages skipped because their input fingerprint matched their last successful run
+);
+
+-- 6. ETL Watermarks (last processed source id per incremental target)
+CREATE TABLE IF NOT EXISTS etl_watermark (
+    target_name VARCHAR(100) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 7. Work Queue (per-dataset pipeline tasks claimed by any number of workers)
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    task VARCHAR(20) NOT NULL, -- ingestion, staging, warehouse
+    dataset_name VARCHAR(100), -- NULL for the warehouse task
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING', -- PENDING, RUNNING, SUCCESS, FAILED, SUPERSEDED (folded into a pending duplicate)
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- Retry backoff
+    worker_id VARCHAR(100),
+    lease_expires_at TIMESTAMP, -- Pushed forward by worker heartbeats; an expired lease is re-queued
+    heartbeat_at TIMESTAMP,
+    run_id INTEGER, -- pipeline_run_history entry of the latest attempt
+    error_message TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- 8. Backfill Checkpoints (batch ranges of an in-progress rebuild; deleted once swapped in)
+CREATE TABLE IF NOT EXISTS backfill_range (
+    target_name VARCHAR(100) NOT NULL, -- Staging table being rebuilt into its _shadow copy
+    source_name VARCHAR(100) NOT NULL,
+    lo_id BIGINT NOT NULL, -- ingestion_log.id span [lo_id, hi_id) of the range's batches
+    hi_id BIGINT NOT NULL,
+    ingestion_ids INTEGER[], -- SUCCESS batches whose raw rows the range loads; each batch is in one range
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING', -- PENDING, DONE
+    rows_loaded BIGINT DEFAULT 0,
+    finished_at TIMESTAMP,
+    PRIMARY KEY (target_name, lo_id)
+);
+
+-- 9. Stage Fingerprints (inputs + code version of each stage's last successful run)
+CREATE TABLE IF NOT EXISTS stage_fingerprint (
+    stage_name VARCHAR(150) PRIMARY KEY, -- e.g. staging:air_travel_stats, warehouse:fct_air_travel
+    fingerprint VARCHAR(64) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Indexes for performance
-CREATE INDEX IF NOT EXISTS idx_raw_records_source ON raw_records(source_name);
+-- 10. DQ Quarantine (raw rows rejected by staging DQ; the valid rows of their batch still load)
+CREATE TABLE IF NOT EXISTS dq_rejects (
+    reject_id BIGSERIAL PRIMARY KEY,
+    raw_id BIGINT NOT NULL UNIQUE, -- raw_records.id; one entry per rejected row (its first failed rule)
+    ingestion_id INTEGER REFERENCES ingestion_log(id) ON DELETE CASCADE,
+    source_name VARCHAR(100) NOT NULL,
+    target_table VARCHAR(100) NOT NULL,
+    rule VARCHAR(50) NOT NULL, -- missing_column, null_required, non_numeric
+    column_name VARCHAR(255),
+    value TEXT, -- Offending value, if any
+    record JSONB NOT NULL, -- Copy of the raw record, kept when raw_records is purged
+    rejected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Upgrades: CREATE TABLE IF NOT EXISTS leaves existing tables untouched, so columns added since
+-- a table was first created are added here (idempotent; runs before the indexes that use them)
+ALTER TABLE backfill_range ADD COLUMN IF NOT EXISTS ingestion_ids INTEGER[];
+ALTER TABLE ingestion_log ADD COLUMN IF NOT EXISTS rows_committed BIGINT DEFAULT 0;
+ALTER TABLE ingestion_log ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+ALTER TABLE ingestion_log ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP;
+ALTER TABLE raw_records ADD COLUMN IF NOT EXISTS ingestion_id INTEGER REFERENCES ingestion_log(id);
+ALTER TABLE pipeline_run_history ADD COLUMN IF NOT EXISTS lock_wait_seconds FLOAT;
+ALTER TABLE pipeline_run_history ADD COLUMN IF NOT EXISTS unchanged_stages TEXT;
+
+-- Indexes for performance (verified with scripts/explain_queries.py)
+CREATE INDEX IF NOT EXISTS idx_raw_records_source_ingested ON raw_records(source_name, ingested_at);
 CREATE INDEX IF NOT EXISTS idx_ingestion_log_status ON ingestion_log(status);
 CREATE INDEX IF NOT EXISTS idx_ingestion_log_hash ON ingestion_log(file_hash);
+CREATE INDEX IF NOT EXISTS idx_raw_records_ingestion ON raw_records(ingestion_id);
+CREATE INDEX IF NOT EXISTS idx_ingestion_log_source_completed ON ingestion_log(source_name, status, completed_at);
+CREATE INDEX IF NOT EXISTS idx_ingestion_log_resumable ON ingestion_log(source_name, id)
+    WHERE status IN ('IN_PROGRESS', 'FAILED') AND rows_committed > 0;
+CREATE INDEX IF NOT EXISTS idx_ingestion_profile_baseline ON ingestion_profile(source_name, ingestion_id DESC)
+    WHERE dq_validated_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_stg_airtravel_loaded_at ON stg_airtravel(loaded_at);
+CREATE INDEX IF NOT EXISTS idx_fct_air_travel_month_year ON fct_air_travel(month_id, year_val);
+-- Explorer seek key and dashboard order; INCLUDE makes both index-only scans
+CREATE INDEX IF NOT EXISTS idx_fct_air_travel_year_month_fact ON fct_air_travel(year_val, month_id, fact_id)
+    INCLUDE (passenger_count, created_at);
+-- Facts are appended in created_at order, so a BRIN summary per block range is tiny and still prunes time filters
+CREATE INDEX IF NOT EXISTS idx_fct_air_travel_created_brin ON fct_air_travel USING BRIN (created_at) WITH (autosummarize = on);
+CREATE INDEX IF NOT EXISTS idx_pipeline_run_history_start ON pipeline_run_history(start_time);
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_claim ON pipeline_jobs(run_after, job_id) WHERE status = 'PENDING';
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_lease ON pipeline_jobs(lease_expires_at) WHERE status = 'RUNNING';
+-- At most one pending job per task and dataset, so repeated enqueues and stage fan-in collapse
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pipeline_jobs_pending ON pipeline_jobs(task, (COALESCE(dataset_name, '')))
+    WHERE status = 'PENDING';
+CREATE INDEX IF NOT EXISTS idx_dq_rejects_source_rejected ON dq_rejects(source_name, rejected_at);
@@ -0,0 +1,199 @@
+import re
+import time
+import logging
+import psycopg2.errors
+
+logger = logging.getLogger("shadow")
+
+SHADOW_SUFFIX = "_shadow"
+DEFAULT_SWAP_LOCK_TIMEOUT_MS = 2000
+DEFAULT_SWAP_ATTEMPTS = 10
+
+def shadow_name(table: str) -> str:
+    return f"{table}{SHADOW_SUFFIX}"
+
+def is_partitioned(cur, table: str) -> bool:
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", (table,))
+    return cur.fetchone()[0]
+
+def create_shadow(cur, table: str, replace: bool = True, unlogged: bool = False) -> str:
+    """Creates an empty copy of `table` (columns, defaults, CHECK/NOT NULL) without indexes or keys.
+
+    Defaults are shared, so serial columns keep drawing from the live table's sequence
+    and rows loaded into the shadow get ids above every existing one. A partitioned
+    table gets a partitioned shadow with the same key; its partitions are up to the caller.
+    An unlogged shadow (not possible for partitioned tables) skips WAL while loading and
+    must be made durable with set_logged before it is swapped in.
+    """
+    shadow = shadow_name(table)
+    if replace:
+        cur.execute(f"DROP TABLE IF EXISTS {shadow}")
+    partition_by = ""
+    if is_partitioned(cur, table):
+        cur.execute("SELECT pg_get_partkeydef(%s::regclass)", (table,))
+        partition_by = f" PARTITION BY {cur.fetchone()[0]}"
+        unlogged = False
+    kind = "UNLOGGED TABLE" if unlogged else "TABLE"
+    cur.execute(f"CREATE {kind} IF NOT EXISTS {shadow} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){partition_by}")
+    return shadow
+
+def set_logged(cur, table: str):
+    """Makes an unlogged shadow durable: one sequential WAL write of the finished heap instead of a record per row.
+
+    Run before build_indexes, so the indexes are written once instead of rewritten with the heap.
+    """
+    shadow = shadow_name(table)
+    cur.execute("SELECT relpersistence = 'u' FROM pg_class WHERE oid = %s::regclass", (shadow,))
+    if cur.fetchone()[0]:
+        cur.execute(f"ALTER TABLE {shadow} SET LOGGED")
+
+def shadow_exists(cur, table: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (shadow_name(table),))
+    return cur.fetchone()[0]
+
+def shadow_indexed(cur, table: str) -> bool:
+    """Whether build_indexes already ran on the table's shadow."""
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_index WHERE indrelid = %s::regclass)", (shadow_name(table),))
+    return cur.fetchone()[0]
+
+def build_indexes(cur, table: str):
+    """Recreates the live table's primary/unique keys, indexes and foreign keys on its shadow.
+
+    Run once after the shadow is loaded: building an index over the finished table is far
+    cheaper than maintaining it row by row. Foreign keys are added NOT VALID where PostgreSQL
+    allows it (not on partitioned tables) and validated after the swap, outside its locks.
+    """
+    shadow = shadow_name(table)
+    cur.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u')",
+        (table,)
+    )
+    for constraint_name, constraint_def in cur.fetchall():
+        # The key's index takes the constraint's name
+        cur.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {shadow_name(constraint_name)} {constraint_def}")
+
+    cur.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(x.indexrelid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid AND c.contype IN ('p', 'u'))
+        ORDER BY i.relname
+        """,
+        (table,)
+    )
+    for index_name, index_def in cur.fetchall():
+        # "CREATE [UNIQUE] INDEX name ON [ONLY] schema.table USING ..." -> same index on the shadow (and its partitions)
+        shadow_def = re.sub(
+            r"^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+ ",
+            lambda m: f"CREATE {m.group(1) or ''}INDEX {shadow_name(index_name)} ON {shadow} ",
+            index_def,
+        )
+        cur.execute(shadow_def)
+
+    not_valid = "" if is_partitioned(cur, table) else " NOT VALID"
+    cur.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        (table,)
+    )
+    for constraint_name, constraint_def in cur.fetchall():
+        cur.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {shadow_name(constraint_name)} {constraint_def}{not_valid}")
+    cur.execute(f"ANALYZE {shadow}")
+
+def swap_in(cur, table: str) -> list[str]:
+    """Replaces `table` with its shadow inside the caller's transaction; returns NOT VALID foreign keys to validate.
+
+    The exclusive lock is held only for the catalog changes, and readers see either the
+    old or the new table, never an empty or half-loaded one.
+    """
+    shadow = shadow_name(table)
+    cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+
+    # Serial sequences are owned by the old table's columns and would be dropped with it
+    cur.execute(
+        """
+        SELECT a.attname, pg_get_serial_sequence(%s, a.attname)
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        """,
+        (table, table)
+    )
+    for column, sequence in cur.fetchall():
+        if sequence:
+            cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {shadow}.{column}")
+
+    cur.execute(f"DROP TABLE {table}")
+    cur.execute(f"ALTER TABLE {shadow} RENAME TO {table}")
+
+    # Partitions were named after the shadow (e.g. <table>_shadow_y1958)
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+        (table,)
+    )
+    for (partition,) in cur.fetchall():
+        if partition.startswith(shadow):
+            cur.execute(f"ALTER TABLE {partition} RENAME TO {table}{partition[len(shadow):]}")
+
+    # Give indexes and constraints back their original names
+    cur.execute(
+        "SELECT i.relname FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid WHERE x.indrelid = %s::regclass",
+        (table,)
+    )
+    for (index_name,) in cur.fetchall():
+        if index_name.endswith(SHADOW_SUFFIX):
+            # Renaming an index that backs a key constraint renames the constraint too
+            cur.execute(f"ALTER INDEX {index_name} RENAME TO {index_name[:-len(SHADOW_SUFFIX)]}")
+    cur.execute("SELECT conname, contype, convalidated FROM pg_constraint WHERE conrelid = %s::regclass", (table,))
+    foreign_keys = []
+    for constraint_name, constraint_type, validated in cur.fetchall():
+        original = constraint_name[:-len(SHADOW_SUFFIX)] if constraint_name.endswith(SHADOW_SUFFIX) else constraint_name
+        if original != constraint_name:
+            cur.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {constraint_name} TO {original}")
+        if constraint_type == "f" and not validated:
+            foreign_keys.append(original)
+    logger.info(f"Swapped {shadow} in as {table}")
+    return foreign_keys
+
+def swap_in_when_idle(conn, table: str, lock_timeout_ms: int = DEFAULT_SWAP_LOCK_TIMEOUT_MS,
+                      attempts: int = DEFAULT_SWAP_ATTEMPTS) -> list[str]:
+    """Commits swap_in in its own short transaction, backing off while readers hold the table.
+
+    A swap queued behind a long dashboard query would block every new reader of the
+    table until it ran; with a lock_timeout it gives up instead and retries later, so
+    readers wait at most lock_timeout_ms. Returns swap_in's NOT VALID foreign keys.
+    """
+    return swap_all_when_idle(conn, [table], lock_timeout_ms, attempts)[table]
+
+def swap_all_when_idle(conn, tables: list[str], lock_timeout_ms: int = DEFAULT_SWAP_LOCK_TIMEOUT_MS,
+                       attempts: int = DEFAULT_SWAP_ATTEMPTS, on_swapped=None) -> dict[str, list[str]]:
+    """swap_in_when_idle for several tables at once: all swap in one short transaction, in the given order.
+
+    on_swapped(cur), if given, runs in the same transaction after the swaps, so state that
+    must move with the new tables (a watermark, a finished plan) commits atomically with them.
+    Returns each table's NOT VALID foreign keys.
+    """
+    cur = conn.cursor()
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                cur.execute("SET LOCAL lock_timeout = %s", (f"{lock_timeout_ms}ms",))
+                foreign_keys = {table: swap_in(cur, table) for table in tables}
+                if on_swapped:
+                    on_swapped(cur)
+                conn.commit()
+                return foreign_keys
+            except psycopg2.errors.LockNotAvailable:
+                conn.rollback()
+                if attempt == attempts:
+                    raise
+                delay = min(2 ** (attempt - 1), 30)
+                logger.warning(f"{', '.join(tables)} busy; retrying the swap in {delay}s ({attempt}/{attempts})")
+                time.sleep(delay)
+    finally:
+        cur.close()
+
+def validate_foreign_keys(cur, table: str, foreign_keys: list[str]):
+    """Validates NOT VALID foreign keys; only takes a SHARE UPDATE EXCLUSIVE lock, so readers and writers continue."""
+    for constraint_name in foreign_keys:
+        cur.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint_name}")
@@ -1,13 +1,23 @@
 import os
+import re
+import json
+import time
+import random
 import hashlib
 import logging
 import requests
+from functools import partial
 import yaml
-import pandas as pd
 from datetime import datetime
 from pathlib import Path
-from ingestion.loader import insert_batch_raw, log_ingestion_status
-from database.connection import check_file_hash_exists
+from database.connection import get_connection
+from database.locks import dataset_lock, lock_settings, new_lock_stats, run_locked
+from monitoring.metrics import DOWNLOAD_BYTES, DOWNLOAD_THROUGHPUT, PARSED_ROWS, PARSE_THROUGHPUT
+from ingestion.loader import DEFAULT_CHECKPOINT_ROWS, IngestionUnitOfWork
+from ingestion.local_files import ingest_local_files, ingested_hashes, is_local_source
+from ingestion.pipeline import DEFAULT_QUEUE_SIZE, IngestionPipeline
+from ingestion.profiler import DEFAULT_HLL_PRECISION, DEFAULT_SKETCH_K, StreamingProfiler
+from ingestion.readers import DEFAULT_BATCH_SIZE, iter_record_batches, parse_settings, split_file_type
 
 # Configure logging to file and console
 log_dir = Path("logs")
@@ -23,6 +33,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ingestion")
 
+# Shared session: keeps TLS connections to sources alive across runs in daemon mode
+_http = requests.Session()
+
 def calculate_sha256(file_path: str) -> str:
     """Calculates SHA256 hash of a file."""
     sha256_hash = hashlib.sha256()
@@ -31,97 +44,329 @@ def calculate_sha256(file_path: str) -> str:
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
-def download_file(url: str, dest_path: Path):
-    """Downloads file from URL with timeout."""
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 1.0
+
+class DownloadError(Exception):
+    """Non-retryable download failure (e.g. the source changed mid-transfer)."""
+
+class DuplicateFile(Exception):
+    """The file was already ingested successfully; raised to stop loading it."""
+
+    def __init__(self, file_hash: str):
+        super().__init__(f"File with hash {file_hash} already ingested.")
+        self.file_hash = file_hash
+
+def is_ingested(file_hash: str) -> bool:
+    """Whether a SUCCESS ingestion of this hash exists, on a short connection of its own.
+
+    The download stage runs on its own thread, so it cannot use the load stage's connection.
+    """
+    conn = get_connection()
     try:
-        logger.info(f"Downloading from {url}")
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
-        
-        with open(dest_path, "wb") as f:
-            f.write(response.content)
-        
-        if dest_path.stat().st_size == 0:
-            raise ValueError("Downloaded file is empty.")
-            
-        logger.info(f"Download complete: {dest_path}")
-    except Exception as e:
-        logger.error(f"Download failed: {e}")
-        raise
-
-def ingest_dataset(dataset_cfg: dict, storage_cfg: dict):
-    """Handles ingestion for a single dataset with idempotency check."""
+        cur = conn.cursor()
+        return bool(ingested_hashes(cur, [file_hash]))
+    finally:
+        conn.close()
+
+def _load_partial_meta(meta_path: Path, url: str) -> dict | None:
+    """Reads the metadata stored next to a partial download, if it belongs to the same URL."""
+    if not meta_path.exists():
+        return None
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("url") == url else None
+
+def _content_range_start(response) -> int | None:
+    """Parses the first byte position from a 206 response's Content-Range header."""
+    match = re.match(r"bytes (\d+)-", response.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        status = e.response.status_code
+        return status >= 500 or status in (408, 429)
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+def download_file(url: str, dest_path: Path, on_chunk=None, partial_path: Path | None = None,
+                  max_retries: int = DEFAULT_MAX_RETRIES, backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+                  expected_sha256: str | None = None) -> str:
+    """Downloads file from URL into dest_path with retry/backoff and HTTP Range resume. Returns its SHA256.
+
+    Bytes are written to partial_path (plus a .json metadata file) and only moved to
+    dest_path once complete and verified, so a later run can resume an interrupted
+    transfer. If given, on_chunk is called with every byte of the file exactly once, in order.
+    """
+    partial_path = partial_path or dest_path.with_name(dest_path.name + ".part")
+    meta_path = partial_path.with_name(partial_path.name + ".json")
+
+    meta = _load_partial_meta(meta_path, url)
+    # Resuming across runs is only safe when a validator can prove the source is unchanged
+    if meta and (meta.get("etag") or meta.get("last_modified")) and partial_path.exists():
+        offset = partial_path.stat().st_size
+    else:
+        meta = {}
+        offset = 0
+        partial_path.unlink(missing_ok=True)
+
+    sha256_hash = hashlib.sha256()
+    fed = 0  # Bytes already handed to on_chunk and the hash during this call
+    attempt = 0
+
+    logger.info(f"Downloading from {url}" + (f" (resuming at byte {offset})" if offset else ""))
+    while True:
+        try:
+            headers = {}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                validator = meta.get("etag") or meta.get("last_modified")
+                if validator:
+                    headers["If-Range"] = validator
+
+            with _http.get(url, headers=headers, timeout=60, stream=True) as response:
+                response.raise_for_status()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                skip = 0
+
+                if offset and response.status_code == 206:
+                    if _content_range_start(response) != offset:
+                        raise DownloadError(f"Server returned an unexpected range: {response.headers.get('Content-Range')}")
+                elif offset:
+                    # Range not honoured (or If-Range mismatch): the body starts at byte zero
+                    if fed and (etag, last_modified) != (meta.get("etag"), meta.get("last_modified")):
+                        raise DownloadError("Source changed while downloading; the transfer must restart.")
+                    if fed:
+                        # Earlier bytes already went downstream; drop them from the new body
+                        skip = offset
+                    else:
+                        logger.info("Server does not support resuming this file; restarting from byte zero.")
+                        partial_path.unlink(missing_ok=True)
+                        offset = 0
+
+                if fed < offset:
+                    # Replay the prefix kept by a previous run so the hash and consumers see the whole file
+                    with open(partial_path, "rb") as f:
+                        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                            sha256_hash.update(block)
+                            if on_chunk:
+                                on_chunk(block)
+                    fed = offset
+
+                meta = {"url": url, "etag": etag, "last_modified": last_modified}
+                with open(meta_path, "w") as f:
+                    json.dump(meta, f)
+
+                with open(partial_path, "ab") as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if skip:
+                            if len(chunk) <= skip:
+                                skip -= len(chunk)
+                                continue
+                            chunk = chunk[skip:]
+                            skip = 0
+                        f.write(chunk)
+                        offset += len(chunk)
+                        sha256_hash.update(chunk)
+                        fed += len(chunk)
+                        if on_chunk:
+                            on_chunk(chunk)
+            break
+        except Exception as e:
+            attempt += 1
+            if not _is_retryable(e) or attempt > max_retries:
+                logger.error(f"Download failed: {e}")
+                raise
+            delay = backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            logger.warning(f"Download attempt {attempt} failed at byte {offset}: {e}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    if offset == 0:
+        raise ValueError("Downloaded file is empty.")
+
+    file_hash = sha256_hash.hexdigest()
+    if expected_sha256 and file_hash != expected_sha256.lower():
+        partial_path.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+        raise ValueError(f"SHA256 mismatch for {url}: expected {expected_sha256}, got {file_hash}")
+
+    partial_path.replace(dest_path)
+    meta_path.unlink(missing_ok=True)
+    logger.info(f"Download complete: {dest_path}")
+    return file_hash
+
+def _read_local_batches(path: Path, file_type: str, batch_size: int, parse_cfg: dict | None = None):
+    """Yields parsed batches from a file already on disk."""
+    with open(path, "rb") as f:
+        yield from iter_record_batches(f, file_type, batch_size, parse_cfg)
+
+def _find_resume_point(uow: IngestionUnitOfWork, raw_dir: Path) -> dict | None:
+    """Returns an interrupted ingestion whose local file is intact, discarding any that cannot be resumed."""
+    resumable = uow.find_resumable()
+    if resumable is None:
+        return None
+
+    path = raw_dir / resumable["file_name"]
+    if resumable["file_hash"] and path.exists() and calculate_sha256(str(path)) == resumable["file_hash"]:
+        return resumable
+
+    logger.warning(f"Interrupted ingestion {resumable['id']} for {uow.source_name} cannot be resumed; discarding its partial load.")
+    uow.discard(resumable["id"])
+    return None
+
+def _metered_fetch(fetch, source_name: str):
+    """Wraps a fetch callable to count downloaded bytes and record download throughput."""
+    def metered(url: str, dest_path: Path, on_chunk=None):
+        received = 0
+
+        def count(chunk: bytes):
+            nonlocal received
+            received += len(chunk)
+            DOWNLOAD_BYTES.inc(len(chunk), dataset=source_name)
+            if on_chunk:
+                on_chunk(chunk)
+
+        started = time.perf_counter()
+        result = fetch(url, dest_path, on_chunk=count)
+        elapsed = time.perf_counter() - started
+        if elapsed > 0:
+            DOWNLOAD_THROUGHPUT.set(received / elapsed, dataset=source_name)
+        return result
+    return metered
+
+def ingest_dataset(dataset_cfg: dict, storage_cfg: dict, ingestion_cfg: dict | None = None):
+    """Handles ingestion for a single dataset with idempotency check and checkpoint/resume."""
+    ingestion_cfg = ingestion_cfg or {}
     source_name = dataset_cfg["name"]
     url = dataset_cfg["url"]
+    file_type = dataset_cfg.get("file_type", "csv")
+    split_file_type(file_type)  # Fail fast on unsupported formats and parse plans before downloading
+    parse_settings(dataset_cfg.get("parse"))
+    if is_local_source(url):
+        # Files (or glob matches) on a shared filesystem: batched multi-file loading, no download
+        return ingest_local_files(dataset_cfg, ingestion_cfg)
+    batch_size = dataset_cfg.get("batch_size", ingestion_cfg.get("batch_size", DEFAULT_BATCH_SIZE))
+    queue_size = ingestion_cfg.get("queue_size", DEFAULT_QUEUE_SIZE)
+    checkpoint_rows = ingestion_cfg.get("checkpoint_rows", DEFAULT_CHECKPOINT_ROWS)
+    # One stable partial file per source so an interrupted download survives into the next run
+    fetch = partial(
+        download_file,
+        partial_path=Path(storage_cfg["raw_dir"]) / f".{source_name}.{file_type}.part",
+        max_retries=ingestion_cfg.get("max_retries", DEFAULT_MAX_RETRIES),
+        backoff_seconds=ingestion_cfg.get("backoff_seconds", DEFAULT_BACKOFF_SECONDS),
+        expected_sha256=dataset_cfg.get("sha256"),
+    )
+    profiler = None
+    if ingestion_cfg.get("profile", True):
+        profiler = StreamingProfiler(ingestion_cfg.get("hll_precision", DEFAULT_HLL_PRECISION),
+                                     ingestion_cfg.get("sketch_k", DEFAULT_SKETCH_K))
     raw_dir = Path(storage_cfg["raw_dir"])
     raw_dir.mkdir(parents=True, exist_ok=True)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_name = f"{source_name}_{timestamp}.csv"
-    dest_path = raw_dir / file_name
+    with IngestionUnitOfWork(source_name, checkpoint_rows) as uow:
+        resume = _find_resume_point(uow, raw_dir)
+        if resume:
+            file_name = resume["file_name"]
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Keep the source encoding on disk; decompression happens while parsing
+            file_name = f"{source_name}_{timestamp}.{file_type}"
+        dest_path = raw_dir / file_name
 
-    file_hash = ""
-    records_count = 0
-    
-    try:
-        # 1. Download to temp location or direct
-        download_file(url, dest_path)
-        file_hash = calculate_sha256(str(dest_path))
-
-        # 2. Idempotency Check
-        if check_file_hash_exists(file_hash):
-            logger.info(f"File with hash {file_hash} already ingested. Skipping.")
-            log_ingestion_status(source_name, file_name, file_hash, "SKIPPED", 0, "Duplicate file hash detected.")
+        def record_hash(file_hash: str):
+            # Checked as soon as the download completes: a duplicate cancels the parse and load
+            # stages before any chunk is committed. complete() re-checks under the hash lock.
+            if is_ingested(file_hash):
+                raise DuplicateFile(file_hash)
+            # Lets checkpoints persist the hash (and start committing)
+            uow.file_hash = file_hash
+
+        try:
+            uow.begin(file_name, resume)
+            known_hash = uow.file_hash or dataset_cfg.get("sha256", "").lower()
+            if known_hash and is_ingested(known_hash):
+                raise DuplicateFile(known_hash)
+
+            # 1. Download, parse & load to DB as concurrent stages (or resume from the local file)
+            if resume:
+                logger.info(f"Resuming ingestion {uow.ingestion_id} for {source_name} from record {uow.rows_committed}")
+                batches = _read_local_batches(dest_path, file_type, batch_size, dataset_cfg.get("parse"))
+                if profiler:
+                    # The whole file is re-read, so the profile still covers every row
+                    batches = profiler.observe(batches)
+            else:
+                logger.info(f"Ingesting {file_type} data for {source_name} in batches of {batch_size}")
+                pipeline = IngestionPipeline(url, dest_path, file_type, _metered_fetch(fetch, source_name),
+                                             batch_size=batch_size, queue_size=queue_size, on_downloaded=record_hash,
+                                             on_batch=profiler.update if profiler else None,
+                                             parse_cfg=dataset_cfg.get("parse"))
+                batches = pipeline.batches()
+            records_count = uow.load(batches)
+
+            if not resume:
+                PARSED_ROWS.inc(pipeline.parsed_rows, dataset=source_name)
+                if pipeline.parse_seconds > 0:
+                    PARSE_THROUGHPUT.set(pipeline.parsed_rows / pipeline.parse_seconds, dataset=source_name)
+
+            if records_count == 0:
+                raise ValueError("Parsed dataframe is empty.")
+
+            # 2. Idempotency Check & Log Success, committed with the final chunk
+            if not uow.complete(profile=profiler.to_dict() if profiler else None):
+                logger.info(f"File with hash {uow.file_hash} already ingested. Skipping.")
+                if dest_path.exists():
+                    dest_path.unlink()
+                return
+
+            logger.info(f"Ingestion successful for {source_name}. Total records: {records_count}")
+
+        except DuplicateFile as e:
+            logger.info(f"{e} Skipping {source_name} without loading it.")
+            uow.file_hash = e.file_hash
+            uow.skip()
             if dest_path.exists():
                 dest_path.unlink()
-            return
-
-        # 3. Parse Data
-        logger.info(f"Parsing CSV data from {dest_path}")
-        df = pd.read_csv(dest_path)
-        
-        # Clean column names (strip whitespace and extra quotes)
-        df.columns = [col.strip().replace('"', '') for col in df.columns]
-        
-        if df.empty:
-            raise ValueError("Parsed dataframe is empty.")
-        
-        records = df.to_dict(orient="records")
-        records_count = len(records)
-
-        # 4. Load to DB
-        insert_batch_raw(source_name, records)
-        
-        # 5. Log Success
-        log_ingestion_status(source_name, file_name, file_hash, "SUCCESS", records_count, "Ingestion completed successfully.")
-        logger.info(f"Ingestion successful for {source_name}. Total records: {records_count}")
-
-    except Exception as e:
-        logger.error(f"Ingestion failed for {source_name}: {e}")
-        log_ingestion_status(source_name, file_name, file_hash, "FAILED", 0, str(e))
-        if dest_path.exists():
-            dest_path.unlink()
-        raise
-
-def main():
-    # Load configuration
-    config_path = Path("config/config.yaml")
-    if not config_path.exists():
-        raise FileNotFoundError(f"Config file not found: {config_path}")
-
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
+        except Exception as e:
+            logger.error(f"Ingestion failed for {source_name}: {e}")
+            uow.fail(str(e))
+            # Keep the local file when committed chunks can be resumed from it on the next run
+            resumable = uow.rows_committed > 0 and bool(uow.file_hash)
+            if not resumable and dest_path.exists():
+                dest_path.unlink()
+            raise
+
+def main(only: list[str] | None = None, lock_mode: str | None = None, config: dict | None = None) -> dict:
+    # Load configuration (the scheduler passes its already-parsed copy)
+    if config is None:
+        config_path = Path("config/config.yaml")
+        if not config_path.exists():
+            raise FileNotFoundError(f"Config file not found: {config_path}")
+
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
 
     datasets = config.get("datasets", [])
     storage = config["storage"]
+    ingestion = config.get("ingestion", {})
+    mode, timeout_seconds = lock_settings(config, lock_mode)
+    stats = new_lock_stats()
     
     for ds in datasets:
+        if only and ds["name"] not in only:
+            continue
         try:
-            ingest_dataset(ds, storage)
+            # Another run ingesting the same dataset would race on the partial download and the hash check
+            run_locked([dataset_lock(ds["name"])], stats, ingest_dataset, ds, storage, ingestion,
+                       mode=mode, timeout_seconds=timeout_seconds)
         except Exception as e:
             logger.error(f"Failed to ingest dataset {ds['name']}: {e}")
             # Continue with other datasets if one fails
             continue
+    return stats
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
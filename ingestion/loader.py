@@ -1,53 +1,260 @@
+import io
 import json
+import time
 import logging
+from typing import Iterable
+import pandas as pd
 from database.connection import get_connection
+from monitoring.metrics import RAW_INSERTED_ROWS, RAW_INSERT_THROUGHPUT, STATEMENT_DURATION
+from ingestion.records import raw_copy_payload
 
 logger = logging.getLogger(__name__)
 
-def insert_batch_raw(source_name: str, rows: list[dict]):
-    """Inserts records into raw_records table using JSONB format."""
-    if not rows:
-        logger.warning("No records to insert.")
-        return 0
-
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    try:
-        sql = """
-            INSERT INTO raw_records (source_name, record)
-            VALUES (%s, %s::jsonb)
+DEFAULT_CHECKPOINT_ROWS = 500_000
+
+FIND_RESUMABLE_SQL = """
+    SELECT id, file_name, file_hash, rows_committed
+    FROM ingestion_log
+    WHERE source_name = %s AND status IN ('IN_PROGRESS', 'FAILED') AND rows_committed > 0
+      AND (%s::text IS NULL OR file_hash = %s)
+    ORDER BY id DESC
+    LIMIT 1
+"""
+RESUMABLE_ENTRIES_SQL = """
+    SELECT id, file_hash
+    FROM ingestion_log
+    WHERE source_name = %s AND status IN ('IN_PROGRESS', 'FAILED') AND rows_committed > 0
+    ORDER BY id DESC
+"""
+DUPLICATE_HASH_SQL = "SELECT 1 FROM ingestion_log WHERE file_hash = %s AND status = 'SUCCESS' AND id <> %s LIMIT 1"
+DISCARD_RAW_SQL = "DELETE FROM raw_records WHERE ingestion_id = %s"
+
+class IngestionUnitOfWork:
+    """One database session for ingesting one file of a dataset.
+
+    The ingestion_log entry, the raw rows, the duplicate-hash check and the final
+    status are all written through the same connection. Small files therefore
+    land in a single transaction; large ones commit every checkpoint_rows rows
+    (raw rows plus the committed offset on their ingestion_log entry), so a
+    retried run can resume after the last chunk. Checkpoints wait until the file
+    hash is known and was found new, so a duplicate file never commits raw rows.
+    The final chunk, the hash check and the SUCCESS/SKIPPED status always commit together.
+    """
+
+    def __init__(self, source_name: str, checkpoint_rows: int = DEFAULT_CHECKPOINT_ROWS):
+        self.source_name = source_name
+        self.checkpoint_rows = checkpoint_rows
+        self.ingestion_id = None
+        self.file_name = None
+        self.file_hash = ""
+        self.rows_committed = 0
+        self._pending = 0
+        self._log_committed = False
+        self.conn = get_connection()
+        self.cur = self.conn.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        try:
+            self.conn.rollback()
+        finally:
+            self.cur.close()
+            self.conn.close()
+
+    def find_resumable(self, file_hash: str | None = None) -> dict | None:
+        """Returns the latest interrupted ingestion for this source (of this file, if given) that has committed chunks."""
+        self.cur.execute(FIND_RESUMABLE_SQL, (self.source_name, file_hash, file_hash))
+        row = self.cur.fetchone()
+        self.conn.commit()
+        if row is None:
+            return None
+        return {"id": row[0], "file_name": row[1], "file_hash": row[2], "rows_committed": row[3]}
+
+    def resumable_entries(self) -> list[tuple[int, str]]:
+        """(id, file_hash) of every interrupted ingestion for this source with committed chunks, newest first."""
+        self.cur.execute(RESUMABLE_ENTRIES_SQL, (self.source_name,))
+        rows = self.cur.fetchall()
+        self.conn.commit()
+        return rows
+
+    def discard(self, ingestion_id: int):
+        """Deletes raw rows committed by an ingestion that will not be resumed."""
+        self.cur.execute(DISCARD_RAW_SQL, (ingestion_id,))
+        deleted = self.cur.rowcount
+        self.cur.execute("UPDATE ingestion_log SET rows_committed = 0, updated_at = CURRENT_TIMESTAMP WHERE id = %s", (ingestion_id,))
+        self.conn.commit()
+        if deleted:
+            logger.info(f"Discarded {deleted} partially loaded records of ingestion {ingestion_id}")
+
+    def begin(self, file_name: str, resume: dict | None = None):
+        """Opens (or re-opens, when resuming) the ingestion_log entry. Nothing is committed yet."""
+        self.file_name = file_name
+        if resume:
+            self.ingestion_id = resume["id"]
+            self.file_hash = resume["file_hash"]
+            self.rows_committed = resume["rows_committed"]
+            self._log_committed = True
+            self.cur.execute(
+                "UPDATE ingestion_log SET status = 'IN_PROGRESS', notes = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                ("Resumed from checkpoint.", self.ingestion_id)
+            )
+        else:
+            self.cur.execute(
+                """
+                INSERT INTO ingestion_log (source_name, file_name, file_hash, status, updated_at)
+                VALUES (%s, %s, '', 'IN_PROGRESS', CURRENT_TIMESTAMP)
+                RETURNING id
+                """,
+                (self.source_name, file_name)
+            )
+            self.ingestion_id = self.cur.fetchone()[0]
+
+    def _record_progress(self):
+        self.cur.execute(
+            """
+            UPDATE ingestion_log
+            SET rows_committed = %s, file_hash = COALESCE(NULLIF(%s, ''), file_hash), updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            """,
+            (self.rows_committed + self._pending, self.file_hash or "", self.ingestion_id)
+        )
+
+    def load(self, batches: Iterable[pd.DataFrame]) -> int:
+        """Inserts batches into raw_records, skipping rows committed by a previous attempt.
+
+        Returns the total row count; the final chunk stays uncommitted until complete().
         """
-        batch_data = [(source_name, json.dumps(row)) for row in rows]
-        
-        cur.executemany(sql, batch_data)
-        conn.commit()
-        
-        logger.info(f"Successfully inserted {len(rows)} records for {source_name}")
-        return len(rows)
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Failed to insert batch: {e}")
-        raise
-    finally:
-        cur.close()
-        conn.close()
-
-def log_ingestion_status(source_name: str, file_name: str, file_hash: str, status: str, count: int = 0, notes: str = ""):
-    """Logs the result of an ingestion process to the database."""
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    try:
-        sql = """
-            INSERT INTO ingestion_log (source_name, file_name, file_hash, status, records_count, notes)
-            VALUES (%s, %s, %s, %s, %s, %s)
+        skip = self.rows_committed
+        inserted, insert_seconds = 0, 0.0
+        for df in batches:
+            # Fast-forward over rows committed before a resume
+            if skip:
+                if len(df) <= skip:
+                    skip -= len(df)
+                    continue
+                df = df.iloc[skip:]
+                skip = 0
+            if df.empty:
+                continue
+
+            # Serialized column-wise from the batch's Arrow/NumPy buffers and sent as one COPY
+            payload = raw_copy_payload(df, self.source_name, self.ingestion_id)
+            started = time.perf_counter()
+            self.cur.copy_expert("COPY raw_records (source_name, ingestion_id, record) FROM STDIN", io.BytesIO(payload))
+            elapsed = time.perf_counter() - started
+            STATEMENT_DURATION.observe(elapsed, layer="raw", statement="insert_batch")
+            RAW_INSERTED_ROWS.inc(len(df), dataset=self.source_name)
+            inserted += len(df)
+            insert_seconds += elapsed
+            self._pending += len(df)
+
+            # Without a hash the chunk could not be resumed and might belong to a duplicate file
+            if self._pending >= self.checkpoint_rows and self.file_hash:
+                self._record_progress()
+                self.conn.commit()
+                self._log_committed = True
+                self.rows_committed += self._pending
+                self._pending = 0
+                logger.info(f"Checkpoint for {self.source_name}: {self.rows_committed} records committed")
+
+        if insert_seconds:
+            RAW_INSERT_THROUGHPUT.set(inserted / insert_seconds, dataset=self.source_name)
+        return self.rows_committed + self._pending
+
+    def complete(self, notes: str = "Ingestion completed successfully.", profile: dict | None = None) -> bool:
+        """Runs the duplicate-hash check and commits the batch as SUCCESS, or as SKIPPED if the file was already ingested.
+
+        A transaction-scoped advisory lock on the hash serializes concurrent ingestions
+        of the same file, so exactly one of them can commit it as SUCCESS. The column
+        profile, if given, is stored in the same transaction.
         """
-        cur.execute(sql, (source_name, file_name, file_hash, status, count, notes))
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Failed to log ingestion status: {e}")
-    finally:
-        cur.close()
-        conn.close()
+        self.cur.execute("SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))", (self.file_hash,))
+        self.cur.execute(DUPLICATE_HASH_SQL, (self.file_hash, self.ingestion_id))
+        duplicate = self.cur.fetchone() is not None
+
+        if duplicate:
+            self.cur.execute(DISCARD_RAW_SQL, (self.ingestion_id,))
+            status, count, notes = "SKIPPED", 0, "Duplicate file hash detected."
+        else:
+            status, count = "SUCCESS", self.rows_committed + self._pending
+
+        self.cur.execute(
+            """
+            UPDATE ingestion_log
+            SET status = %s, records_count = %s, rows_committed = %s, notes = %s, file_hash = %s,
+                updated_at = CURRENT_TIMESTAMP,
+                completed_at = CASE WHEN %s = 'SUCCESS' THEN CURRENT_TIMESTAMP ELSE completed_at END
+            WHERE id = %s
+            """,
+            (status, count, count, notes, self.file_hash, status, self.ingestion_id)
+        )
+        if profile and not duplicate:
+            self.cur.execute(
+                """
+                INSERT INTO ingestion_profile (ingestion_id, source_name, row_count, profile)
+                VALUES (%s, %s, %s, %s::jsonb)
+                """,
+                (self.ingestion_id, self.source_name, profile["rows"], json.dumps(profile))
+            )
+        self.conn.commit()
+        self.rows_committed, self._pending = count, 0
+        return not duplicate
+
+    def skip(self, notes: str = "Duplicate file hash detected."):
+        """Rolls back the uncommitted chunk and records the file as SKIPPED without loading the rest of it."""
+        self.conn.rollback()
+        self._pending = 0
+        if self._log_committed:
+            self.cur.execute(DISCARD_RAW_SQL, (self.ingestion_id,))
+            self.cur.execute(
+                """
+                UPDATE ingestion_log
+                SET status = 'SKIPPED', records_count = 0, rows_committed = 0, notes = %s,
+                    file_hash = COALESCE(NULLIF(%s, ''), file_hash), updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                """,
+                (notes, self.file_hash or "", self.ingestion_id)
+            )
+        else:
+            self.cur.execute(
+                """
+                INSERT INTO ingestion_log (source_name, file_name, file_hash, status, records_count, notes, updated_at)
+                VALUES (%s, %s, %s, 'SKIPPED', 0, %s, CURRENT_TIMESTAMP)
+                """,
+                (self.source_name, self.file_name or "", self.file_hash or "", notes)
+            )
+        self.conn.commit()
+        self.rows_committed = 0
+
+    def fail(self, error: str):
+        """Rolls back the uncommitted chunk and records the failure; committed chunks stay resumable."""
+        self.conn.rollback()
+        self._pending = 0
+        try:
+            if self._log_committed:
+                self.cur.execute(
+                    """
+                    UPDATE ingestion_log
+                    SET status = 'FAILED', notes = %s, file_hash = COALESCE(NULLIF(%s, ''), file_hash), updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    """,
+                    (error, self.file_hash or "", self.ingestion_id)
+                )
+            else:
+                # The IN_PROGRESS entry was rolled back with the first chunk; record the failure on its own
+                self.cur.execute(
+                    """
+                    INSERT INTO ingestion_log (source_name, file_name, file_hash, status, records_count, notes, updated_at)
+                    VALUES (%s, %s, %s, 'FAILED', 0, %s, CURRENT_TIMESTAMP)
+                    """,
+                    (self.source_name, self.file_name or "", self.file_hash or "", error)
+                )
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Failed to log ingestion status: {e}")
@@ -0,0 +1,362 @@
+import io
+import os
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import execute_values
+from database.connection import get_connection
+from monitoring.metrics import PARSED_ROWS, RAW_INSERTED_ROWS, RAW_INSERT_THROUGHPUT, STATEMENT_DURATION
+from ingestion.loader import DEFAULT_CHECKPOINT_ROWS, IngestionUnitOfWork
+from ingestion.profiler import DEFAULT_HLL_PRECISION, DEFAULT_SKETCH_K, StreamingProfiler
+from ingestion.readers import DEFAULT_BATCH_SIZE, iter_record_batches
+from ingestion.records import raw_copy_payload
+
+logger = logging.getLogger("ingestion")
+
+LOCAL_SCHEME = "file://"
+GLOB_CHARS = "*?["
+HASH_BLOCK_SIZE = 1024 * 1024
+DEFAULT_HASH_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_FILES_PER_BATCH = 200
+DEFAULT_BATCH_FILE_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_BATCH_MAX_BYTES = 256 * 1024 * 1024
+
+INGESTED_HASHES_SQL = "SELECT DISTINCT file_hash FROM ingestion_log WHERE status = 'SUCCESS' AND file_hash = ANY(%s)"
+
+def is_local_source(url: str) -> bool:
+    return url.startswith(LOCAL_SCHEME)
+
+def resolve_local_files(url: str, file_type: str) -> list[tuple[Path, str]]:
+    """Expands a file:// url (a file, a directory or a glob pattern) into (path, name) pairs in name order.
+
+    A directory matches every `*.<file_type>` file directly inside it. Names are relative to
+    the part of the path before the first glob character, so they stay short and stable
+    when the feed directory is mounted elsewhere.
+    """
+    path = url[len(LOCAL_SCHEME):]
+    parts = Path(path).parts
+    magic = next((i for i, part in enumerate(parts) if any(c in part for c in GLOB_CHARS)), None)
+    if magic is not None:
+        base, pattern = Path(*parts[:magic]) if magic else Path("."), str(Path(*parts[magic:]))
+    elif Path(path).is_dir():
+        base, pattern = Path(path), f"*.{file_type}"
+    else:
+        base, pattern = Path(path).parent, Path(path).name
+
+    files = sorted(p for p in base.glob(pattern) if p.is_file() and not p.name.startswith("."))
+    return [(p, str(p.relative_to(base))) for p in files]
+
+def file_sha256(path: Path) -> str:
+    # Large blocks: hashlib releases the GIL while hashing them, so threads hash in parallel
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
+def hash_files(paths: list[Path], workers: int = DEFAULT_HASH_WORKERS) -> list[str]:
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(file_sha256, paths))
+
+def ingested_hashes(cur, hashes: list[str]) -> set[str]:
+    """The subset of `hashes` already ingested successfully, in one query."""
+    cur.execute(INGESTED_HASHES_SQL, (hashes,))
+    return {row[0] for row in cur.fetchall()}
+
+class FileBatchLoader:
+    """Loads a group of small local files into raw_records in one transaction.
+
+    Each file is parsed whole in memory, so only files up to ingestion.batch_file_max_bytes
+    are grouped here; larger ones stream through ingest_large_file instead.
+
+    Every file gets its own ingestion_log row (and profile), but their raw rows are
+    written with combined COPY statements of about batch_size rows, so thousands of
+    files cost a handful of statements instead of a transaction each. A file that
+    fails to parse is recorded as FAILED without affecting the others in its group.
+    """
+
+    def __init__(self, conn, source_name: str, file_type: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 ingestion_cfg: dict | None = None, parse_cfg: dict | None = None):
+        ingestion_cfg = ingestion_cfg or {}
+        self.conn = conn
+        self.source_name = source_name
+        self.file_type = file_type
+        self.batch_size = batch_size
+        self.parse_cfg = parse_cfg
+        self.profile = ingestion_cfg.get("profile", True)
+        self.hll_precision = ingestion_cfg.get("hll_precision", DEFAULT_HLL_PRECISION)
+        self.sketch_k = ingestion_cfg.get("sketch_k", DEFAULT_SKETCH_K)
+        self._buffer = io.BytesIO()
+        self._pending = 0
+        self.inserted = 0
+        self.insert_seconds = 0.0
+
+    def _parse(self, ingestion_id: int, path: Path) -> tuple[bytes, int, dict | None]:
+        """Parses one file into COPY rows for raw_records. Returns (COPY payload, row count, profile)."""
+        profiler = StreamingProfiler(self.hll_precision, self.sketch_k) if self.profile else None
+        payload = []
+        count = 0
+        with open(path, "rb") as f:
+            for df in iter_record_batches(f, self.file_type, self.batch_size, self.parse_cfg):
+                if profiler:
+                    profiler.update(df)
+                payload.append(raw_copy_payload(df, self.source_name, ingestion_id))
+                count += len(df)
+        return b"".join(payload), count, profiler.to_dict() if profiler else None
+
+    def _flush(self, cur):
+        if not self._pending:
+            return
+        self._buffer.seek(0)
+        started = time.perf_counter()
+        cur.copy_expert("COPY raw_records (source_name, ingestion_id, record) FROM STDIN", self._buffer)
+        elapsed = time.perf_counter() - started
+        STATEMENT_DURATION.observe(elapsed, layer="raw", statement="copy_files")
+        RAW_INSERTED_ROWS.inc(self._pending, dataset=self.source_name)
+        self.inserted += self._pending
+        self.insert_seconds += elapsed
+        self._buffer = io.BytesIO()
+        self._pending = 0
+
+    def load(self, files: list[tuple[Path, str, str]]) -> dict:
+        """Ingests (path, name, hash) files with distinct hashes; returns counts per outcome."""
+        counts = {"loaded": 0, "failed": 0, "skipped": 0, "records": 0}
+        cur = self.conn.cursor()
+        try:
+            # Same per-hash lock as IngestionUnitOfWork.complete, taken in a fixed order to avoid deadlocks
+            hashes = sorted(file_hash for _, _, file_hash in files)
+            cur.execute("SELECT pg_advisory_xact_lock(hashtextextended(h, 0)) FROM unnest(%s::text[]) AS h", (hashes,))
+            # Re-checked under the locks: another source may have committed one of these files since the scan
+            duplicates = ingested_hashes(cur, hashes)
+            counts["skipped"] = sum(1 for _, _, file_hash in files if file_hash in duplicates)
+            files = [f for f in files if f[2] not in duplicates]
+            if not files:
+                self.conn.commit()
+                return counts
+
+            rows = execute_values(
+                cur,
+                "INSERT INTO ingestion_log (source_name, file_name, file_hash, status, updated_at) VALUES %s RETURNING file_hash, id",
+                [(self.source_name, name, file_hash) for _, name, file_hash in files],
+                template="(%s, %s, %s, 'IN_PROGRESS', CURRENT_TIMESTAMP)",
+                page_size=len(files),
+                fetch=True,
+            )
+            ids = dict(rows)
+
+            outcomes, profiles = [], []
+            for path, name, file_hash in files:
+                ingestion_id = ids[file_hash]
+                try:
+                    payload, count, profile = self._parse(ingestion_id, path)
+                    if count == 0:
+                        raise ValueError("Parsed dataframe is empty.")
+                except Exception as e:
+                    logger.error(f"Ingestion failed for {self.source_name} file {name}: {e}")
+                    outcomes.append((ingestion_id, "FAILED", 0, str(e)))
+                    counts["failed"] += 1
+                    continue
+
+                PARSED_ROWS.inc(count, dataset=self.source_name)
+                self._buffer.write(payload)
+                self._pending += count
+                if self._pending >= self.batch_size:
+                    self._flush(cur)
+                outcomes.append((ingestion_id, "SUCCESS", count, "Ingestion completed successfully."))
+                if profile:
+                    profiles.append((ingestion_id, self.source_name, profile["rows"], json.dumps(profile)))
+                counts["loaded"] += 1
+                counts["records"] += count
+            self._flush(cur)
+
+            execute_values(
+                cur,
+                """
+                UPDATE ingestion_log AS l
+                SET status = v.status, records_count = v.records, rows_committed = v.records, notes = v.notes,
+                    updated_at = CURRENT_TIMESTAMP,
+                    completed_at = CASE WHEN v.status = 'SUCCESS' THEN CURRENT_TIMESTAMP END
+                FROM (VALUES %s) AS v (id, status, records, notes)
+                WHERE l.id = v.id
+                """,
+                outcomes,
+                page_size=len(outcomes),
+            )
+            if profiles:
+                execute_values(
+                    cur,
+                    "INSERT INTO ingestion_profile (ingestion_id, source_name, row_count, profile) VALUES %s",
+                    profiles,
+                    template="(%s, %s, %s, %s::jsonb)",
+                    page_size=len(profiles),
+                )
+            self.conn.commit()
+            return counts
+        except Exception as e:
+            self.conn.rollback()
+            self._buffer, self._pending = io.BytesIO(), 0
+            self._log_failed(cur, files, str(e))
+            raise
+        finally:
+            cur.close()
+
+    def _log_failed(self, cur, files: list[tuple[Path, str, str]], error: str):
+        """Records a FAILED audit row per file after the group's transaction was rolled back."""
+        try:
+            execute_values(
+                cur,
+                "INSERT INTO ingestion_log (source_name, file_name, file_hash, status, records_count, notes, updated_at) VALUES %s",
+                [(self.source_name, name, file_hash, error) for _, name, file_hash in files],
+                template="(%s, %s, %s, 'FAILED', 0, %s, CURRENT_TIMESTAMP)",
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Failed to log ingestion status: {e}")
+
+def discard_unresumable(source_name: str, resumable_hashes: set[str]):
+    """Discards partial loads of the source that no file of this scan will resume.
+
+    ingest_large_file resumes the newest partial load of each large new file, so older
+    loads of the same file and loads of files no longer pending keep their raw rows otherwise.
+    """
+    with IngestionUnitOfWork(source_name) as uow:
+        kept = set()
+        for ingestion_id, file_hash in uow.resumable_entries():
+            if file_hash in resumable_hashes and file_hash not in kept:
+                kept.add(file_hash)
+                continue
+            logger.warning(f"Interrupted ingestion {ingestion_id} for {source_name} will not be resumed; discarding its partial load.")
+            uow.discard(ingestion_id)
+
+def ingest_large_file(path: Path, name: str, file_hash: str, source_name: str, file_type: str, batch_size: int,
+                      ingestion_cfg: dict, parse_cfg: dict | None = None) -> int:
+    """Streams one large local file through IngestionUnitOfWork: bounded memory, checkpoints and resume.
+
+    An earlier interrupted load of the same file resumes after its last committed chunk.
+    Returns the number of records, or 0 if another run committed the same file first.
+    """
+    profiler = None
+    if ingestion_cfg.get("profile", True):
+        profiler = StreamingProfiler(ingestion_cfg.get("hll_precision", DEFAULT_HLL_PRECISION),
+                                     ingestion_cfg.get("sketch_k", DEFAULT_SKETCH_K))
+    with IngestionUnitOfWork(source_name, ingestion_cfg.get("checkpoint_rows", DEFAULT_CHECKPOINT_ROWS)) as uow:
+        resume = uow.find_resumable(file_hash)
+        try:
+            uow.begin(name, resume)
+            uow.file_hash = file_hash
+            if resume:
+                logger.info(f"Resuming ingestion {uow.ingestion_id} of {name} from record {uow.rows_committed}")
+            with open(path, "rb") as f:
+                batches = iter_record_batches(f, file_type, batch_size, parse_cfg)
+                if profiler:
+                    # The whole file is re-read on resume, so the profile still covers every row
+                    batches = profiler.observe(batches)
+                records_count = uow.load(batches)
+            if records_count == 0:
+                raise ValueError("Parsed dataframe is empty.")
+            PARSED_ROWS.inc(records_count, dataset=source_name)
+            if not uow.complete(profile=profiler.to_dict() if profiler else None):
+                logger.info(f"File {name} was ingested concurrently. Skipping.")
+                return 0
+            return records_count
+        except Exception as e:
+            logger.error(f"Ingestion failed for {source_name} file {name}: {e}")
+            uow.fail(str(e))
+            raise
+
+def _groups(files: list[tuple[Path, str, str]], files_per_batch: int, file_max_bytes: int, group_max_bytes: int):
+    """Yields lists of small files to load together, and single large files to stream, in name order."""
+    group, group_bytes = [], 0
+    for f in files:
+        size = f[0].stat().st_size
+        if size > file_max_bytes:
+            if group:
+                yield group
+                group, group_bytes = [], 0
+            yield f
+            continue
+        if group and (len(group) >= files_per_batch or group_bytes + size > group_max_bytes):
+            yield group
+            group, group_bytes = [], 0
+        group.append(f)
+        group_bytes += size
+    if group:
+        yield group
+
+def ingest_local_files(dataset_cfg: dict, ingestion_cfg: dict | None = None):
+    """Ingests every new file matched by the dataset's file:// url.
+
+    Files are hashed in parallel and checked against ingestion_log in one query.
+    New files up to ingestion.batch_file_max_bytes load in groups of at most
+    ingestion.files_per_batch files (and ingestion.batch_max_bytes) per transaction;
+    larger files stream one at a time with checkpoints, like downloaded sources.
+    Files already ingested are skipped without a new audit row, since a feed
+    directory is rescanned on every run.
+    """
+    ingestion_cfg = ingestion_cfg or {}
+    source_name = dataset_cfg["name"]
+    file_type = dataset_cfg.get("file_type", "csv")
+    batch_size = dataset_cfg.get("batch_size", ingestion_cfg.get("batch_size", DEFAULT_BATCH_SIZE))
+    files_per_batch = ingestion_cfg.get("files_per_batch", DEFAULT_FILES_PER_BATCH)
+    file_max_bytes = ingestion_cfg.get("batch_file_max_bytes", DEFAULT_BATCH_FILE_MAX_BYTES)
+    group_max_bytes = ingestion_cfg.get("batch_max_bytes", DEFAULT_BATCH_MAX_BYTES)
+
+    matched = resolve_local_files(dataset_cfg["url"], file_type)
+    if not matched:
+        logger.info(f"No files match {dataset_cfg['url']} for {source_name}.")
+        return
+
+    started = time.perf_counter()
+    hashes = hash_files([path for path, _ in matched], ingestion_cfg.get("hash_workers", DEFAULT_HASH_WORKERS))
+    logger.info(f"Hashed {len(matched)} files for {source_name} in {time.perf_counter() - started:.1f}s")
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        seen = ingested_hashes(cur, sorted(set(hashes)))
+        conn.commit()
+        cur.close()
+
+        new_files = []
+        for (path, name), file_hash in zip(matched, hashes):
+            # Identical copies within one scan are loaded once
+            if file_hash not in seen:
+                seen.add(file_hash)
+                new_files.append((path, name, file_hash))
+        logger.info(f"{len(new_files)} of {len(matched)} files for {source_name} are new")
+        discard_unresumable(source_name, {h for path, _, h in new_files if path.stat().st_size > file_max_bytes})
+
+        loader = FileBatchLoader(conn, source_name, file_type, batch_size, ingestion_cfg, dataset_cfg.get("parse"))
+        totals = {"loaded": 0, "failed": 0, "skipped": 0, "records": 0}
+        done = 0
+        for group in _groups(new_files, files_per_batch, file_max_bytes, group_max_bytes):
+            if isinstance(group, tuple):
+                path, name, file_hash = group
+                try:
+                    count = ingest_large_file(path, name, file_hash, source_name, file_type, batch_size,
+                                              ingestion_cfg, dataset_cfg.get("parse"))
+                except Exception:
+                    counts = {"loaded": 0, "failed": 1, "skipped": 0, "records": 0}
+                else:
+                    counts = {"loaded": int(count > 0), "failed": 0, "skipped": int(count == 0), "records": count}
+                done += 1
+            else:
+                counts = loader.load(group)
+                done += len(group)
+            for key, value in counts.items():
+                totals[key] += value
+            logger.info(f"Committed {counts['loaded']} files ({counts['records']} records) for {source_name} "
+                        f"[{done}/{len(new_files)}]")
+        if loader.insert_seconds:
+            RAW_INSERT_THROUGHPUT.set(loader.inserted / loader.insert_seconds, dataset=source_name)
+    finally:
+        conn.close()
+
+    logger.info(f"Ingestion successful for {source_name}: {totals['loaded']} files, {totals['records']} records "
+                f"({totals['failed']} failed, {totals['skipped']} already ingested concurrently)")
+    if totals["failed"] and not totals["loaded"]:
+        raise ValueError(f"All {totals['failed']} new files failed to ingest for {source_name}.")
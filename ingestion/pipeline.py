@@ -0,0 +1,191 @@
+import hashlib
+import io
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+import pandas as pd
+from ingestion.readers import DEFAULT_BATCH_SIZE, iter_record_batches, split_file_type
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 4
+_END = object()
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+class _Channel:
+    """Bounded queue linking two stages. Blocks for backpressure, but gives up once the pipeline is cancelled."""
+
+    def __init__(self, maxsize: int, cancelled: threading.Event):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._cancelled = cancelled
+
+    def put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                raise PipelineCancelled()
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self):
+        while True:
+            if self._cancelled.is_set():
+                raise PipelineCancelled()
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def close(self):
+        self.put(_END)
+
+class _ChannelReader(io.RawIOBase):
+    """Read-only file object over a channel of byte chunks, so parsers can consume a download as it arrives."""
+
+    def __init__(self, channel: _Channel):
+        self._channel = channel
+        self._buffer = b""
+        self._eof = False
+        self.wait_seconds = 0.0  # Time blocked waiting for the download stage
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            started = time.perf_counter()
+            chunk = self._channel.get()
+            self.wait_seconds += time.perf_counter() - started
+            if chunk is _END:
+                self._eof = True
+            else:
+                self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+class IngestionPipeline:
+    """Runs download, parse and load as concurrent stages linked by bounded queues.
+
+    The download stage writes the file to disk and hashes it while forwarding
+    chunks to the parse stage; parsed batches are handed to whoever iterates
+    `batches()` (the DB load stage). Memory is capped at roughly
+    `queue_size` download chunks plus `queue_size` parsed batches.
+    """
+
+    def __init__(self, url: str, dest_path: Path, file_type: str, fetch: Callable,
+                 batch_size: int = DEFAULT_BATCH_SIZE, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 on_downloaded: Callable[[str], None] | None = None,
+                 on_batch: Callable[[pd.DataFrame], None] | None = None, parse_cfg: dict | None = None):
+        self.url = url
+        self.dest_path = dest_path
+        self.file_type = file_type
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.on_downloaded = on_downloaded
+        self.on_batch = on_batch
+        self.parse_cfg = parse_cfg
+        self.file_hash = None
+        self.parsed_rows = 0
+        self.parse_seconds = 0.0  # Parser busy time, excluding waits on the download and load stages
+
+        self._streamable = split_file_type(file_type)[0] != "parquet"
+        self._cancelled = threading.Event()
+        self._downloaded = threading.Event()
+        self._errors = []
+        self._bytes = _Channel(queue_size, self._cancelled)
+        self._batches = _Channel(queue_size, self._cancelled)
+
+    def _fail(self, e: BaseException):
+        if not isinstance(e, PipelineCancelled):
+            self._errors.append(e)
+        self._cancelled.set()
+
+    def _download_stage(self):
+        sha256_hash = hashlib.sha256()
+
+        def on_chunk(chunk: bytes):
+            sha256_hash.update(chunk)
+            if self._streamable:
+                self._bytes.put(chunk)
+
+        try:
+            self.fetch(self.url, self.dest_path, on_chunk=on_chunk)
+            self.file_hash = sha256_hash.hexdigest()
+            if self.on_downloaded:
+                self.on_downloaded(self.file_hash)
+            self._downloaded.set()
+            if self._streamable:
+                self._bytes.close()
+        except BaseException as e:
+            self._fail(e)
+
+    def _forward(self, batches: Iterator[pd.DataFrame], reader: _ChannelReader | None = None):
+        """Hands parsed batches to the load stage while accounting parser busy time."""
+        started, other_seconds = time.perf_counter(), 0.0
+        for batch in batches:
+            self.parsed_rows += len(batch)
+            other_started = time.perf_counter()
+            if self.on_batch:
+                # Runs on the parse thread, overlapping with the DB inserts of the previous batch
+                self.on_batch(batch)
+            self._batches.put(batch)
+            other_seconds += time.perf_counter() - other_started
+        waited = reader.wait_seconds if reader else 0.0
+        self.parse_seconds = time.perf_counter() - started - other_seconds - waited
+
+    def _parse_stage(self):
+        try:
+            if self._streamable:
+                reader = _ChannelReader(self._bytes)
+                stream = io.BufferedReader(reader, buffer_size=1024 * 1024)
+                self._forward(iter_record_batches(stream, self.file_type, self.batch_size, self.parse_cfg), reader)
+            else:
+                # Parquet needs the footer, so parsing starts once the file is on disk
+                while not self._downloaded.wait(timeout=0.1):
+                    if self._cancelled.is_set():
+                        raise PipelineCancelled()
+                with open(self.dest_path, "rb") as f:
+                    self._forward(iter_record_batches(f, self.file_type, self.batch_size, self.parse_cfg))
+            self._batches.close()
+        except BaseException as e:
+            self._fail(e)
+
+    def batches(self) -> Iterator[pd.DataFrame]:
+        """Starts the download and parse stages and yields parsed batches as they become ready."""
+        threads = [
+            threading.Thread(target=self._download_stage, name="ingest-download", daemon=True),
+            threading.Thread(target=self._parse_stage, name="ingest-parse", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                batch = self._batches.get()
+                if batch is _END:
+                    break
+                yield batch
+        except PipelineCancelled:
+            pass
+        except BaseException as e:
+            # Load stage failed (or consumer stopped early): stop the producers too
+            self._fail(e)
+            raise
+        finally:
+            if not self._downloaded.is_set() or self._errors:
+                self._cancelled.set()
+            for t in threads:
+                t.join()
+
+        if self._errors:
+            raise self._errors[0]
@@ -0,0 +1,195 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HLL_PRECISION = 12  # 4096 registers, ~1.6% standard error
+DEFAULT_SKETCH_K = 200
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+class HyperLogLog:
+    """Approximate distinct counter over 64-bit hashes."""
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray):
+        hashes = hashes.astype(np.uint64, copy=False)
+        suffix_bits = 64 - self.precision
+        index = (hashes >> np.uint64(suffix_bits)).astype(np.int64)
+        suffix = hashes & np.uint64((1 << suffix_bits) - 1)
+        # Rank = position of the leftmost 1-bit in the suffix (suffix_bits + 1 if it is all zeros)
+        _, exponent = np.frexp(suffix.astype(np.float64))
+        rank = np.where(suffix == 0, suffix_bits + 1, suffix_bits - exponent + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+class QuantileSketch:
+    """KLL-style compacting sketch: keeps O(k log n) samples with weights 2**level."""
+
+    def __init__(self, k: int = DEFAULT_SKETCH_K, seed: int | None = None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[level])
+                # An odd item out stays behind; the rest is halved with a random offset
+                keep, items = items[:len(items) % 2], items[len(items) % 2:]
+                offset = int(self._rng.integers(0, 2))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset::2]])
+                self.levels[level] = keep
+            level += 1
+
+    def quantiles(self, qs: tuple = QUANTILES) -> dict[str, float]:
+        if not self.n:
+            return {}
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2.0 ** h) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, cumulative = items[order], np.cumsum(weights[order])
+        ranks = np.searchsorted(cumulative, np.array(qs) * cumulative[-1])
+        return {f"p{int(q * 100):02d}": float(items[min(r, len(items) - 1)]) for q, r in zip(qs, ranks)}
+
+class ColumnProfile:
+    """Running statistics of one column."""
+
+    def __init__(self, hll_precision: int, sketch_k: int):
+        self.kind = None  # "numeric" or "string"
+        self.integral = True  # Every numeric value is integral (what int/bigint staging casts accept)
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.hll = HyperLogLog(hll_precision)
+        self.sketch = QuantileSketch(sketch_k)
+
+    def _as_string(self):
+        """Demotes a numeric column to string once a batch holds non-numeric values."""
+        self.kind = "string"
+        self.min = None if self.min is None else str(self.min)
+        self.max = None if self.max is None else str(self.max)
+        self.sketch = None
+
+    def update(self, series: pd.Series):
+        non_null = series.dropna()
+        self.nulls += len(series) - len(non_null)
+        self.count += len(non_null)
+        if non_null.empty:
+            return
+
+        numeric = non_null if pd.api.types.is_numeric_dtype(non_null) and not pd.api.types.is_bool_dtype(non_null) \
+            else pd.to_numeric(non_null, errors="coerce")
+        if self.kind != "string" and numeric.notna().all():
+            self.kind = "numeric"
+            values = numeric.to_numpy(dtype=np.float64)
+            self.integral = self.integral and bool(np.all(np.mod(values, 1) == 0))
+            # Hash numbers as float64 so 5 and 5.0 from differently-typed batches count once
+            self.hll.add_hashes(pd.util.hash_array(values))
+            self.sketch.update(values)
+            low, high = float(values.min()), float(values.max())
+        else:
+            if self.kind != "string":
+                self._as_string()
+            values = non_null.astype(str)
+            self.hll.add_hashes(pd.util.hash_array(values.to_numpy(dtype=object)))
+            low, high = values.min(), values.max()
+
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def to_dict(self) -> dict:
+        total = self.count + self.nulls
+        return {
+            "kind": self.kind,
+            "integral": self.kind == "numeric" and self.integral,
+            "count": self.count,
+            "nulls": self.nulls,
+            "null_fraction": self.nulls / total if total else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "distinct": self.hll.count() if self.count else 0,
+            "quantiles": self.sketch.quantiles() if self.sketch else {},
+        }
+
+class StreamingProfiler:
+    """One-pass profile of a stream of DataFrame batches: nulls, min/max, HLL distinct counts and quantiles."""
+
+    def __init__(self, hll_precision: int = DEFAULT_HLL_PRECISION, sketch_k: int = DEFAULT_SKETCH_K):
+        self.hll_precision = hll_precision
+        self.sketch_k = sketch_k
+        self.rows = 0
+        self.columns = {}
+
+    def update(self, df: pd.DataFrame):
+        for name in df.columns:
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = ColumnProfile(self.hll_precision, self.sketch_k)
+                # Rows seen before the column first appeared count as nulls
+                column.nulls = self.rows
+            column.update(df[name])
+        for name, column in self.columns.items():
+            if name not in df.columns:
+                column.nulls += len(df)
+        self.rows += len(df)
+
+    def observe(self, batches):
+        """Profiles batches while passing them through unchanged."""
+        for df in batches:
+            self.update(df)
+            yield df
+
+    def to_dict(self) -> dict:
+        return {"rows": self.rows, "columns": {name: column.to_dict() for name, column in self.columns.items()}}
+
+def profile_drift(current: dict, baseline: dict) -> dict[str, float]:
+    """Per-column drift score between two profiles (0 = identical; relative change otherwise).
+
+    Looks at null fraction, distinct count relative to rows and, for numeric
+    columns, the p05/p50/p95 quantiles. Columns missing from either side score inf.
+    """
+    scores = {}
+    for name in set(current["columns"]) | set(baseline["columns"]):
+        cur, base = current["columns"].get(name), baseline["columns"].get(name)
+        if cur is None or base is None or cur["kind"] != base["kind"]:
+            scores[name] = float("inf")
+            continue
+
+        diffs = [abs(cur["null_fraction"] - base["null_fraction"])]
+        cur_ratio = cur["distinct"] / max(current["rows"], 1)
+        base_ratio = base["distinct"] / max(baseline["rows"], 1)
+        diffs.append(abs(cur_ratio - base_ratio) / max(base_ratio, 1e-9))
+        for q in ("p05", "p50", "p95"):
+            if q in cur["quantiles"] and q in base["quantiles"]:
+                b = base["quantiles"][q]
+                diffs.append(abs(cur["quantiles"][q] - b) / max(abs(b), 1e-9))
+        scores[name] = max(diffs)
+    return scores
@@ -0,0 +1,198 @@
+import gzip
+import logging
+from typing import BinaryIO, Iterator
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50_000
+
+# file_type values accepted in config.yaml: "<format>" or "<format>.<compression>"
+SUPPORTED_FORMATS = ("csv", "jsonl", "parquet")
+SUPPORTED_COMPRESSIONS = ("gz", "zst")
+
+def split_file_type(file_type: str) -> tuple[str, str | None]:
+    """Splits a config file_type such as 'csv.gz' into (format, compression)."""
+    fmt, _, compression = file_type.lower().partition(".")
+    compression = compression or None
+
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported file_type '{file_type}'. Expected one of {SUPPORTED_FORMATS}.")
+    if compression is not None and compression not in SUPPORTED_COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}'. Expected one of {SUPPORTED_COMPRESSIONS}.")
+    if fmt == "parquet" and compression is not None:
+        raise ValueError("Parquet files carry their own page compression; use file_type 'parquet'.")
+    return fmt, compression
+
+def clean_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Strips whitespace and stray quotes from column names."""
+    df.columns = [str(col).strip().replace('"', '') for col in df.columns]
+    return df
+
+def open_decompressed(stream: BinaryIO, compression: str | None) -> BinaryIO:
+    """Wraps a binary stream with an incremental decompressor."""
+    if compression == "gz":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if compression == "zst":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstandard is required for '.zst' sources (pip install zstandard).") from e
+        return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    return stream
+
+# parse.dtypes values accepted in config.yaml
+INTEGER_DTYPES = ("int8", "int16", "int32", "int64", "uint8", "uint16", "uint32", "uint64")
+FLOAT_DTYPES = ("float32", "float64")
+SUPPORTED_DTYPES = INTEGER_DTYPES + FLOAT_DTYPES + ("bool", "string", "category")
+# Integer and bool columns are parsed into pandas' nullable dtypes, so an empty cell is <NA> with either engine
+NULLABLE_DTYPES = {dtype: ("UInt" + dtype[4:] if dtype.startswith("uint") else "Int" + dtype[3:]) for dtype in INTEGER_DTYPES}
+NULLABLE_DTYPES["bool"] = "boolean"
+SUPPORTED_ENGINES = ("c", "pyarrow")
+ARROW_BYTES_PER_ROW = 64  # Rough CSV row width, to size Arrow read blocks to about batch_size rows
+
+def parse_settings(parse_cfg: dict | None) -> tuple[str, dict]:
+    """Validates a dataset's `parse` block and returns (engine, {column: dtype})."""
+    parse_cfg = parse_cfg or {}
+    engine = parse_cfg.get("engine", "c")
+    dtypes = parse_cfg.get("dtypes") or {}
+    if engine not in SUPPORTED_ENGINES:
+        raise ValueError(f"Unsupported parse engine '{engine}'. Expected one of {SUPPORTED_ENGINES}.")
+    unsupported = {col: dtype for col, dtype in dtypes.items() if dtype not in SUPPORTED_DTYPES}
+    if unsupported:
+        raise ValueError(f"Unsupported dtypes {unsupported}. Expected one of {SUPPORTED_DTYPES}.")
+    return engine, {str(col): dtype for col, dtype in dtypes.items()}
+
+def _keep_as_parsed(column: str, dtype: str, error):
+    logger.warning(f"Column {column} has values that do not fit {dtype}; keeping it as parsed in this batch ({error}).")
+
+def _cast_column(series: pd.Series, dtype: str) -> pd.Series:
+    if dtype in INTEGER_DTYPES or dtype in FLOAT_DTYPES:
+        numbers = pd.to_numeric(series, errors="coerce")
+        if numbers.isna().sum() > series.isna().sum():
+            raise ValueError("non-numeric value")
+        series = numbers
+    return series.astype(NULLABLE_DTYPES.get(dtype, dtype))
+
+def apply_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """Casts planned columns of a parsed batch (names as cleaned by clean_columns).
+
+    A column holding a value its dtype cannot represent (text in an int16 column, 340.5,
+    an overflow) is left as parsed for that batch instead of failing the ingestion: the
+    raw layer keeps the original value and staging DQ rejects the row.
+    """
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        try:
+            df[col] = _cast_column(df[col], dtype)
+        except (ValueError, TypeError, OverflowError) as e:
+            _keep_as_parsed(col, dtype, e)
+    return df
+
+def _arrow_type(dtype: str):
+    import pyarrow as pa
+    if dtype == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    if dtype == "string":
+        return pa.string()
+    if dtype == "bool":
+        return pa.bool_()
+    return pa.from_numpy_dtype(dtype)
+
+def _cast_arrow(column, target):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if pa.types.is_dictionary(target):
+        return column.cast(pa.string()).dictionary_encode()
+    if pa.types.is_string(column.type):
+        # Values such as ' 340' stay strings in Arrow's type inference
+        column = pc.utf8_trim_whitespace(column)
+        if pa.types.is_integer(target):
+            try:
+                return column.cast(target)
+            except pa.ArrowInvalid:
+                # '340.0' casts like it does with the pandas engine; the safe cast still rejects 340.5
+                return column.cast(pa.float64()).cast(target)
+    return column.cast(target)
+
+def _iter_csv_arrow(stream: BinaryIO, batch_size: int, dtypes: dict) -> Iterator[pd.DataFrame]:
+    """Reads CSV with the multithreaded Arrow parser, casting planned columns in Arrow before pandas sees them.
+
+    Integers land in their downcast width (as nullable pandas dtypes) and categoricals as
+    dictionary arrays, which become pandas Categoricals without one Python string per row.
+    Columns that fail their cast are left as parsed, as in apply_dtypes.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError as e:
+        raise ImportError("pyarrow is required for parse engine 'pyarrow' (pip install pyarrow).") from e
+
+    reader = pacsv.open_csv(
+        stream,
+        read_options=pacsv.ReadOptions(block_size=max(1 << 20, batch_size * ARROW_BYTES_PER_ROW)),
+        # Empty fields are nulls, as with the pandas parser
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+    names = [str(name).strip().replace('"', '') for name in reader.schema.names]
+    targets = {i: _arrow_type(dtypes[name]) for i, name in enumerate(names) if name in dtypes}
+    nullable = {_arrow_type(dtype): pd.api.types.pandas_dtype(NULLABLE_DTYPES[dtype]) for dtype in NULLABLE_DTYPES}
+    for batch in reader:
+        columns = []
+        for i, column in enumerate(batch.columns):
+            target = targets.get(i)
+            if target is not None and column.type != target:
+                try:
+                    column = _cast_arrow(column, target)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                    _keep_as_parsed(names[i], dtypes[names[i]], e)
+            columns.append(column)
+        batch = pa.RecordBatch.from_arrays(columns, names=names)
+        for offset in range(0, batch.num_rows, batch_size):
+            yield batch.slice(offset, batch_size).to_pandas(types_mapper=nullable.get)
+
+def _iter_parquet(stream: BinaryIO, batch_size: int) -> Iterator[pd.DataFrame]:
+    """Reads a Parquet file one row group at a time."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("pyarrow is required for 'parquet' sources (pip install pyarrow).") from e
+
+    parquet_file = pq.ParquetFile(stream)
+    for i in range(parquet_file.num_row_groups):
+        row_group = parquet_file.read_row_group(i)
+        # Large row groups are sliced so a batch never exceeds batch_size rows
+        for batch in row_group.to_batches(max_chunksize=batch_size):
+            yield clean_columns(batch.to_pandas())
+
+def iter_record_batches(stream: BinaryIO, file_type: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                        parse_cfg: dict | None = None) -> Iterator[pd.DataFrame]:
+    """Yields DataFrame batches from a raw source stream according to its file_type.
+
+    Compressed text sources are decompressed and parsed incrementally, so at most
+    one batch is materialized in memory at a time. parse_cfg is the dataset's
+    `parse` block: the CSV engine and a dtype plan applied to every batch.
+    """
+    fmt, compression = split_file_type(file_type)
+    engine, dtypes = parse_settings(parse_cfg)
+
+    if fmt == "parquet":
+        # Parquet needs random access to its footer, so the stream must be seekable
+        for df in _iter_parquet(stream, batch_size):
+            yield apply_dtypes(df, dtypes)
+        return
+
+    decoded = open_decompressed(stream, compression)
+    if fmt == "csv" and engine == "pyarrow":
+        yield from _iter_csv_arrow(decoded, batch_size, dtypes)
+        return
+
+    if fmt == "csv":
+        reader = pd.read_csv(decoded, chunksize=batch_size)
+    else:
+        reader = pd.read_json(decoded, lines=True, chunksize=batch_size)
+
+    with reader:
+        for chunk in reader:
+            yield apply_dtypes(clean_columns(chunk), dtypes)
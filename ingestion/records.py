@@ -0,0 +1,94 @@
+import json
+import math
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+logger = logging.getLogger(__name__)
+
+def _json_strings(values: pa.Array) -> pa.Array:
+    """JSON string literals for a string array; json.dumps runs once per distinct value, not per row."""
+    encoded = values.dictionary_encode()
+    literals = pa.array([json.dumps(v) for v in encoded.dictionary.to_pylist()], type=pa.string())
+    return pc.take(literals, encoded.indices)
+
+def _is_nested(t: pa.DataType) -> bool:
+    return (pa.types.is_nested(t) or pa.types.is_binary(t) or pa.types.is_large_binary(t)
+            or pa.types.is_fixed_size_binary(t))
+
+def _json_value(value) -> str:
+    if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return "null"
+    return json.dumps(value, default=str)
+
+def json_objects(series: pd.Series) -> pa.Array:
+    """JSON text per value of a pandas column, one json.dumps each; used for objects, arrays and bytes.
+
+    The original Python values are encoded rather than Arrow's struct or list view of them,
+    which would widen every object to the union of all keys seen in the batch.
+    """
+    return pa.array([_json_value(v) for v in series.tolist()], type=pa.string())
+
+def json_values(column: pa.Array) -> pa.Array:
+    """Encodes each value of an Arrow column as JSON text, with nulls (and NaN/inf) as `null`."""
+    t = column.type
+    if pa.types.is_dictionary(t):
+        # Categoricals: encode the dictionary once and gather by index
+        values = pc.take(json_values(column.dictionary), column.indices)
+    elif pa.types.is_integer(t) or pa.types.is_boolean(t):
+        values = column.cast(pa.string())
+    elif pa.types.is_floating(t):
+        finite = pc.if_else(pc.is_finite(column), column, pa.scalar(None, type=t))
+        values = finite.cast(pa.string())
+    elif pa.types.is_string(t) or pa.types.is_large_string(t):
+        values = _json_strings(column.cast(pa.string()))
+    elif pa.types.is_null(t):
+        values = pa.nulls(len(column), type=pa.string())
+    else:
+        # Dates, timestamps, decimals: their ISO/decimal text as a JSON string
+        values = _json_strings(column.cast(pa.string()))
+    return pc.fill_null(values, "null")
+
+def json_records(df: pd.DataFrame) -> pa.Array:
+    """One JSON object per row of df, assembled column by column in Arrow kernels.
+
+    Numeric columns are read straight from their NumPy buffers and no Python dict or
+    boxed value is created per row. Nested objects and arrays (struct/list columns),
+    and any column Arrow cannot encode, go through json_objects on the pandas values.
+    Mixed-type object columns that Arrow cannot type at all fall back to json.dumps
+    over df.to_dict(orient="records").
+    """
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        logger.debug(f"Falling back to row-wise JSON encoding: {e}")
+        return pa.array([json.dumps(row) for row in df.to_dict(orient="records")], type=pa.string())
+
+    if table.num_columns == 0:
+        return pa.array(["{}"] * table.num_rows, type=pa.string())
+    parts = []
+    for i, name in enumerate(table.column_names):
+        parts.append(("{" if i == 0 else ",") + json.dumps(str(name)) + ":")
+        column = table.column(i).combine_chunks()
+        if _is_nested(column.type):
+            values = json_objects(df.iloc[:, i])
+        else:
+            try:
+                values = json_values(column)
+            except (pa.ArrowNotImplementedError, pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                logger.debug(f"Encoding column {name} value by value: {e}")
+                values = json_objects(df.iloc[:, i])
+        parts.append(values)
+    parts.append("}")
+    return pc.binary_join_element_wise(*parts, "")
+
+def raw_copy_payload(df: pd.DataFrame, source_name: str, ingestion_id: int) -> bytes:
+    """COPY text-format rows (source_name, ingestion_id, record) for raw_records, built without per-row Python objects."""
+    if df.empty:
+        return b""
+    # COPY text format treats backslash as an escape; JSON text never contains raw tabs or newlines
+    records = pc.replace_substring(json_records(df), "\\", "\\\\")
+    lines = pc.binary_join_element_wise(f"{source_name}\t{ingestion_id}\t", records, "")
+    joined = pc.binary_join(pa.ListArray.from_arrays(pa.array([0, len(lines)], type=pa.int32()), lines), "\n")
+    return joined[0].as_py().encode("utf-8") + b"\n"
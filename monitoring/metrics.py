@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+logger = logging.getLogger("metrics")
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames: tuple, key: tuple, extra: dict | None = None) -> str:
+    pairs = list(zip(labelnames, key)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> list[str]:
+        return [f"# TYPE {self.name} {self.type_name}", f"# HELP {self.name} {self.documentation}"]
+
+class Counter(_Metric):
+    """Monotonic counter; exposed as <name>_total."""
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Gauge(_Metric):
+    """Last observed value, e.g. the throughput of the most recent run."""
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with _bucket, _count and _sum samples."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the `with` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': _format_value(float(bound))})} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Returns every metric in OpenMetrics text format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# Ingestion
+DOWNLOAD_BYTES = REGISTRY.register(Counter("pipeline_download_bytes", "Bytes received from dataset sources.", ("dataset",)))
+DOWNLOAD_THROUGHPUT = REGISTRY.register(Gauge("pipeline_download_bytes_per_second", "Download throughput of the last ingestion.", ("dataset",)))
+PARSED_ROWS = REGISTRY.register(Counter("pipeline_parsed_rows", "Rows parsed from source files.", ("dataset",)))
+PARSE_THROUGHPUT = REGISTRY.register(Gauge("pipeline_parse_rows_per_second", "Parse throughput of the last ingestion, excluding time spent waiting for bytes.", ("dataset",)))
+RAW_INSERTED_ROWS = REGISTRY.register(Counter("pipeline_raw_inserted_rows", "Rows inserted into raw_records.", ("dataset",)))
+RAW_INSERT_THROUGHPUT = REGISTRY.register(Gauge("pipeline_raw_insert_rows_per_second", "raw_records insert throughput of the last ingestion.", ("dataset",)))
+
+# Transformation and warehouse
+DQ_DURATION = REGISTRY.register(Histogram("pipeline_dq_duration_seconds", "Time spent in data quality validation.", ("dataset",)))
+DQ_REJECTED_ROWS = REGISTRY.register(Counter("pipeline_dq_rejected_rows", "Rows quarantined to dq_rejects by staging DQ.", ("dataset",)))
+STATEMENT_DURATION = REGISTRY.register(Histogram("pipeline_statement_duration_seconds", "Latency of pipeline SQL statements.", ("layer", "statement")))
+STAGE_DURATION = REGISTRY.register(Histogram("pipeline_stage_duration_seconds", "Wall time of each pipeline step.", ("stage",)))
+
+# Database
+CONNECTION_ACQUIRE = REGISTRY.register(Histogram(
+    "pipeline_db_connection_acquire_seconds", "Time to open a PostgreSQL connection.", (),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+))
+
+def write_textfile(path: str | Path, registry: Registry = REGISTRY):
+    """Writes the metrics atomically for the node_exporter textfile collector."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_http_server(port: int, addr: str = "127.0.0.1", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serves /metrics from a daemon thread for scraping during long runs."""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics at http://{addr}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,261 @@
+import logging
+from database.connection import get_connection
+
+logger = logging.getLogger("jobs")
+
+TASKS = ("ingestion", "staging", "warehouse")
+
+# Stage that becomes runnable once a task succeeds; the warehouse job is shared by all datasets
+NEXT_TASK = {"ingestion": "staging", "staging": "warehouse"}
+
+# An identical job is already pending (the unique index allows one PENDING job per task and dataset)
+PENDING_DUPLICATE = """
+    EXISTS (
+        SELECT 1 FROM pipeline_jobs p
+        WHERE p.status = 'PENDING' AND p.task = pipeline_jobs.task
+          AND COALESCE(p.dataset_name, '') = COALESCE(pipeline_jobs.dataset_name, '')
+    )
+"""
+
+# Status for a job that is given back to the queue: out of attempts, folded into an already
+# pending duplicate, or pending again
+REQUEUE_STATUS = f"""
+    CASE
+        WHEN attempts >= max_attempts THEN 'FAILED'
+        WHEN {PENDING_DUPLICATE} THEN 'SUPERSEDED'
+        ELSE 'PENDING'
+    END
+"""
+
+# Status for a job handed back without having run; it never runs out of attempts
+RELEASE_STATUS = f"CASE WHEN {PENDING_DUPLICATE} THEN 'SUPERSEDED' ELSE 'PENDING' END"
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY_SECONDS = 30
+
+def enqueue(cur, task: str, dataset_name: str | None = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int | None:
+    """Adds a PENDING job unless an identical one is already pending. Returns the new job_id or None."""
+    if task not in TASKS:
+        raise ValueError(f"Unsupported task '{task}'. Expected one of {TASKS}.")
+    cur.execute(
+        """
+        INSERT INTO pipeline_jobs (task, dataset_name, max_attempts)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (task, (COALESCE(dataset_name, ''))) WHERE status = 'PENDING' DO NOTHING
+        RETURNING job_id
+        """,
+        (task, dataset_name, max_attempts)
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def enqueue_datasets(names: list[str], max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> list[int]:
+    """Enqueues an ingestion job per dataset; staging and warehouse jobs follow as each stage succeeds."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        job_ids = [enqueue(cur, "ingestion", name, max_attempts) for name in names]
+        conn.commit()
+        return [job_id for job_id in job_ids if job_id is not None]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+CLAIM_SQL = """
+    UPDATE pipeline_jobs j
+    SET status = 'RUNNING', worker_id = %s, attempts = j.attempts + 1,
+        started_at = now(), heartbeat_at = now(),
+        lease_expires_at = now() + make_interval(secs => %s)
+    FROM (
+        SELECT job_id FROM pipeline_jobs
+        WHERE status = 'PENDING' AND run_after <= now() AND task = ANY(%s)
+        ORDER BY run_after, job_id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ) next_job
+    WHERE j.job_id = next_job.job_id
+    RETURNING j.job_id, j.task, j.dataset_name, j.attempts, j.max_attempts
+"""
+
+def claim(worker_id: str, lease_seconds: float, tasks: tuple = TASKS) -> dict | None:
+    """Leases the oldest runnable job to this worker, or returns None when the queue is empty.
+
+    SKIP LOCKED lets concurrent workers pass over rows another worker is claiming
+    instead of queueing behind its row lock.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(CLAIM_SQL, (worker_id, lease_seconds, list(tasks)))
+        row = cur.fetchone()
+        conn.commit()
+        if row is None:
+            return None
+        return dict(zip(("job_id", "task", "dataset_name", "attempts", "max_attempts"), row))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def heartbeat(job_id: int, worker_id: str, lease_seconds: float) -> bool:
+    """Extends the lease. Returns False if the job is no longer leased to this worker."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            UPDATE pipeline_jobs
+            SET heartbeat_at = now(), lease_expires_at = now() + make_interval(secs => %s)
+            WHERE job_id = %s AND worker_id = %s AND status = 'RUNNING'
+            """,
+            (lease_seconds, job_id, worker_id)
+        )
+        conn.commit()
+        return cur.rowcount == 1
+    finally:
+        cur.close()
+        conn.close()
+
+def set_run_id(job_id: int, run_id: int | None):
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE pipeline_jobs SET run_id = %s WHERE job_id = %s", (run_id, job_id))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def complete(job: dict, worker_id: str) -> bool:
+    """Marks the job SUCCESS and enqueues the next stage in the same transaction.
+
+    Returns False if the lease was lost (the job was re-queued and may already be running elsewhere).
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            UPDATE pipeline_jobs
+            SET status = 'SUCCESS', finished_at = now(), lease_expires_at = NULL, error_message = NULL
+            WHERE job_id = %s AND worker_id = %s AND status = 'RUNNING'
+            """,
+            (job["job_id"], worker_id)
+        )
+        if cur.rowcount != 1:
+            conn.rollback()
+            logger.warning(f"Job {job['job_id']} finished after its lease expired; result not recorded.")
+            return False
+        next_task = NEXT_TASK.get(job["task"])
+        if next_task:
+            enqueue(cur, next_task, job["dataset_name"] if next_task != "warehouse" else None, job["max_attempts"])
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def fail(job: dict, worker_id: str, error_message: str, retry_delay_seconds: float = DEFAULT_RETRY_DELAY_SECONDS) -> str | None:
+    """Re-queues the job with a delay that doubles per attempt, or marks it FAILED once attempts run out."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"""
+            UPDATE pipeline_jobs
+            SET status = {REQUEUE_STATUS},
+                run_after = now() + make_interval(secs => %s * power(2, attempts - 1)),
+                finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+                worker_id = NULL, lease_expires_at = NULL, error_message = %s
+            WHERE job_id = %s AND worker_id = %s AND status = 'RUNNING'
+            RETURNING status
+            """,
+            (retry_delay_seconds, error_message, job["job_id"], worker_id)
+        )
+        row = cur.fetchone()
+        conn.commit()
+        return row[0] if row else None
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def release(job: dict, worker_id: str, reason: str, delay_seconds: float = DEFAULT_RETRY_DELAY_SECONDS) -> str | None:
+    """Hands a job that did not run back to the queue after a fixed delay, without spending an attempt.
+
+    Used when another run holds the job's lock: contention alone must never mark a job FAILED.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"""
+            UPDATE pipeline_jobs
+            SET status = {RELEASE_STATUS},
+                attempts = GREATEST(attempts - 1, 0),
+                run_after = now() + make_interval(secs => %s),
+                worker_id = NULL, lease_expires_at = NULL, error_message = %s
+            WHERE job_id = %s AND worker_id = %s AND status = 'RUNNING'
+            RETURNING status
+            """,
+            (delay_seconds, reason, job["job_id"], worker_id)
+        )
+        row = cur.fetchone()
+        conn.commit()
+        return row[0] if row else None
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def requeue_expired() -> list[tuple]:
+    """Gives jobs whose worker stopped heartbeating back to the queue (FAILED once out of attempts)."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT job_id FROM pipeline_jobs
+            WHERE status = 'RUNNING' AND lease_expires_at < now()
+            ORDER BY job_id
+            FOR UPDATE SKIP LOCKED
+            """
+        )
+        rows = []
+        # One statement per job, so a second expired twin sees the first one already pending
+        for (job_id,) in cur.fetchall():
+            cur.execute(
+                f"""
+                UPDATE pipeline_jobs
+                SET status = {REQUEUE_STATUS},
+                    finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+                    error_message = 'Lease expired on worker ' || worker_id,
+                    worker_id = NULL, lease_expires_at = NULL, run_after = now()
+                WHERE job_id = %s
+                RETURNING job_id, status
+                """,
+                (job_id,)
+            )
+            rows.append(cur.fetchone())
+        conn.commit()
+        for job_id, status in rows:
+            logger.warning(f"Job {job_id} lease expired; now {status}.")
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
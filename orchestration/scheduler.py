@@ -0,0 +1,186 @@
+import sys
+import random
+import signal
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from database.connection import get_connection, init_pool, close_pool
+from monitoring.metrics import start_http_server, write_textfile
+from run_pipeline import PIPELINE_NAME, load_config, run_once
+
+logger = logging.getLogger("scheduler")
+
+CONFIG_PATH = Path("config/config.yaml")
+DEFAULT_INTERVAL_MINUTES = 60
+DEFAULT_JITTER_SECONDS = 30
+DEFAULT_POOL_MIN = 1
+DEFAULT_POOL_MAX = 8
+
+def dataset_schedules(config: dict) -> dict[str, dict]:
+    """Reads each dataset's `schedule` block as {name: {interval, jitter_seconds, catch_up}}."""
+    defaults = config.get("scheduler", {})
+    schedules = {}
+    for ds in config.get("datasets", []):
+        schedule = ds.get("schedule") or {}
+        if schedule.get("enabled", True) is False:
+            continue
+        schedules[ds["name"]] = {
+            "interval": timedelta(minutes=schedule.get("interval_minutes", defaults.get("interval_minutes", DEFAULT_INTERVAL_MINUTES))),
+            "jitter_seconds": schedule.get("jitter_seconds", defaults.get("jitter_seconds", DEFAULT_JITTER_SECONDS)),
+            "catch_up": schedule.get("catch_up", defaults.get("catch_up", True)),
+        }
+    return schedules
+
+def last_successful_runs(names: list[str]) -> dict[str, datetime]:
+    """Start time of each dataset's latest SUCCESS run in pipeline_run_history (scheduled runs are named per dataset)."""
+    if not names:
+        return {}
+    run_names = {f"{PIPELINE_NAME} [{name}]": name for name in names}
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT pipeline_name, MAX(start_time) FROM pipeline_run_history
+            WHERE pipeline_name = ANY(%s) AND status = 'SUCCESS'
+            GROUP BY pipeline_name
+            """,
+            (list(run_names),)
+        )
+        return {run_names[pipeline_name]: started for pipeline_name, started in cur.fetchall()}
+    finally:
+        cur.close()
+        conn.close()
+
+class Scheduler:
+    """Runs each dataset's pipeline on its own interval from one long-lived process.
+
+    Config is parsed once and the connection pool stays warm between runs.
+    SIGHUP reloads config.yaml; SIGTERM/SIGINT finish the current run and exit.
+    """
+
+    def __init__(self, config_path: Path = CONFIG_PATH, lock_mode: str | None = None):
+        self.config_path = config_path
+        self.lock_mode = lock_mode
+        self.config = load_config(config_path)
+        self.schedules = {}
+        self.next_due = {}
+        self._wake = threading.Event()
+        self._reload_requested = False
+        self._stop_requested = False
+
+    def _jitter(self, name: str) -> timedelta:
+        # Spreads runs of datasets sharing an interval so they don't all hit sources and locks at once
+        return timedelta(seconds=random.uniform(0, self.schedules[name]["jitter_seconds"]))
+
+    def _plan(self, names: list[str]):
+        """Sets the first due time for newly scheduled datasets from their last successful run."""
+        now = datetime.now()
+        try:
+            last_runs = last_successful_runs(names)
+        except Exception as e:
+            logger.warning(f"Could not read run history, scheduling from now: {e}")
+            last_runs = {}
+        for name in names:
+            schedule = self.schedules[name]
+            last = last_runs.get(name)
+            if last is None:
+                due = now
+            elif last + schedule["interval"] <= now:
+                # Missed while the daemon was down: one catch-up run replaces all missed ones
+                due = now if schedule["catch_up"] else now + schedule["interval"]
+            else:
+                due = last + schedule["interval"]
+            self.next_due[name] = due + self._jitter(name)
+            logger.info(f"Scheduled {name} every {schedule['interval']} (next run {self.next_due[name]:%Y-%m-%d %H:%M:%S})")
+
+    def reload(self):
+        """Re-reads config.yaml; datasets with an unchanged interval keep their next due time."""
+        try:
+            config = load_config(self.config_path)
+        except Exception as e:
+            logger.error(f"Config reload failed, keeping the current config: {e}")
+            return
+        old = self.schedules
+        self.config = config
+        self.schedules = dataset_schedules(config)
+        for name in set(self.next_due) - set(self.schedules):
+            del self.next_due[name]
+        changed = [name for name in self.schedules if name not in old or old[name]["interval"] != self.schedules[name]["interval"]]
+        for name in changed:
+            self.next_due.pop(name, None)
+        self._plan(changed)
+        logger.info(f"Config reloaded from {self.config_path} ({len(self.schedules)} scheduled datasets).")
+
+    def _on_sighup(self, signum, frame):
+        self._reload_requested = True
+        self._wake.set()
+
+    def _on_stop(self, signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, stopping after the current run.")
+        self._stop_requested = True
+        self._wake.set()
+
+    def run_due(self):
+        """Runs every dataset whose due time has passed, oldest first."""
+        for name in sorted(self.next_due, key=self.next_due.get):
+            if self._stop_requested or self.next_due[name] > datetime.now():
+                continue
+            status = run_once(self.config, [name], self.lock_mode)
+            # Next slot is measured from the end of this run, so a slow run never queues a burst of reruns
+            self.next_due[name] = datetime.now() + self.schedules[name]["interval"] + self._jitter(name)
+            logger.info(f"{name}: {status}; next run {self.next_due[name]:%Y-%m-%d %H:%M:%S}")
+
+            metrics_textfile = self.config.get("monitoring", {}).get("metrics_textfile")
+            if metrics_textfile:
+                write_textfile(metrics_textfile)
+
+    def serve(self):
+        scheduler_cfg = self.config.get("scheduler", {})
+        init_pool(scheduler_cfg.get("pool_min", DEFAULT_POOL_MIN), scheduler_cfg.get("pool_max", DEFAULT_POOL_MAX))
+        monitoring_cfg = self.config.get("monitoring", {})
+        if monitoring_cfg.get("metrics_port"):
+            start_http_server(monitoring_cfg["metrics_port"], monitoring_cfg.get("metrics_addr", "127.0.0.1"))
+
+        signal.signal(signal.SIGHUP, self._on_sighup)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        self.schedules = dataset_schedules(self.config)
+        self._plan(list(self.schedules))
+        logger.info(f"Scheduler started; send SIGHUP to reload {self.config_path}.")
+        try:
+            while not self._stop_requested:
+                # Cleared before the flags are read, so a signal arriving mid-loop still cuts the next wait short
+                self._wake.clear()
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                self.run_due()
+
+                if not self.next_due:
+                    timeout = None
+                else:
+                    timeout = max(0.0, (min(self.next_due.values()) - datetime.now()).total_seconds())
+                self._wake.wait(timeout)
+        finally:
+            close_pool()
+            logger.info("Scheduler stopped.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline per dataset on the schedules in config.yaml.")
+    parser.add_argument("--config", type=Path, default=CONFIG_PATH, help="Path to config.yaml")
+    parser.add_argument("--lock-mode", choices=["wait", "skip"], help="Override locking.mode from config.yaml")
+    args = parser.parse_args()
+
+    Scheduler(args.config, args.lock_mode).serve()
+
+if __name__ == "__main__":
+    main()
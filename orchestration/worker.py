@@ -0,0 +1,182 @@
+import os
+import sys
+import socket
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from database.connection import log_pipeline_start, log_pipeline_end
+from database.locks import dataset_lock, table_lock, lock_settings, new_lock_stats, run_locked
+from ingestion.ingest import ingest_dataset
+from transforms.load_staging import load_if_changed as load_staging_if_changed
+from warehouse.load_warehouse import WATERMARK_NAME, load_if_changed as load_warehouse_if_changed
+from orchestration import jobs
+from run_pipeline import PIPELINE_NAME, load_config
+
+logger = logging.getLogger("worker")
+
+CONFIG_PATH = Path("config/config.yaml")
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_POLL_SECONDS = 5
+
+def _run_ingestion(config: dict, dataset_cfg: dict, stats: dict, mode: str, timeout_seconds: float | None) -> bool:
+    return run_locked([dataset_lock(dataset_cfg["name"])], stats, ingest_dataset,
+                      dataset_cfg, config["storage"], config.get("ingestion", {}),
+                      mode=mode, timeout_seconds=timeout_seconds)
+
+def _run_staging(config: dict, dataset_cfg: dict, stats: dict, mode: str, timeout_seconds: float | None) -> bool:
+    return run_locked([dataset_lock(dataset_cfg["name"]), table_lock(dataset_cfg["target_stg"])], stats,
+                      load_staging_if_changed, dataset_cfg, config.get("storage"), stats,
+                      mode=mode, timeout_seconds=timeout_seconds)
+
+def _run_warehouse(config: dict, dataset_cfg: dict | None, stats: dict, mode: str, timeout_seconds: float | None) -> bool:
+    return run_locked([table_lock(WATERMARK_NAME)], stats, load_warehouse_if_changed, config.get("storage"), stats,
+                      mode=mode, timeout_seconds=timeout_seconds)
+
+# Same per-dataset/per-table advisory locks as run_pipeline.py, so queue workers and cron runs can overlap safely
+TASK_RUNNERS = {
+    "ingestion": _run_ingestion,
+    "staging": _run_staging,
+    "warehouse": _run_warehouse,
+}
+
+class Worker:
+    """Claims jobs from pipeline_jobs and runs them; any number can run across processes and hosts.
+
+    A heartbeat thread keeps the lease alive while a job runs. If the worker dies,
+    the lease lapses and the next worker to poll puts the job back in the queue.
+    """
+
+    def __init__(self, config_path: Path = CONFIG_PATH, lock_mode: str | None = None, worker_id: str | None = None):
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        self.lock_mode = lock_mode
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        queue_cfg = self.config.get("queue", {})
+        self.lease_seconds = queue_cfg.get("lease_seconds", DEFAULT_LEASE_SECONDS)
+        self.poll_seconds = queue_cfg.get("poll_seconds", DEFAULT_POLL_SECONDS)
+        self.retry_delay_seconds = queue_cfg.get("retry_delay_seconds", jobs.DEFAULT_RETRY_DELAY_SECONDS)
+        self._stop = threading.Event()
+
+    def _heartbeat(self, job: dict, done: threading.Event):
+        # Three beats per lease, so one slow or failed beat doesn't let the lease lapse
+        while not done.wait(self.lease_seconds / 3):
+            try:
+                if not jobs.heartbeat(job["job_id"], self.worker_id, self.lease_seconds):
+                    logger.warning(f"Lost the lease on job {job['job_id']}.")
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job['job_id']} failed: {e}")
+
+    def execute(self, job: dict):
+        """Runs one claimed job and records the outcome in pipeline_jobs and pipeline_run_history."""
+        datasets = {ds["name"]: ds for ds in self.config.get("datasets", [])}
+        label = job["dataset_name"] or "all"
+        run_id = log_pipeline_start(f"{PIPELINE_NAME} / {job['task']} [{label}]")
+        jobs.set_run_id(job["job_id"], run_id)
+        logger.info(f"[{self.worker_id}] Job {job['job_id']}: {job['task']} [{label}] (attempt {job['attempts']}/{job['max_attempts']})")
+
+        mode, timeout_seconds = lock_settings(self.config, self.lock_mode)
+        stats = new_lock_stats()
+        done = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        beat.start()
+        error = None
+        try:
+            if job["dataset_name"] is not None and job["dataset_name"] not in datasets:
+                raise ValueError(f"Dataset '{job['dataset_name']}' is not in {self.config_path}")
+            ran = TASK_RUNNERS[job["task"]](self.config, datasets.get(job["dataset_name"]), stats, mode, timeout_seconds)
+        except Exception as e:
+            error = e
+        finally:
+            done.set()
+            beat.join()
+
+        if error is not None:
+            log_pipeline_end(run_id, "FAILED", str(error), stats["lock_wait_seconds"])
+            status = jobs.fail(job, self.worker_id, str(error), self.retry_delay_seconds)
+            logger.error(f"Job {job['job_id']} failed ({status}): {error}")
+            return
+        if not ran:
+            # The lock holder is doing the same work; retry later without counting it as done or as an attempt
+            log_pipeline_end(run_id, "SKIPPED", f"Skipped (locked by another run): {'; '.join(stats['skipped'])}", stats["lock_wait_seconds"])
+            status = jobs.release(job, self.worker_id, "Skipped: lock held by another run", self.retry_delay_seconds)
+            logger.info(f"Job {job['job_id']} skipped, lock held by another run ({status}).")
+            return
+        log_pipeline_end(run_id, "SUCCESS", None, stats["lock_wait_seconds"], ", ".join(stats["unchanged"]) or None)
+        jobs.complete(job, self.worker_id)
+
+    def _on_stop(self, signum, frame):
+        logger.info(f"[{self.worker_id}] Received {signal.Signals(signum).name}, stopping after the current job.")
+        self._stop.set()
+
+    def serve(self, exit_when_empty: bool = False):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        logger.info(f"Worker {self.worker_id} started (lease {self.lease_seconds}s).")
+        while not self._stop.is_set():
+            try:
+                jobs.requeue_expired()
+                job = jobs.claim(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Queue unavailable: {e}")
+                job = None
+            if job is not None:
+                self.execute(job)
+                continue
+            if exit_when_empty:
+                break
+            self._stop.wait(self.poll_seconds)
+        logger.info(f"Worker {self.worker_id} stopped.")
+
+def _serve(config_path: Path, lock_mode: str | None, exit_when_empty: bool):
+    Worker(config_path, lock_mode).serve(exit_when_empty)
+
+def main():
+    parser = argparse.ArgumentParser(description="Process pipeline jobs from the pipeline_jobs queue.")
+    parser.add_argument("--config", type=Path, default=CONFIG_PATH, help="Path to config.yaml")
+    parser.add_argument("--enqueue", action="store_true", help="Enqueue ingestion for the datasets (then exit unless --processes is given)")
+    parser.add_argument("--dataset", action="append", help="Dataset to enqueue (repeatable); default is all")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes to start on this host")
+    parser.add_argument("--exit-when-empty", action="store_true", help="Stop once no job is runnable")
+    parser.add_argument("--lock-mode", choices=["wait", "skip"], help="Override locking.mode from config.yaml")
+    args = parser.parse_args()
+
+    if args.enqueue:
+        config = load_config(args.config)
+        names = args.dataset or [ds["name"] for ds in config.get("datasets", [])]
+        max_attempts = config.get("queue", {}).get("max_attempts", jobs.DEFAULT_MAX_ATTEMPTS)
+        job_ids = jobs.enqueue_datasets(names, max_attempts)
+        logger.info(f"Enqueued {len(job_ids)} ingestion jobs ({len(names) - len(job_ids)} already pending).")
+        if args.processes is None:
+            return
+
+    processes = args.processes or 1
+    if processes == 1:
+        _serve(args.config, args.lock_mode, args.exit_when_empty)
+        return
+    workers = [
+        multiprocessing.Process(target=_serve, args=(args.config, args.lock_mode, args.exit_when_empty))
+        for _ in range(processes)
+    ]
+    for p in workers:
+        p.start()
+    try:
+        for p in workers:
+            p.join()
+    except KeyboardInterrupt:
+        # Children got the same SIGINT and finish their current job
+        for p in workers:
+            p.join()
+    if any(p.exitcode for p in workers):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
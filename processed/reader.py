@@ -0,0 +1,84 @@
+import logging
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from processed.writer import DEFAULT_PROCESSED_DIR, SNAPSHOTS, decode_schema, load_manifest
+
+logger = logging.getLogger("processed")
+
+# Filters use the (column, op, value) tuple convention of pandas.read_parquet
+_OPERATORS = {
+    "=": lambda f, v: f == v,
+    "==": lambda f, v: f == v,
+    "!=": lambda f, v: f != v,
+    "<": lambda f, v: f < v,
+    "<=": lambda f, v: f <= v,
+    ">": lambda f, v: f > v,
+    ">=": lambda f, v: f >= v,
+    "in": lambda f, v: f.isin(list(v)),
+    "not in": lambda f, v: ~f.isin(list(v)),
+}
+
+def build_filter(filters: list[tuple] | None) -> ds.Expression | None:
+    """Combines (column, op, value) tuples into one Arrow expression (AND)."""
+    if not filters:
+        return None
+    expression = None
+    for column, op, value in filters:
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported filter operator '{op}'. Expected one of {list(_OPERATORS)}.")
+        term = _OPERATORS[op](ds.field(column), value)
+        expression = term if expression is None else expression & term
+    return expression
+
+def open_dataset(name: str, processed_dir: str | Path = DEFAULT_PROCESSED_DIR) -> ds.Dataset:
+    """Opens a published table as an Arrow dataset over the files listed in its manifest."""
+    manifest = load_manifest(processed_dir, name)
+    if manifest is None:
+        raise FileNotFoundError(f"No processed snapshot for {name} in {processed_dir}. Run the pipeline first.")
+
+    table_dir = Path(processed_dir) / name
+    if "arrow_schema" in manifest:
+        schema = decode_schema(manifest["arrow_schema"])
+    elif name in SNAPSHOTS:
+        schema = SNAPSHOTS[name]["schema"]  # Manifest written before schemas were stored in it
+    else:
+        raise ValueError(f"The snapshot manifest of {name} has no schema; publish it again to add one.")
+    partition_field = schema.field(manifest["partition_column"])
+    # Only manifest-listed files are read, so a run that is still writing stays invisible
+    return ds.dataset(
+        [str(table_dir / entry["path"]) for entry in manifest["files"]],
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([partition_field]), flavor="hive"),
+        partition_base_dir=str(table_dir),
+    )
+
+def read_table(name: str, columns: list[str] | None = None, filters: list[tuple] | None = None,
+               processed_dir: str | Path = DEFAULT_PROCESSED_DIR) -> pd.DataFrame:
+    """Reads selected columns of a published table.
+
+    Filters on the partition column skip whole directories; other filters are
+    checked against Parquet row-group statistics before any data is decoded.
+    """
+    dataset = open_dataset(name, processed_dir)
+    return dataset.to_table(columns=columns, filter=build_filter(filters)).to_pandas()
+
+def aggregate(name: str, group_by: list[str], metrics: dict[str, str | list[str]],
+              filters: list[tuple] | None = None, processed_dir: str | Path = DEFAULT_PROCESSED_DIR) -> pd.DataFrame:
+    """Groups a published table and aggregates it in Arrow, e.g. metrics={"passenger_count": "sum"}.
+
+    Only the group and metric columns are read. Result columns are named
+    "<column>_<function>" (e.g. passenger_count_sum).
+    """
+    aggregations = []
+    for column, funcs in metrics.items():
+        for func in [funcs] if isinstance(funcs, str) else funcs:
+            aggregations.append((column, func))
+
+    columns = list(dict.fromkeys(group_by + [column for column, _ in aggregations]))
+    dataset = open_dataset(name, processed_dir)
+    table = dataset.to_table(columns=columns, filter=build_filter(filters))
+    result = table.group_by(group_by).aggregate(aggregations).to_pandas()
+    return result.sort_values(group_by).reset_index(drop=True) if group_by else result
@@ -0,0 +1,236 @@
+import os
+import json
+import base64
+import shutil
+import logging
+from datetime import datetime
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger("processed")
+
+DEFAULT_PROCESSED_DIR = "data/processed"
+DEFAULT_CHUNK_ROWS = 500_000
+MANIFEST_NAME = "_manifest.json"
+
+# Arrow type of each staging cast (transforms.plan.CASTS), for snapshots built from a dataset's plan
+ARROW_TYPES = {
+    "text": pa.string(),
+    "int": pa.int32(),
+    "bigint": pa.int64(),
+    "float": pa.float64(),
+    "bool": pa.bool_(),
+    "date": pa.date32(),
+    "timestamp": pa.timestamp("us"),
+}
+
+# Published warehouse tables: the delta query (rows with watermark < key <= high key), the hive partition
+# column and a fixed Arrow schema so every increment has identical column types. Staging
+# tables get theirs from the dataset's compiled plan (staging_spec).
+SNAPSHOTS = {
+    "fct_air_travel": {
+        "source_table": "fct_air_travel",
+        "key": "fact_id",
+        "partition": "year_val",
+        # Denormalized with dim_month so readers can aggregate without a join
+        "query": """
+            SELECT f.fact_id, f.month_id, d.month_name, f.year_val, f.passenger_count, f.created_at
+            FROM fct_air_travel f
+            JOIN dim_month d ON d.month_id = f.month_id
+            WHERE f.fact_id > %s AND f.fact_id <= %s
+            ORDER BY f.fact_id
+        """,
+        "schema": pa.schema([
+            ("fact_id", pa.int64()),
+            ("month_id", pa.int32()),
+            ("month_name", pa.string()),
+            ("year_val", pa.int32()),
+            ("passenger_count", pa.int64()),
+            ("created_at", pa.timestamp("us")),
+        ]),
+    },
+}
+
+def staging_spec(table: str, plan) -> dict:
+    """Snapshot spec of a staging table laid out by a TransformPlan: stg_id, the mapped columns, loaded_at."""
+    columns = ", ".join(plan.target_columns)
+    return {
+        "source_table": table,
+        "key": "stg_id",
+        "partition": "load_date",
+        "query": f"""
+            SELECT stg_id, {columns}, loaded_at, loaded_at::date AS load_date
+            FROM {table}
+            WHERE stg_id > %s AND stg_id <= %s
+            ORDER BY stg_id
+        """,
+        "schema": pa.schema(
+            [("stg_id", pa.int64())]
+            + [(c["target"], ARROW_TYPES[c["type"]]) for c in plan.columns]
+            + [("loaded_at", pa.timestamp("us")), ("load_date", pa.date32())]
+        ),
+    }
+
+def snapshot_spec(name: str, plan=None) -> dict | None:
+    """The spec of a published table: built from the plan for staging tables, else from SNAPSHOTS (None if neither)."""
+    if plan is not None:
+        return staging_spec(name, plan)
+    return SNAPSHOTS.get(name)
+
+def encode_schema(schema: pa.Schema) -> str:
+    return base64.b64encode(schema.serialize().to_pybytes()).decode("ascii")
+
+def decode_schema(encoded: str) -> pa.Schema:
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(encoded)))
+
+def manifest_path(processed_dir: str | Path, name: str) -> Path:
+    return Path(processed_dir) / name / MANIFEST_NAME
+
+def load_manifest(processed_dir: str | Path, name: str) -> dict | None:
+    """Returns the manifest of a published table, or None if it was never published."""
+    path = manifest_path(processed_dir, name)
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _write_manifest(processed_dir: str | Path, name: str, manifest: dict):
+    """Replaces the manifest atomically; readers only ever see files listed in a complete manifest."""
+    path = manifest_path(processed_dir, name)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _write_partitions(table: pa.Table, table_dir: Path, partition: str, run_stamp: str, seq: int) -> list[dict]:
+    """Writes one Parquet file per partition value (hive layout) and returns their manifest entries."""
+    key_column = table.schema.names[0]
+    entries = []
+    for value in pc.unique(table[partition]).to_pylist():
+        part_table = table.filter(pc.equal(table[partition], value)).drop_columns([partition])
+        rel_path = Path(f"{partition}={value}") / f"part-{run_stamp}-{seq:05d}.parquet"
+        (table_dir / rel_path.parent).mkdir(parents=True, exist_ok=True)
+        pq.write_table(part_table, table_dir / rel_path, compression="zstd")
+
+        keys = part_table[key_column]
+        entries.append({
+            "path": rel_path.as_posix(),
+            "partition": str(value),
+            "rows": part_table.num_rows,
+            "min_key": pc.min(keys).as_py(),
+            "max_key": pc.max(keys).as_py(),
+        })
+    return entries
+
+def publish_snapshot(conn, name: str, processed_dir: str | Path = DEFAULT_PROCESSED_DIR,
+                     replace: bool = False, chunk_rows: int = DEFAULT_CHUNK_ROWS, plan=None) -> int:
+    """Appends rows added since the last publish to the table's Parquet snapshot. Returns rows written.
+
+    With replace=True the snapshot is rebuilt from scratch (used after a FULL staging reload)
+    and the previous files are removed once the new manifest is in place. Staging tables pass
+    their dataset's plan; the Arrow schema is stored in the manifest for readers.
+    """
+    spec = snapshot_spec(name, plan)
+    if spec is None:
+        raise KeyError(f"No snapshot spec for {name}")
+    table_dir = Path(processed_dir) / name
+    table_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = load_manifest(processed_dir, name)
+    if manifest is None or replace:
+        previous_files = manifest["files"] if manifest else []
+        manifest = {
+            "table": name,
+            "key_column": spec["key"],
+            "partition_column": spec["partition"],
+            "partition_type": str(spec["schema"].field(spec["partition"]).type),
+            "watermark": 0,
+            "files": [],
+        }
+    else:
+        previous_files = []
+
+    run_stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    new_entries = []
+    try:
+        # 1. Read the high key under a SHARE lock so no lower key can commit after it, then release
+        #    the lock: staging and warehouse writers are only blocked for this one index lookup
+        lock_cur = conn.cursor()
+        lock_cur.execute(f"LOCK TABLE {spec['source_table']} IN SHARE MODE")
+        lock_cur.execute(f"SELECT MAX({spec['key']}) FROM {spec['source_table']}")
+        high_key = lock_cur.fetchone()[0]
+        lock_cur.close()
+        conn.commit()
+
+        # 2. Write the bounded delta chunk by chunk as new partition files; nothing is visible
+        #    until the manifest changes, and rows committed meanwhile wait for the next publish
+        cur = conn.cursor(name=f"publish_{name}")  # Server-side cursor: at most chunk_rows rows in memory
+        cur.execute(spec["query"], (manifest["watermark"], high_key or 0))
+        seq = 0
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            table = pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, spec["schema"])],
+                schema=spec["schema"],
+            )
+            new_entries.extend(_write_partitions(table, table_dir, spec["partition"], run_stamp, seq))
+            seq += 1
+        cur.close()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Files of this run are not in any manifest yet, so removing them is always safe
+        for entry in new_entries:
+            (table_dir / entry["path"]).unlink(missing_ok=True)
+        raise
+
+    if not new_entries and not replace:
+        logger.info(f"Processed snapshot {name} is up to date (watermark {manifest['watermark']}).")
+        return 0
+
+    # 3. Publish: advance the watermark and list the new files in one atomic manifest swap
+    written = sum(e["rows"] for e in new_entries)
+    for entry in new_entries:
+        entry["written_at"] = run_stamp
+    manifest["files"].extend(new_entries)
+    if new_entries:
+        manifest["watermark"] = max(e["max_key"] for e in new_entries)
+    manifest["arrow_schema"] = encode_schema(spec["schema"])
+    manifest["updated_at"] = datetime.now().isoformat()
+    _write_manifest(processed_dir, name, manifest)
+
+    for entry in previous_files:
+        (table_dir / entry["path"]).unlink(missing_ok=True)
+    if replace:
+        # Drop partition directories emptied by the rebuild
+        for part_dir in table_dir.iterdir():
+            if part_dir.is_dir() and not any(part_dir.iterdir()):
+                shutil.rmtree(part_dir)
+
+    logger.info(f"Published {written} rows to processed snapshot {name} ({len(new_entries)} files, watermark {manifest['watermark']}).")
+    return written
+
+def publish_from_config(conn, name: str, storage_cfg: dict | None, replace: bool = False, plan=None) -> int:
+    """Publishes a snapshot if storage.processed_dir is configured.
+
+    Called after the layer's own commit: a failure is logged rather than raised, and the
+    next run picks up the missed rows because the manifest watermark did not move. Staging
+    tables pass their dataset's plan; any other table without a SNAPSHOTS entry is skipped.
+    """
+    if not storage_cfg or not storage_cfg.get("processed_dir") or not storage_cfg.get("publish_processed", True):
+        return 0
+    if snapshot_spec(name, plan) is None:
+        logger.info(f"{name} has no processed snapshot spec; not publishing it.")
+        return 0
+    try:
+        return publish_snapshot(conn, name, storage_cfg["processed_dir"], replace=replace, plan=plan)
+    except Exception as e:
+        logger.warning(f"Could not publish processed snapshot {name}: {e}")
+        return 0
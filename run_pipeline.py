@@ -1,9 +1,13 @@
 import logging
 import sys
+import argparse
+import yaml
+from pathlib import Path
 from database.connection import log_pipeline_start, log_pipeline_end
+from monitoring.metrics import STAGE_DURATION, start_http_server, write_textfile
 from ingestion.ingest import main as run_ingestion
 from transforms.load_staging import main as run_staging
-from warehouse.load_warehouse import load_star_schema as run_warehouse
+from warehouse.load_warehouse import main as run_warehouse
 
 # Configure root logger for the entire pipeline
 logging.basicConfig(
@@ -16,32 +20,83 @@ logging.basicConfig(
 )
 logger = logging.getLogger("pipeline_orchestrator")
 
-def main():
-    pipeline_name = "Public Data Platform Master Pipeline"
+PIPELINE_NAME = "Public Data Platform Master Pipeline"
+
+def load_config(path: Path = Path("config/config.yaml")) -> dict:
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+def run_once(config: dict, datasets: list[str] | None = None, lock_mode: str | None = None, force: bool = False) -> str:
+    """Runs Ingestion -> Staging -> Warehouse once, logging to pipeline_run_history. Returns the run status.
+
+    Staging and warehouse steps whose inputs are unchanged since their last successful
+    run are skipped (and listed in unchanged_stages) unless force is set.
+    """
+    pipeline_name = PIPELINE_NAME if not datasets else f"{PIPELINE_NAME} [{', '.join(datasets)}]"
     run_id = log_pipeline_start(pipeline_name)
+    lock_wait_seconds = 0.0
     
     logger.info(f"--- Starting Pipeline Run [ID: {run_id}] ---")
     
     try:
+        # Each step holds advisory locks per dataset / target table, so overlapping runs
+        # on different datasets proceed in parallel while conflicting work waits or is skipped
+        skipped, unchanged = [], []
+
         # Step 1: Ingestion
         logger.info("Step 1/3: Ingestion")
-        run_ingestion()
+        with STAGE_DURATION.time(stage="ingestion"):
+            stats = run_ingestion(datasets, lock_mode, config)
+        lock_wait_seconds += stats["lock_wait_seconds"]
+        skipped += stats["skipped"]
         
         # Step 2: Staging Transformation
         logger.info("Step 2/3: Staging Transformation")
-        run_staging()
+        with STAGE_DURATION.time(stage="staging"):
+            stats = run_staging(datasets, lock_mode, config, force)
+        lock_wait_seconds += stats["lock_wait_seconds"]
+        skipped += stats["skipped"]
+        unchanged += stats["unchanged"]
         
         # Step 3: Warehouse Loading
         logger.info("Step 3/3: Warehouse Loading")
-        run_warehouse()
+        with STAGE_DURATION.time(stage="warehouse"):
+            stats = run_warehouse(lock_mode, config, force)
+        lock_wait_seconds += stats["lock_wait_seconds"]
+        skipped += stats["skipped"]
+        unchanged += stats["unchanged"]
         
-        log_pipeline_end(run_id, "SUCCESS")
-        logger.info(f"--- Pipeline Run [ID: {run_id}] COMPLETED SUCCESSFULY ---")
+        status = "SKIPPED" if skipped else "SUCCESS"
+        note = f"Skipped (locked by another run): {'; '.join(skipped)}" if skipped else None
+        log_pipeline_end(run_id, status, note, lock_wait_seconds, ", ".join(unchanged) or None)
+        logger.info(f"--- Pipeline Run [ID: {run_id}] COMPLETED: {status} (lock wait {lock_wait_seconds:.1f}s) ---")
+        return status
         
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Pipeline crashed: {error_msg}")
-        log_pipeline_end(run_id, "FAILED", error_msg)
+        log_pipeline_end(run_id, "FAILED", error_msg, lock_wait_seconds)
+        return "FAILED"
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Ingestion -> Staging -> Warehouse.")
+    parser.add_argument("--dataset", action="append", help="Only process this dataset (repeatable); default is all")
+    parser.add_argument("--lock-mode", choices=["wait", "skip"], help="Override locking.mode from config.yaml")
+    parser.add_argument("--force", action="store_true", help="Re-run staging and warehouse even if their inputs are unchanged")
+    args = parser.parse_args()
+
+    config = load_config()
+    monitoring_cfg = config.get("monitoring", {})
+    if monitoring_cfg.get("metrics_port"):
+        # Scrapeable while the run is in progress; the server stops with the process
+        start_http_server(monitoring_cfg["metrics_port"], monitoring_cfg.get("metrics_addr", "127.0.0.1"))
+
+    try:
+        status = run_once(config, args.dataset, args.lock_mode, args.force)
+    finally:
+        if monitoring_cfg.get("metrics_textfile"):
+            write_textfile(monitoring_cfg["metrics_textfile"])
+    if status == "FAILED":
         sys.exit(1)
 
 if __name__ == "__main__":
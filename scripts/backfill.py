@@ -0,0 +1,247 @@
+import sys
+import time
+import logging
+import argparse
+import multiprocessing
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from database.connection import get_connection
+from database.locks import advisory_locks, dataset_lock, table_lock, lock_settings
+from database.shadow import build_indexes, create_shadow, shadow_exists, shadow_indexed, shadow_name, swap_all_when_idle, validate_foreign_keys
+from processed.writer import publish_from_config
+from run_pipeline import load_config
+from transforms.load_staging import apply_dq_policy, split_rejects
+from transforms.plan import compile_plan
+from warehouse.load_warehouse import STAGING_TABLE, WATERMARK_NAME, insert_dim_month, insert_facts
+
+logger = logging.getLogger("backfill")
+
+DEFAULT_WORKERS = 4
+RANGES_PER_WORKER = 4
+FETCH_ROWS = 50_000
+
+# Raw rows of one range's batches. A batch is planned into exactly one range, and only once it is
+# SUCCESS, so all of its rows are committed and no resume can load them twice or miss some
+RAW_RANGE_SQL = """
+    SELECT r.id, r.ingestion_id, r.record
+    FROM raw_records r
+    WHERE r.ingestion_id = ANY(%s)
+    ORDER BY r.id
+"""
+UNPLANNED_BATCHES_SQL = """
+    SELECT l.id, l.records_count
+    FROM ingestion_log l
+    WHERE l.source_name = %s AND l.status = 'SUCCESS'
+      AND NOT EXISTS (SELECT 1 FROM backfill_range b WHERE b.target_name = %s AND l.id = ANY(b.ingestion_ids))
+    ORDER BY l.id
+"""
+
+def plan_ranges(cur, source_name: str, target_table: str, ranges: int) -> int:
+    """Splits the source's SUCCESS batches that are not in the plan yet into about `ranges` ranges of
+    similar row counts, recorded in backfill_range. Returns the number of new ranges.
+
+    On resume this plans the batches that completed while the backfill was interrupted:
+    the dataset's locks are released between runs, so incremental ingestion may have moved
+    on, and without their range the swap would drop those rows.
+    """
+    cur.execute(UNPLANNED_BATCHES_SQL, (source_name, target_table))
+    batches = cur.fetchall()
+    if not batches:
+        return 0
+    range_rows = max(1, -(-sum(rows or 0 for _, rows in batches) // ranges))
+    groups, group, group_rows = [], [], 0
+    for ingestion_id, rows in batches:
+        group.append(ingestion_id)
+        group_rows += rows or 0
+        if group_rows >= range_rows:
+            groups.append(group)
+            group, group_rows = [], 0
+    if group:
+        groups.append(group)
+    for ids in groups:
+        cur.execute(
+            "INSERT INTO backfill_range (target_name, source_name, lo_id, hi_id, ingestion_ids) VALUES (%s, %s, %s, %s, %s)",
+            (target_table, source_name, ids[0], ids[-1] + 1, ids)
+        )
+    return len(groups)
+
+def load_range(dataset_cfg: dict, lo: int, ingestion_ids: list[int]) -> int:
+    """Validates, transforms (with the dataset's compiled plan) and COPYs the raw rows of one range's batches into the staging shadow.
+
+    Each fetched chunk is COPYed as it arrives; the rows, their quarantined rejects and the
+    range's DONE mark commit together, so a resumed backfill never loads a range twice.
+    The dataset's dq.max_error_rate applies per range.
+    """
+    source_name, target_table = dataset_cfg["name"], dataset_cfg["target_stg"]
+    plan = compile_plan(dataset_cfg)
+    conn = get_connection()
+    try:
+        cur = conn.cursor(name=f"backfill_{lo}")  # Server-side cursor: at most FETCH_ROWS records in memory
+        cur.itersize = FETCH_ROWS
+        cur.execute(RAW_RANGE_SQL, (ingestion_ids,))
+        copy_cur = conn.cursor()
+        loaded, total, rejects = 0, 0, []
+        while True:
+            rows = cur.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            records, chunk_rejects = split_rejects(rows, plan)
+            if records:
+                plan.copy_into(copy_cur, shadow_name(target_table), records)
+            loaded += len(records)
+            total += len(rows)
+            rejects.extend(chunk_rejects)
+        cur.close()
+        apply_dq_policy(conn, dataset_cfg, total, rejects)
+
+        copy_cur.execute(
+            """
+            UPDATE backfill_range SET status = 'DONE', rows_loaded = %s, finished_at = CURRENT_TIMESTAMP
+            WHERE target_name = %s AND lo_id = %s
+            """,
+            (loaded, target_table, lo)
+        )
+        conn.commit()
+        copy_cur.close()
+        return loaded
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _load_range_task(args: tuple) -> tuple:
+    dataset_cfg, lo, ingestion_ids = args
+    return lo, len(ingestion_ids), load_range(dataset_cfg, lo, ingestion_ids)
+
+def backfill(dataset_cfg: dict, storage_cfg: dict | None, workers: int = DEFAULT_WORKERS, ranges: int | None = None,
+             restart: bool = False, warehouse: bool = True) -> int:
+    """Rebuilds the dataset's staging table (and the warehouse fed by it) from the raw layer.
+
+    Ranges of SUCCESS batches load in parallel into an index-free shadow table; indexes and the
+    fact shadow are built and committed at the end, then the shadows replace the live
+    tables in one short transaction with a lock_timeout. Returns rows loaded.
+    """
+    source_name = dataset_cfg["name"]
+    target_table = dataset_cfg["target_stg"]
+    warehouse = warehouse and target_table == STAGING_TABLE
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        # 1. Plan the ranges, or resume the ones an interrupted backfill left PENDING
+        cur.execute(
+            "SELECT COUNT(*), COUNT(*) FILTER (WHERE ingestion_ids IS NULL) FROM backfill_range WHERE target_name = %s AND source_name = %s",
+            (target_table, source_name)
+        )
+        planned, unbatched = cur.fetchone()
+        if unbatched:
+            logger.info(f"Discarding a backfill plan of {target_table} made of raw id spans; planning by batch instead.")
+        if restart or unbatched or not planned or not shadow_exists(cur, target_table):
+            create_shadow(cur, target_table)
+            cur.execute("DELETE FROM backfill_range WHERE target_name = %s", (target_table,))
+            planned = plan_ranges(cur, source_name, target_table, ranges or workers * RANGES_PER_WORKER)
+            conn.commit()
+            logger.info(f"Planned {planned} batch ranges for {source_name} -> {target_table}")
+        else:
+            added = plan_ranges(cur, source_name, target_table, 1)
+            if added:
+                planned += added
+                conn.commit()
+                logger.info(f"Planned one more range for batches of {source_name} completed since the interrupted run")
+        if not planned:
+            logger.info(f"No raw records for {source_name}; nothing to backfill.")
+            return 0
+
+        cur.execute(
+            "SELECT lo_id, ingestion_ids FROM backfill_range WHERE target_name = %s AND status = 'PENDING' ORDER BY lo_id",
+            (target_table,)
+        )
+        pending = cur.fetchall()
+        conn.commit()
+        if len(pending) < planned:
+            logger.info(f"Resuming: {planned - len(pending)} of {planned} ranges already loaded.")
+
+        # 2. Load pending ranges in parallel; spawned (not forked) so workers never share this process's connections
+        started = time.perf_counter()
+        if pending:
+            with multiprocessing.get_context("spawn").Pool(min(workers, len(pending))) as pool:
+                tasks = [(dataset_cfg, lo, ingestion_ids) for lo, ingestion_ids in pending]
+                for done, (lo, batches, loaded) in enumerate(pool.imap_unordered(_load_range_task, tasks), start=1):
+                    logger.info(f"Range {lo} ({batches} batches) loaded {loaded} rows ({done}/{len(pending)})")
+        logger.info(f"Loaded {len(pending)} ranges in {time.perf_counter() - started:.1f}s")
+
+        # 3. Index the finished shadows and rebuild the facts from the new staging rows, committed before
+        # the swap so its exclusive locks are not held while they build (a resume rebuilds only the facts)
+        if not shadow_indexed(cur, target_table):
+            build_indexes(cur, target_table)
+        cur.execute(f"SELECT COALESCE(MAX(stg_id), 0), COUNT(*) FROM {shadow_name(target_table)}")
+        high_id, total = cur.fetchone()
+        if warehouse:
+            insert_dim_month(cur, shadow_name(target_table), 0, high_id)
+            create_shadow(cur, WATERMARK_NAME)
+            insert_facts(cur, shadow_name(target_table), shadow_name(WATERMARK_NAME), 0, high_id)
+            build_indexes(cur, WATERMARK_NAME)
+        conn.commit()
+
+        # 4. Swap everything in together once readers let go; the warehouse watermark moves to the
+        # new staging high-water mark and the finished plan is dropped in the same transaction
+        def finish(swap_cur):
+            if warehouse:
+                swap_cur.execute("""
+                    INSERT INTO etl_watermark (target_name, last_id, updated_at)
+                    VALUES (%s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (target_name) DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = EXCLUDED.updated_at;
+                """, (WATERMARK_NAME, high_id))
+            swap_cur.execute("DELETE FROM backfill_range WHERE target_name = %s", (target_table,))
+
+        swapped = [target_table] + ([WATERMARK_NAME] if warehouse else [])
+        foreign_keys = swap_all_when_idle(conn, swapped, on_swapped=finish)
+        logger.info(f"Backfill of {source_name} swapped in: {total} rows in {', '.join(swapped)}")
+
+        for table, keys in foreign_keys.items():
+            validate_foreign_keys(cur, table, keys)
+            conn.commit()
+
+        publish_from_config(conn, target_table, storage_cfg, replace=True, plan=compile_plan(dataset_cfg))
+        if warehouse:
+            publish_from_config(conn, WATERMARK_NAME, storage_cfg, replace=True)
+        return total
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Backfill failed for {source_name}: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild staging and the warehouse from the raw layer in parallel ranges.")
+    parser.add_argument("--dataset", required=True, help="Dataset to rebuild (its target_stg table is replaced)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel worker processes")
+    parser.add_argument("--ranges", type=int, default=None, help=f"Batch ranges to split into (default workers x {RANGES_PER_WORKER})")
+    parser.add_argument("--restart", action="store_true", help="Discard a previous interrupted backfill instead of resuming it")
+    parser.add_argument("--staging-only", action="store_true", help="Do not rebuild the fact table")
+    parser.add_argument("--lock-mode", choices=["wait", "skip"], help="Override locking.mode from config.yaml")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = load_config()
+    datasets = {ds["name"]: ds for ds in config.get("datasets", [])}
+    if args.dataset not in datasets:
+        parser.error(f"Unknown dataset '{args.dataset}'")
+    dataset_cfg = datasets[args.dataset]
+
+    # Holds off ingestion, staging and warehouse runs on the same data until the swap is done
+    mode, timeout_seconds = lock_settings(config, args.lock_mode)
+    names = [dataset_lock(args.dataset), table_lock(dataset_cfg["target_stg"])]
+    if not args.staging_only:
+        names.append(table_lock(WATERMARK_NAME))
+    with advisory_locks(names, mode, timeout_seconds):
+        backfill(dataset_cfg, config.get("storage"), args.workers, args.ranges, args.restart, not args.staging_only)
+
+if __name__ == "__main__":
+    main()
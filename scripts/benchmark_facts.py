@@ -0,0 +1,191 @@
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from database.connection import get_connection
+from warehouse.load_warehouse import ensure_partitions
+
+logger = logging.getLogger("fact_benchmark")
+
+BENCH_SCHEMA = "fact_bench"
+FIRST_YEAR = 1900
+YEARS = 120
+
+# Before: the original heap with only its primary key. After: the layout in database/schema.sql
+LAYOUTS = {
+    "heap": [
+        """
+        CREATE TABLE fct_heap (
+            fact_id SERIAL PRIMARY KEY,
+            month_id INTEGER REFERENCES dim_month(month_id),
+            year_val INTEGER NOT NULL,
+            passenger_count INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ],
+    "partitioned": [
+        """
+        CREATE TABLE fct_partitioned (
+            fact_id SERIAL,
+            month_id INTEGER REFERENCES dim_month(month_id),
+            year_val INTEGER NOT NULL,
+            passenger_count INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (fact_id, year_val)
+        ) PARTITION BY RANGE (year_val)
+        """,
+        "CREATE INDEX ON fct_partitioned(month_id, year_val)",
+        "CREATE INDEX ON fct_partitioned(year_val, month_id, fact_id) INCLUDE (passenger_count, created_at)",
+        "CREATE INDEX ON fct_partitioned USING BRIN (created_at) WITH (autosummarize = on)",
+    ],
+}
+
+# Warehouse and dashboard access patterns against the fact table ({t} is the layout's table)
+QUERIES = [
+    {
+        "name": "warehouse.not_exists_probe",
+        # One incremental delta: 12 months x 3 years, one year already loaded and two new
+        "sql": f"""
+            SELECT COUNT(*) FROM (
+                SELECT m, y FROM generate_series(1, 12) m, generate_series({FIRST_YEAR + YEARS - 1}, {FIRST_YEAR + YEARS + 1}) y
+            ) delta
+            WHERE NOT EXISTS (SELECT 1 FROM {{t}} f WHERE f.month_id = delta.m AND f.year_val = delta.y)
+        """,
+    },
+    {
+        "name": "dashboard.years_ordered",
+        "sql": """
+            SELECT d.month_name, f.year_val, f.passenger_count
+            FROM {t} f
+            JOIN dim_month d ON f.month_id = d.month_id
+            WHERE f.year_val BETWEEN 1958 AND 1960
+            ORDER BY f.year_val, f.month_id
+        """,
+    },
+    {
+        "name": "dashboard.first_page",
+        "sql": """
+            SELECT f.fact_id, f.year_val, f.month_id, d.month_name, f.passenger_count, f.created_at
+            FROM {t} f
+            JOIN dim_month d ON d.month_id = f.month_id
+            WHERE (f.year_val, f.month_id, f.fact_id) > (1990, 6, 0)
+            ORDER BY f.year_val, f.month_id, f.fact_id
+            LIMIT 51
+        """,
+    },
+    {
+        "name": "facts.created_at_day",
+        "sql": """
+            SELECT COUNT(*), SUM(passenger_count) FROM {t}
+            WHERE created_at >= TIMESTAMP '2024-01-01' + INTERVAL '300 days'
+              AND created_at < TIMESTAMP '2024-01-01' + INTERVAL '301 days'
+        """,
+    },
+]
+
+def seed(cur, facts: int):
+    """Recreates the benchmark schema with `facts` rows in each layout, appended in year and created_at order."""
+    cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    cur.execute(f"SET search_path TO {BENCH_SCHEMA}")
+    cur.execute("CREATE TABLE dim_month (month_id SERIAL PRIMARY KEY, month_name VARCHAR(10) UNIQUE NOT NULL)")
+    cur.execute("INSERT INTO dim_month (month_name) SELECT unnest(ARRAY['JAN','FEB','MAR','APR','MAY','JUN','JUL','AUG','SEP','OCT','NOV','DEC'])")
+    for statements in LAYOUTS.values():
+        for statement in statements:
+            cur.execute(statement)
+    ensure_partitions(cur, "fct_partitioned", range(FIRST_YEAR, FIRST_YEAR + YEARS))
+
+    logger.info(f"Seeding {facts} facts per layout")
+    for table in ("fct_heap", "fct_partitioned"):
+        cur.execute(f"""
+            INSERT INTO {table} (month_id, year_val, passenger_count, created_at)
+            SELECT 1 + i %% 12, %s + (i::bigint * %s / %s)::int, i %% 700, TIMESTAMP '2024-01-01' + (i || ' seconds')::interval
+            FROM generate_series(0, %s - 1) AS i
+        """, (FIRST_YEAR, YEARS, facts, facts))
+        cur.connection.commit()
+        logger.info(f"Seeded {table}")
+
+    # VACUUM sets the visibility map for index-only scans and summarizes the BRIN ranges
+    cur.connection.autocommit = True
+    for table in ("dim_month", "fct_heap", "fct_partitioned"):
+        cur.execute(f"VACUUM ANALYZE {table}")
+    cur.connection.autocommit = False
+
+def relation_sizes(cur) -> dict:
+    """Total bytes of each layout's table and indexes (partitions included)."""
+    sizes = {}
+    for layout, table in (("heap", "fct_heap"), ("partitioned", "fct_partitioned")):
+        cur.execute(
+            """
+            SELECT COALESCE(SUM(pg_table_size(c.oid)), 0), COALESCE(SUM(pg_indexes_size(c.oid)), 0)
+            FROM pg_class c
+            WHERE c.oid = %s::regclass OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+            """,
+            (table, table)
+        )
+        table_bytes, index_bytes = cur.fetchone()
+        sizes[layout] = {"table_bytes": int(table_bytes), "index_bytes": int(index_bytes)}
+    return sizes
+
+def explain(cur, sql: str) -> dict:
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+    result = cur.fetchone()[0][0]
+    plan = result["Plan"]
+    return {
+        "execution_ms": result["Execution Time"],
+        "shared_hit": plan.get("Shared Hit Blocks", 0),
+        "shared_read": plan.get("Shared Read Blocks", 0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the heap and partitioned fact layouts on warehouse and dashboard queries.")
+    parser.add_argument("--facts", type=int, default=100_000_000, help="Facts to seed per layout")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per query (the fastest is reported, after one warm-up)")
+    parser.add_argument("--skip-seed", action="store_true", help=f"Reuse the existing {BENCH_SCHEMA} schema")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        if args.skip_seed:
+            cur.execute(f"SET search_path TO {BENCH_SCHEMA}")
+        else:
+            seed(cur, args.facts)
+        conn.commit()
+
+        results = {"facts": args.facts, "sizes": relation_sizes(cur), "queries": {}}
+        for query in QUERIES:
+            row = {}
+            for layout, table in (("heap", "fct_heap"), ("partitioned", "fct_partitioned")):
+                sql = query["sql"].format(t=table)
+                explain(cur, sql)  # Warm-up
+                row[layout] = min((explain(cur, sql) for _ in range(args.runs)), key=lambda r: r["execution_ms"])
+                conn.rollback()
+            speedup = row["heap"]["execution_ms"] / max(row["partitioned"]["execution_ms"], 1e-3)
+            results["queries"][query["name"]] = {**row, "speedup": speedup}
+            logger.info(
+                f"{query['name']:<28} heap={row['heap']['execution_ms']:>10.2f}ms "
+                f"partitioned={row['partitioned']['execution_ms']:>10.2f}ms speedup={speedup:>8.1f}x "
+                f"blocks={row['heap']['shared_hit'] + row['heap']['shared_read']}->"
+                f"{row['partitioned']['shared_hit'] + row['partitioned']['shared_read']}"
+            )
+        for layout, size in results["sizes"].items():
+            logger.info(f"{layout:<12} table={size['table_bytes'] / 1024 ** 3:.2f} GiB indexes={size['index_bytes'] / 1024 ** 3:.2f} GiB")
+    finally:
+        conn.close()
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        logger.info(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,402 @@
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from database.connection import get_connection
+from dashboard.explorer import DEFAULT_PAGE_SIZE, MONTHS_SQL, YEAR_BOUNDS_SQL, page_query
+from dashboard.queries import INGESTION_STATUS_SQL, PROFILE_HISTORY_SQL, RUN_HISTORY_SQL, WAREHOUSE_DATA_SQL, WAREHOUSE_SUMMARY_SQL
+from ingestion.loader import DISCARD_RAW_SQL, DUPLICATE_HASH_SQL, FIND_RESUMABLE_SQL, RESUMABLE_ENTRIES_SQL
+from ingestion.local_files import INGESTED_HASHES_SQL
+from orchestration.jobs import CLAIM_SQL, TASKS
+from scripts.backfill import DEFAULT_WORKERS, RANGES_PER_WORKER, RAW_RANGE_SQL, UNPLANNED_BATCHES_SQL
+from transforms.load_staging import BASELINE_PROFILE_SQL, BATCH_PROFILES_SQL, FINGERPRINT_SQL, INCREMENTAL_BATCHES_SQL, RAW_BATCHES_SQL
+from transforms.plan import DEFAULT_COLUMNS, TransformPlan
+from warehouse.load_warehouse import STAGING_TABLE, WATERMARK_NAME, dim_month_sql, ensure_partitions, fact_sql
+
+logger = logging.getLogger("plan_check")
+
+PLAN_SCHEMA = "plan_check"
+SCHEMA_PATH = root_path / "database" / "schema.sql"
+BASELINE_PATH = root_path / "database" / "plan_baseline.json"
+
+# Every statement the pipeline and dashboard issue against hot tables, with representative parameters.
+# The SQL comes from the constants and builders the modules execute, so a check cannot drift from
+# the statement it guards. Seq scans are only tolerated on the listed tables.
+STAGING_INSERT_SQL, STAGING_INSERT_PARAMS = TransformPlan(DEFAULT_COLUMNS).insert_sql(STAGING_TABLE)
+EXPLORER_PAGE_SQL, EXPLORER_PAGE_PARAMS = page_query({"year_from": 1950}, (1960, 6, 0), False, DEFAULT_PAGE_SIZE)
+EXPLORER_DESC_SQL, EXPLORER_DESC_PARAMS = page_query({}, (1960, 6, 0), True, DEFAULT_PAGE_SIZE)
+EXPLORER_MONTHS_SQL, EXPLORER_MONTHS_PARAMS = page_query({"month_ids": [1, 6]}, None, False, DEFAULT_PAGE_SIZE)
+EXPLORER_RANGE_SQL, EXPLORER_RANGE_PARAMS = page_query({"year_from": 1950, "year_to": 1960, "month_ids": [6]}, (1955, 6, 0), False, DEFAULT_PAGE_SIZE)
+
+PLAN_CHECKS = [
+    {
+        "name": "ingestion.find_resumable",
+        "sql": FIND_RESUMABLE_SQL,
+        "params": ("source_1", None, None),
+    },
+    {
+        "name": "ingestion.find_resumable_hash",
+        "sql": FIND_RESUMABLE_SQL,
+        "params": ("source_1", "hash_42", "hash_42"),
+    },
+    {
+        "name": "ingestion.resumable_entries",
+        "sql": RESUMABLE_ENTRIES_SQL,
+        "params": ("source_1",),
+    },
+    {
+        "name": "ingestion.hash_check",
+        "sql": DUPLICATE_HASH_SQL,
+        "params": ("hash_42", 0),
+    },
+    {
+        "name": "ingestion.ingested_hashes",
+        "sql": INGESTED_HASHES_SQL,
+        "params": (["hash_42", "hash_43", "hash_missing"],),
+    },
+    {
+        "name": "ingestion.discard_partial",
+        "sql": DISCARD_RAW_SQL,
+        "params": (7,),
+    },
+    {
+        "name": "staging.max_loaded_at",
+        "sql": f"SELECT MAX(loaded_at) FROM {STAGING_TABLE}",
+        "params": (),
+    },
+    {
+        "name": "staging.fingerprint",
+        "sql": FINGERPRINT_SQL,
+        "params": ("source_1",),
+    },
+    {
+        "name": "staging.incremental_batches",
+        "sql": INCREMENTAL_BATCHES_SQL + " ORDER BY id",
+        "params": ("source_1", "@recent_completed_at"),
+    },
+    {
+        "name": "staging.batch_profiles",
+        "sql": BATCH_PROFILES_SQL,
+        "params": ("@recent_batch_ids",),
+    },
+    {
+        "name": "staging.baseline_profile",
+        "sql": BASELINE_PROFILE_SQL,
+        "params": ("source_1",),
+    },
+    {
+        "name": "staging.raw_batches",
+        "sql": RAW_BATCHES_SQL,
+        "params": ("@recent_batch_ids",),
+    },
+    {
+        "name": "staging.insert_from_raw",
+        "sql": STAGING_INSERT_SQL,
+        "params": tuple(STAGING_INSERT_PARAMS) + ("@recent_batch_ids",),
+    },
+    {
+        "name": "backfill.raw_range",
+        "sql": RAW_RANGE_SQL,
+        "params": ("@range_batch_ids",),
+    },
+    {
+        "name": "backfill.unplanned_batches",
+        "sql": UNPLANNED_BATCHES_SQL,
+        "params": ("source_1", STAGING_TABLE),
+    },
+    {
+        "name": "warehouse.max_stg_id",
+        "sql": f"SELECT MAX(stg_id) FROM {STAGING_TABLE}",
+        "params": (),
+    },
+    {
+        "name": "warehouse.dim_month_delta",
+        "sql": dim_month_sql(STAGING_TABLE),
+        "params": ("@watermark", "@max_stg_id"),
+        "allow_seq_scan": {"dim_month"},
+    },
+    {
+        "name": "warehouse.fact_anti_join",
+        "sql": fact_sql(STAGING_TABLE, WATERMARK_NAME, 1958),
+        "params": ("@watermark", "@max_stg_id"),
+        "allow_seq_scan": {"dim_month"},
+    },
+    {
+        "name": "orchestration.claim",
+        "sql": CLAIM_SQL,
+        "params": ("plan_check", 300, list(TASKS)),
+    },
+    {
+        "name": "dashboard.warehouse_data",
+        "sql": WAREHOUSE_DATA_SQL,
+        "params": (),
+        # Reads the whole fact table by design; tracked for cost regressions only
+        "allow_seq_scan": {"dim_month", "fct_air_travel"},
+    },
+    {
+        "name": "dashboard.warehouse_summary",
+        "sql": WAREHOUSE_SUMMARY_SQL,
+        "params": (),
+        # Aggregates the whole fact table by design; tracked for cost regressions only
+        "allow_seq_scan": {"fct_air_travel"},
+    },
+    {
+        "name": "dashboard.explorer_months",
+        "sql": MONTHS_SQL,
+        "params": (),
+    },
+    {
+        "name": "dashboard.explorer_year_bounds",
+        "sql": YEAR_BOUNDS_SQL,
+        "params": (),
+    },
+    {
+        "name": "dashboard.explorer_page",
+        "sql": EXPLORER_PAGE_SQL,
+        "params": tuple(EXPLORER_PAGE_PARAMS),
+    },
+    {
+        "name": "dashboard.explorer_page_desc",
+        "sql": EXPLORER_DESC_SQL,
+        "params": tuple(EXPLORER_DESC_PARAMS),
+    },
+    {
+        "name": "dashboard.explorer_month_filter",
+        "sql": EXPLORER_MONTHS_SQL,
+        "params": tuple(EXPLORER_MONTHS_PARAMS),
+    },
+    {
+        "name": "dashboard.explorer_year_month_filter",
+        "sql": EXPLORER_RANGE_SQL,
+        "params": tuple(EXPLORER_RANGE_PARAMS),
+    },
+    {
+        "name": "dashboard.run_history",
+        "sql": RUN_HISTORY_SQL,
+        "params": (),
+    },
+    {
+        "name": "dashboard.ingestion_status",
+        "sql": INGESTION_STATUS_SQL,
+        "params": (),
+        "allow_seq_scan": {"ingestion_log"},
+    },
+    {
+        "name": "dashboard.profile_history",
+        "sql": PROFILE_HISTORY_SQL,
+        "params": (30,),
+    },
+]
+
+def seed(cur, scale: int):
+    """Recreates the plan_check schema from schema.sql and fills it with `scale` raw records."""
+    batches = max(scale // 1000, 1)
+    staged = max(scale // 10, 12)
+
+    cur.execute(f"DROP SCHEMA IF EXISTS {PLAN_SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {PLAN_SCHEMA}")
+    cur.execute(f"SET search_path TO {PLAN_SCHEMA}")
+    cur.execute(SCHEMA_PATH.read_text())
+
+    logger.info(f"Seeding {scale} raw records, {batches} ingestion batches and {staged} staging rows")
+    cur.execute("""
+        INSERT INTO ingestion_log (source_name, file_name, file_hash, status, records_count, rows_committed, created_at, completed_at)
+        SELECT 'source_' || (i %% 10), 'file_' || i || '.csv', 'hash_' || i,
+               (ARRAY['SUCCESS', 'SUCCESS', 'SUCCESS', 'SKIPPED', 'FAILED'])[1 + i %% 5], 1000, 1000,
+               ts, ts
+        FROM generate_series(1, %s) AS i,
+             LATERAL (SELECT TIMESTAMP '2024-01-01' + (i || ' hours')::interval AS ts) t
+    """, (batches,))
+    cur.execute("""
+        -- Each batch's rows are contiguous on disk, as they are when loaded by the pipeline
+        INSERT INTO raw_records (source_name, ingestion_id, record, ingested_at)
+        SELECT 'source_' || (b %% 10), b,
+               jsonb_build_object('Month', (ARRAY['JAN','FEB','MAR','APR','MAY','JUN','JUL','AUG','SEP','OCT','NOV','DEC'])[1 + i %% 12],
+                                  '1958', i %% 500, '1959', i %% 600, '1960', i %% 700),
+               TIMESTAMP '2024-01-01' + (b || ' hours')::interval
+        FROM generate_series(1, %s) AS i,
+             LATERAL (SELECT LEAST(1 + (i - 1) / %s, %s) AS b) t
+    """, (scale, scale // batches, batches))
+    cur.execute("""
+        INSERT INTO stg_airtravel (month, year_1958, year_1959, year_1960, loaded_at)
+        SELECT (ARRAY['JAN','FEB','MAR','APR','MAY','JUN','JUL','AUG','SEP','OCT','NOV','DEC'])[1 + i %% 12],
+               i %% 500, i %% 600, i %% 700, TIMESTAMP '2024-01-01' + (i || ' seconds')::interval
+        FROM generate_series(1, %s) AS i
+    """, (staged,))
+    cur.execute("INSERT INTO dim_month (month_name) SELECT DISTINCT month FROM stg_airtravel")
+    ensure_partitions(cur, "fct_air_travel", range(1900, 2020))
+    cur.execute("""
+        INSERT INTO fct_air_travel (month_id, year_val, passenger_count)
+        SELECT 1 + i %% 12, 1900 + i / 12 %% 120, i %% 700
+        FROM generate_series(1, %s) AS i
+    """, (staged,))
+    cur.execute("""
+        INSERT INTO pipeline_run_history (pipeline_name, start_time, end_time, duration_seconds, status)
+        SELECT 'Public Data Platform Master Pipeline', ts, ts + INTERVAL '5 minutes', 300, 'SUCCESS'
+        FROM generate_series(1, %s) AS i,
+             LATERAL (SELECT TIMESTAMP '2024-01-01' + (i || ' hours')::interval AS ts) t
+    """, (max(scale // 100, 10),))
+    cur.execute("""
+        -- Successful batches are profiled; all but the newest were validated by staging DQ
+        INSERT INTO ingestion_profile (ingestion_id, source_name, row_count, profile, dq_validated_at)
+        SELECT id, source_name, 1000,
+               jsonb_build_object('rows', 1000, 'columns', jsonb_build_object(
+                   'Month', jsonb_build_object('kind', 'text', 'null_fraction', 0, 'distinct', 12),
+                   '1958', jsonb_build_object('kind', 'numeric', 'null_fraction', 0, 'distinct', 500,
+                                              'quantiles', jsonb_build_object('p50', 250)))),
+               CASE WHEN id < %s THEN completed_at END
+        FROM ingestion_log
+        WHERE status = 'SUCCESS'
+    """, (batches - 10,))
+    cur.execute("""
+        -- A long job history with a few runnable jobs at the head of the queue
+        INSERT INTO pipeline_jobs (task, dataset_name, status, attempts, run_after, created_at, finished_at)
+        SELECT (ARRAY['ingestion', 'staging', 'warehouse'])[1 + i %% 3], 'source_' || (i %% 10),
+               CASE WHEN i > %s - 5 THEN 'PENDING' ELSE 'SUCCESS' END, 1, ts, ts, ts + INTERVAL '1 minute'
+        FROM generate_series(1, %s) AS i,
+             LATERAL (SELECT TIMESTAMP '2024-01-01' + (i || ' minutes')::interval AS ts) t
+    """, (max(scale // 100, 10), max(scale // 100, 10)))
+    # Warehouse is one small delta behind staging, as in a steady-state incremental run
+    cur.execute("INSERT INTO etl_watermark (target_name, last_id) SELECT 'fct_air_travel', MAX(stg_id) - 100 FROM stg_airtravel")
+    cur.execute("ANALYZE")
+
+def resolve_params(cur, params: tuple) -> tuple:
+    """Replaces '@name' placeholders with values read from the seeded data."""
+    lookups = {
+        "@watermark": "SELECT last_id FROM etl_watermark WHERE target_name = 'fct_air_travel'",
+        "@max_stg_id": "SELECT MAX(stg_id) FROM stg_airtravel",
+        "@recent_completed_at": "SELECT MAX(completed_at) - INTERVAL '1 day' FROM ingestion_log",
+        # The batches an incremental staging run picks up
+        "@recent_batch_ids": """
+            SELECT array_agg(id) FROM (
+                SELECT id FROM ingestion_log WHERE source_name = 'source_1' AND status = 'SUCCESS' ORDER BY id DESC LIMIT 3
+            ) b
+        """,
+        # One of the source's backfill ranges at the default worker count
+        "@range_batch_ids": f"""
+            SELECT array_agg(id) FROM (
+                SELECT id FROM ingestion_log WHERE source_name = 'source_1' AND status = 'SUCCESS' ORDER BY id
+                LIMIT (SELECT COUNT(*) / {DEFAULT_WORKERS * RANGES_PER_WORKER} + 1 FROM ingestion_log WHERE source_name = 'source_1' AND status = 'SUCCESS')
+            ) b
+        """,
+    }
+    resolved = []
+    for p in params:
+        if isinstance(p, str) and p in lookups:
+            cur.execute(lookups[p])
+            p = cur.fetchone()[0]
+        resolved.append(p)
+    return tuple(resolved)
+
+def walk(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+def explain(conn, check: dict) -> dict:
+    """Runs EXPLAIN (ANALYZE, BUFFERS) for one statement inside a rolled-back transaction."""
+    cur = conn.cursor()
+    try:
+        params = resolve_params(cur, check["params"])
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + check["sql"], params)
+        result = cur.fetchone()[0][0]
+    finally:
+        conn.rollback()  # DML under EXPLAIN ANALYZE really executes; keep the seed intact
+        cur.close()
+
+    plan = result["Plan"]
+    seq_scans = sorted({n["Relation Name"] for n in walk(plan) if n["Node Type"] == "Seq Scan"})
+    return {
+        "total_cost": plan["Total Cost"],
+        "execution_ms": result["Execution Time"],
+        "shared_hit": plan.get("Shared Hit Blocks", 0),
+        "shared_read": plan.get("Shared Read Blocks", 0),
+        "seq_scans": seq_scans,
+    }
+
+def table_sizes(conn) -> tuple[dict, dict]:
+    """Returns (row estimate per table, parent table of each partition)."""
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT relname, reltuples::bigint FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = %s AND c.relkind IN ('r', 'p')",
+        (PLAN_SCHEMA,)
+    )
+    sizes = dict(cur.fetchall())
+    cur.execute(
+        "SELECT c.relname, p.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent JOIN pg_namespace n ON n.oid = p.relnamespace WHERE n.nspname = %s",
+        (PLAN_SCHEMA,)
+    )
+    parents = dict(cur.fetchall())
+    cur.close()
+    conn.rollback()
+    return sizes, parents
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN every pipeline/dashboard statement against a seeded schema and flag plan regressions.")
+    parser.add_argument("--scale", type=int, default=1_000_000, help="Number of raw records to seed")
+    parser.add_argument("--large-table-rows", type=int, default=10_000, help="Seq scans over tables at least this large are flagged")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative increase in plan cost versus the baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Write the current costs as the new baseline")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the existing plan_check schema (seeded with the same --scale)")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        if args.skip_seed:
+            cur.execute(f"SET search_path TO {PLAN_SCHEMA}")
+        else:
+            seed(cur, args.scale)
+        conn.commit()
+        cur.close()
+
+        sizes, parents = table_sizes(conn)
+        # Costs only compare at equal data volume, so baselines are stored per scale
+        baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline = baselines.get(str(args.scale), {})
+        results, problems = {}, []
+
+        for check in PLAN_CHECKS:
+            r = explain(conn, check)
+            results[check["name"]] = r
+            allowed = check.get("allow_seq_scan", set())
+
+            for table in r["seq_scans"]:
+                # A partition is allowed when its parent is; the size check still applies per partition
+                if table not in allowed and parents.get(table) not in allowed and sizes.get(table, 0) >= args.large_table_rows:
+                    problems.append(f"{check['name']}: sequential scan on {table} ({sizes[table]} rows)")
+
+            base = baseline.get(check["name"])
+            if base and r["total_cost"] > base["total_cost"] * (1 + args.tolerance):
+                problems.append(f"{check['name']}: plan cost {r['total_cost']:.0f} exceeds baseline {base['total_cost']:.0f}")
+
+            logger.info(
+                f"{check['name']:<32} cost={r['total_cost']:>12.1f} time={r['execution_ms']:>9.2f}ms "
+                f"hit={r['shared_hit']:>7} read={r['shared_read']:>7} seq_scans={','.join(r['seq_scans']) or '-'}"
+            )
+    finally:
+        conn.close()
+
+    if args.update_baseline:
+        baselines[str(args.scale)] = {name: {"total_cost": r["total_cost"]} for name, r in results.items()}
+        args.baseline.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        logger.info(f"Baseline written to {args.baseline}")
+
+    if problems:
+        for p in problems:
+            logger.error(p)
+        sys.exit(1)
+    logger.info("Plan check PASSED.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -18,11 +18,17 @@ def init_db():
         logger.info("Cleaning up existing database objects...")
         # Drop tables in reverse order of dependencies
         cur.execute("""
+            DROP TABLE IF EXISTS dq_rejects;
+            DROP TABLE IF EXISTS stage_fingerprint;
+            DROP TABLE IF EXISTS backfill_range;
+            DROP TABLE IF EXISTS pipeline_jobs;
+            DROP TABLE IF EXISTS etl_watermark;
             DROP TABLE IF EXISTS pipeline_run_history;
             DROP TABLE IF EXISTS fct_air_travel;
             DROP TABLE IF EXISTS dim_month;
             DROP TABLE IF EXISTS stg_airtravel;
             DROP TABLE IF EXISTS raw_records;
+            DROP TABLE IF EXISTS ingestion_profile;
             DROP TABLE IF EXISTS ingestion_log;
         """)
         
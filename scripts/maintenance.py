@@ -0,0 +1,220 @@
+import os
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+import yaml
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from database.connection import get_connection
+
+logger = logging.getLogger("maintenance")
+
+# Retention-managed tables: primary key and the timestamp that ages a row
+RETENTION_TABLES = {
+    "raw_records": {"key": "id", "time_column": "ingested_at"},
+    "ingestion_log": {"key": "id", "time_column": "created_at"},
+    "pipeline_run_history": {"key": "run_id", "time_column": "start_time"},
+    "pipeline_jobs": {"key": "job_id", "time_column": "created_at"},
+    "dq_rejects": {"key": "reject_id", "time_column": "rejected_at"},
+}
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PAUSE_SECONDS = 0.5
+DEFAULT_LOCK_TIMEOUT = "2s"
+
+def _delete_filter(table: str, policy: dict) -> tuple[str, list]:
+    """Builds the WHERE clause selecting rows that are past retention for a table."""
+    time_column = RETENTION_TABLES[table]["time_column"]
+    cutoff = datetime.now() - timedelta(days=policy["keep_days"])
+    clauses, params = [f"{time_column} < %s"], [cutoff]
+
+    if policy.get("statuses"):
+        clauses.append("status = ANY(%s)")
+        params.append(list(policy["statuses"]))
+    if table == "ingestion_log":
+        # Entries that still own raw rows (e.g. resumable partial loads) are referenced by raw_records
+        clauses.append("NOT EXISTS (SELECT 1 FROM raw_records r WHERE r.ingestion_id = ingestion_log.id)")
+    return " AND ".join(clauses), params
+
+def _archive_batch(archive_path: Path, rows: list[tuple]):
+    """Appends deleted raw rows to a gzip JSON Lines archive (one gzip member per batch) and syncs it to disk."""
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    lines = "".join(
+        json.dumps({"id": r[0], "source_name": r[1], "ingestion_id": r[2], "record": r[3], "ingested_at": r[4].isoformat()}) + "\n"
+        for r in rows
+    )
+    with open(archive_path, "ab") as f:
+        f.write(gzip.compress(lines.encode("utf-8")))
+        f.flush()
+        os.fsync(f.fileno())
+
+def _relation_size(cur, table: str) -> tuple[int, float]:
+    """Returns (total bytes including indexes and TOAST, estimated row count)."""
+    cur.execute(
+        """
+        SELECT pg_total_relation_size(c.oid), COALESCE(NULLIF(GREATEST(c.reltuples, 0), 0), s.n_live_tup, 0)
+        FROM pg_class c LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.oid = %s::regclass
+        """,
+        (table,)
+    )
+    size, rows = cur.fetchone()
+    return size, rows
+
+def purge_table(conn, table: str, policy: dict, batch_size: int, pause_seconds: float,
+                archive_path: Path | None = None, dry_run: bool = False) -> int:
+    """Deletes aged rows in small committed batches, optionally archiving them first. Returns rows deleted."""
+    key = RETENTION_TABLES[table]["key"]
+    where, params = _delete_filter(table, policy)
+    cur = conn.cursor()
+
+    try:
+        if dry_run:
+            cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params)
+            count = cur.fetchone()[0]
+            conn.rollback()
+            logger.info(f"[dry-run] {table}: {count} rows past retention ({policy['keep_days']} days)")
+            return count
+
+        columns = ["id", "source_name", "ingestion_id", "record", "ingested_at"] if archive_path else [key]
+        total = 0
+        while True:
+            # SKIP LOCKED + small batches keep every transaction short and out of the pipeline's way
+            cur.execute(
+                f"""
+                WITH doomed AS (
+                    SELECT {key} FROM {table}
+                    WHERE {where}
+                    ORDER BY {key}
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                DELETE FROM {table} t USING doomed d
+                WHERE t.{key} = d.{key}
+                RETURNING {', '.join(f't.{c}' for c in columns)}
+                """,
+                params + [batch_size]
+            )
+            rows = cur.fetchall()
+            if not rows:
+                conn.commit()
+                break
+
+            if archive_path:
+                # Archive before commit: a crash may duplicate archived rows but never lose them
+                _archive_batch(archive_path, rows)
+            conn.commit()
+            total += len(rows)
+            logger.info(f"{table}: deleted {total} rows so far")
+
+            if len(rows) < batch_size:
+                break
+            time.sleep(pause_seconds)
+
+        return total
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Retention failed for {table}: {e}")
+        raise
+    finally:
+        cur.close()
+
+def run_maintenance(retention_cfg: dict, dry_run: bool = False, only: list[str] | None = None) -> list[dict]:
+    """Applies the configured retention policies and returns a per-table report."""
+    batch_size = retention_cfg.get("batch_size", DEFAULT_BATCH_SIZE)
+    pause_seconds = retention_cfg.get("pause_seconds", DEFAULT_PAUSE_SECONDS)
+    archive_dir = Path(retention_cfg.get("archive_dir", "data/archive"))
+    run_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report = []
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SET lock_timeout = %s", (retention_cfg.get("lock_timeout", DEFAULT_LOCK_TIMEOUT),))
+        conn.commit()
+
+        for table, policy in retention_cfg.get("tables", {}).items():
+            if table not in RETENTION_TABLES:
+                logger.warning(f"No retention support for table {table}; skipping.")
+                continue
+            if only and table not in only:
+                continue
+
+            archive_path = None
+            if table == "raw_records" and policy.get("archive", False):
+                archive_path = archive_dir / "raw_records" / f"raw_records_{run_stamp}.jsonl.gz"
+
+            size_before, rows_before = _relation_size(cur, table)
+            conn.commit()
+            deleted = purge_table(conn, table, policy, batch_size, pause_seconds, archive_path, dry_run)
+
+            size_after = size_before
+            if deleted and not dry_run:
+                # Plain VACUUM (no long exclusive lock) makes the space reusable and trims empty tail pages
+                conn.autocommit = True
+                cur.execute(f"VACUUM (ANALYZE) {table}")
+                conn.autocommit = False
+                size_after, _ = _relation_size(cur, table)
+                conn.commit()
+
+            report.append({
+                "table": table,
+                "deleted_rows": deleted,
+                "size_before": size_before,
+                "size_after": size_after,
+                # Space VACUUM marks reusable inside the table, which plain VACUUM rarely returns to the OS
+                "reusable_estimate": int(size_before / rows_before * deleted) if rows_before and not dry_run else 0,
+                "archive": str(archive_path) if archive_path and deleted and not dry_run else None,
+            })
+        cur.close()
+    finally:
+        conn.close()
+
+    return report
+
+def _fmt_bytes(n: int) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply retention policies from config.yaml to raw and audit tables.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count rows past retention")
+    parser.add_argument("--table", action="append", help="Limit to this table (repeatable)")
+    args = parser.parse_args()
+
+    config_path = Path("config/config.yaml")
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    retention_cfg = config.get("retention")
+    if not retention_cfg:
+        logger.info("No retention policies configured.")
+        return
+
+    report = run_maintenance(retention_cfg, dry_run=args.dry_run, only=args.table)
+    if args.dry_run:
+        return
+
+    for r in report:
+        reclaimed = r["size_before"] - r["size_after"]
+        logger.info(
+            f"{r['table']}: {r['deleted_rows']} rows removed, size {_fmt_bytes(r['size_before'])} -> "
+            f"{_fmt_bytes(r['size_after'])} (returned to OS: {_fmt_bytes(reclaimed)}, "
+            f"freed for reuse: ~{_fmt_bytes(r['reusable_estimate'])})"
+            + (f", archived to {r['archive']}" if r["archive"] else "")
+        )
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
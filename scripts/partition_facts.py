@@ -0,0 +1,78 @@
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from database.connection import get_connection
+from database.locks import advisory_locks, table_lock, lock_settings
+from database.shadow import is_partitioned, shadow_name, swap_in
+from run_pipeline import load_config
+from warehouse.load_warehouse import WATERMARK_NAME, ensure_partitions
+
+logger = logging.getLogger("partition_facts")
+
+FACT_TABLE = "fct_air_travel"
+
+# Keys and indexes of the partitioned fact table (keep in sync with database/schema.sql). Names carry
+# the shadow suffix because the old table still owns them; swap_in renames them back after dropping it
+FACT_DDL = [
+    "ALTER TABLE {t} ADD CONSTRAINT fct_air_travel_pkey_shadow PRIMARY KEY (fact_id, year_val)",
+    "ALTER TABLE {t} ADD CONSTRAINT fct_air_travel_month_id_fkey_shadow FOREIGN KEY (month_id) REFERENCES dim_month(month_id)",
+    "CREATE INDEX idx_fct_air_travel_month_year_shadow ON {t}(month_id, year_val)",
+    "CREATE INDEX idx_fct_air_travel_year_month_fact_shadow ON {t}(year_val, month_id, fact_id) INCLUDE (passenger_count, created_at)",
+    "CREATE INDEX idx_fct_air_travel_created_brin_shadow ON {t} USING BRIN (created_at) WITH (autosummarize = on)",
+]
+
+def migrate(conn) -> bool:
+    """Rewrites an unpartitioned fct_air_travel as the year-partitioned layout and swaps it in. Returns False if already partitioned."""
+    cur = conn.cursor()
+    try:
+        if is_partitioned(cur, FACT_TABLE):
+            logger.info(f"{FACT_TABLE} is already partitioned.")
+            return False
+
+        shadow = shadow_name(FACT_TABLE)
+        cur.execute(f"DROP TABLE IF EXISTS {shadow}")
+        cur.execute(f"CREATE TABLE {shadow} (LIKE {FACT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (year_val)")
+        cur.execute(f"SELECT DISTINCT year_val FROM {FACT_TABLE}")
+        ensure_partitions(cur, shadow, [row[0] for row in cur.fetchall()])
+
+        # Copied in created_at order so each partition's BRIN ranges stay tight
+        cur.execute(f"INSERT INTO {shadow} SELECT * FROM {FACT_TABLE} ORDER BY created_at, fact_id")
+        logger.info(f"Copied {cur.rowcount} facts into {shadow}")
+        for statement in FACT_DDL:
+            cur.execute(statement.format(t=shadow))
+        cur.execute(f"ANALYZE {shadow}")
+
+        swap_in(cur, FACT_TABLE)
+        conn.commit()
+        logger.info(f"{FACT_TABLE} is now partitioned by year_val.")
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert fct_air_travel to the year-partitioned layout (one-off migration).")
+    parser.add_argument("--lock-mode", choices=["wait", "skip"], help="Override locking.mode from config.yaml")
+    args = parser.parse_args()
+
+    config = load_config()
+    mode, timeout_seconds = lock_settings(config, args.lock_mode)
+    # The warehouse lock keeps loads out while facts are copied
+    with advisory_locks([table_lock(WATERMARK_NAME)], mode, timeout_seconds):
+        conn = get_connection()
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
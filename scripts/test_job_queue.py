@@ -0,0 +1,107 @@
+import sys
+import time
+import logging
+import multiprocessing
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from database.connection import get_connection
+from orchestration import jobs
+
+logger = logging.getLogger("job_queue_test")
+
+# Needs the database from .env and an idle queue: the workers below would otherwise claim real jobs
+JOB_COUNT = 200
+WORKERS = 2
+LEASE_SECONDS = 60
+
+def _query(sql: str, params: tuple = ()) -> list[tuple]:
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        rows = cur.fetchall() if cur.description else []
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+        conn.close()
+
+def _enqueue_test_jobs(prefix: str, count: int) -> list[int]:
+    (runnable,), = _query("SELECT COUNT(*) FROM pipeline_jobs WHERE status = 'PENDING' AND run_after <= now()")
+    assert runnable == 0, f"{runnable} runnable jobs are already queued; run this test against an idle queue"
+    # Warehouse jobs enqueue no follow-up stage when completed
+    rows = _query(
+        "INSERT INTO pipeline_jobs (task, dataset_name) SELECT 'warehouse', %s || i FROM generate_series(1, %s) AS i RETURNING job_id",
+        (prefix, count)
+    )
+    return [row[0] for row in rows]
+
+def _cleanup(prefix: str):
+    _query("DELETE FROM pipeline_jobs WHERE dataset_name LIKE %s", (prefix + "%",))
+
+def _drain(worker_id: str, start, results):
+    """One queue worker: claims and completes jobs until none is runnable, reporting every claim."""
+    claimed = []
+    start.wait()
+    while True:
+        job = jobs.claim(worker_id, LEASE_SECONDS, ("warehouse",))
+        if job is None:
+            break
+        claimed.append(job["job_id"])
+        jobs.complete(job, worker_id)
+    results.put((worker_id, claimed))
+
+def test_two_workers_claim_each_job_once():
+    prefix = f"queue_test_{int(time.time() * 1000)}_"
+    try:
+        job_ids = _enqueue_test_jobs(prefix, JOB_COUNT)
+        start, results = multiprocessing.Event(), multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_drain, args=(f"test-worker-{i}", start, results)) for i in range(WORKERS)]
+        for p in workers:
+            p.start()
+        start.set()
+        claims = dict(results.get(timeout=120) for _ in workers)
+        for p in workers:
+            p.join()
+
+        claimed = [job_id for ids in claims.values() for job_id in ids]
+        assert sorted(claimed) == sorted(job_ids), f"{len(claimed)} claims for {len(job_ids)} jobs"
+        assert all(claims.values()), f"a worker claimed nothing: { {w: len(ids) for w, ids in claims.items()} }"
+        rows = _query("SELECT status, attempts, COUNT(*) FROM pipeline_jobs WHERE dataset_name LIKE %s GROUP BY 1, 2", (prefix + "%",))
+        assert rows == [("SUCCESS", 1, JOB_COUNT)], rows
+    finally:
+        _cleanup(prefix)
+
+def test_lock_skip_spends_no_attempt():
+    """A job released because its lock is held stays PENDING however often it is skipped."""
+    prefix = f"queue_test_{int(time.time() * 1000)}_"
+    try:
+        (job_id,) = _enqueue_test_jobs(prefix, 1)
+        (max_attempts,), = _query("SELECT max_attempts FROM pipeline_jobs WHERE job_id = %s", (job_id,))
+        for _ in range(max_attempts + 2):
+            job = jobs.claim("test-worker", LEASE_SECONDS, ("warehouse",))
+            assert job is not None and job["job_id"] == job_id, job
+            assert jobs.release(job, "test-worker", "Skipped: lock held by another run", 0) == "PENDING"
+        (status, attempts), = _query("SELECT status, attempts FROM pipeline_jobs WHERE job_id = %s", (job_id,))
+        assert (status, attempts) == ("PENDING", 0), (status, attempts)
+
+        # The delay pushes run_after, so the job is not runnable again right away
+        job = jobs.claim("test-worker", LEASE_SECONDS, ("warehouse",))
+        jobs.release(job, "test-worker", "Skipped: lock held by another run", 3600)
+        assert jobs.claim("test-worker", LEASE_SECONDS, ("warehouse",)) is None
+    finally:
+        _cleanup(prefix)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        for check in (test_two_workers_claim_each_job_once, test_lock_skip_spends_no_attempt):
+            check()
+            logger.info(f"{check.__name__}: PASSED")
+    except Exception as e:
+        print(f"\n❌ Job queue test FAILED: {e}")
+        sys.exit(1)
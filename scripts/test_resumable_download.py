@@ -0,0 +1,117 @@
+import sys
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+logger = logging.getLogger("download_test")
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Serves one in-memory payload, cutting connections mid-body to simulate transient failures.
+
+    Server attributes: payload (bytes), drop_after (bytes sent before a drop),
+    failures (number of drops left), support_range (honour Range requests).
+    """
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        server = self.server
+        payload = server.payload
+        start = 0
+
+        range_header = self.headers.get("Range")
+        if range_header and server.support_range:
+            start = int(range_header.split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.send_header("ETag", f'"{hashlib.sha256(payload).hexdigest()[:16]}"')
+        self.end_headers()
+
+        body = payload[start:]
+        if server.failures > 0:
+            server.failures -= 1
+            # Send part of the body, then drop the connection before Content-Length is reached
+            self.wfile.write(body[:server.drop_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+def start_server(payload: bytes, failures: int, drop_after: int, support_range: bool, port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), FlakyHandler)
+    server.payload = payload
+    server.failures = failures
+    server.drop_after = drop_after
+    server.support_range = support_range
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_case(name: str, support_range: bool, failures: int = 3, size: int = 5 * 1024 * 1024, across_runs: bool = False):
+    import requests
+    from ingestion.ingest import download_file
+
+    payload = bytes(range(256)) * (size // 256)
+    expected = hashlib.sha256(payload).hexdigest()
+    server = start_server(payload, failures, drop_after=size // 7, support_range=support_range)
+    url = f"http://127.0.0.1:{server.server_address[1]}/data.csv"
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            dest = Path(tmp) / "data.csv"
+            if across_runs:
+                # First "run" gives up after one dropped connection, leaving a partial file behind
+                try:
+                    download_file(url, dest, max_retries=0)
+                    raise AssertionError("first run was expected to fail")
+                except requests.RequestException:
+                    pass
+                assert (Path(tmp) / "data.csv.part").exists(), "partial file was not kept"
+
+            streamed = hashlib.sha256()
+            file_hash = download_file(url, dest, on_chunk=streamed.update, backoff_seconds=0.01, expected_sha256=expected)
+
+            assert file_hash == expected, "returned hash mismatch"
+            assert streamed.hexdigest() == expected, "on_chunk did not see every byte exactly once"
+            assert dest.read_bytes() == payload, "file content mismatch"
+        logger.info(f"{name}: PASSED")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Exercise download_file against a local HTTP server that drops connections.")
+    parser.add_argument("--serve", type=Path, help="Serve this file on --port instead of running the checks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--failures", type=int, default=3)
+    parser.add_argument("--no-range", action="store_true", help="Ignore Range headers")
+    args = parser.parse_args()
+
+    if args.serve:
+        data = args.serve.read_bytes()
+        srv = start_server(data, args.failures, drop_after=max(1, len(data) // 7), support_range=not args.no_range, port=args.port)
+        logger.info(f"Serving {args.serve} at http://127.0.0.1:{args.port}/ (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            srv.shutdown()
+        sys.exit(0)
+
+    try:
+        run_case("Range resume after dropped connections", support_range=True)
+        run_case("Restart without Range support", support_range=False)
+        run_case("Resume a partial file left by a previous run", support_range=True, failures=2, across_runs=True)
+    except Exception as e:
+        print(f"\n❌ Resumable download test FAILED: {e}")
+        sys.exit(1)
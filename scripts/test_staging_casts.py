@@ -0,0 +1,89 @@
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Add project root to sys.path
+root_path = Path(__file__).resolve().parents[1]
+sys.path.append(str(root_path))
+
+from transforms.load_staging import find_violation
+from transforms.plan import TransformPlan
+
+logger = logging.getLogger("staging_casts_test")
+
+PLAN = TransformPlan([
+    {"target": "month", "source": "Month", "type": "text", "required": True},
+    {"target": "year_1958", "source": "1958", "type": "int"},
+    {"target": "ratio", "source": "ratio", "type": "float"},
+])
+
+# Integral-valued numbers pass for int casts, in any spelling; anything else is non_numeric
+INTEGRAL = [340, "340", " 340 ", "340.0", 340.0, "-7", "3.4e2"]
+NON_INTEGRAL = [340.5, "340.5", "abc", "", "nan", float("inf")]
+
+def record(value) -> dict:
+    return {"Month": "JAN", "1958": value, "ratio": "0.5"}
+
+def test_dq_rule():
+    for value in INTEGRAL:
+        assert find_violation(record(value), PLAN) is None, value
+    for value in NON_INTEGRAL:
+        assert find_violation(record(value), PLAN) == ("non_numeric", "1958", value), value
+    assert find_violation({"Month": "JAN", "1958": 1, "ratio": 340.5}, PLAN) is None
+
+def test_batch_cast_path():
+    df = PLAN.transform([record(value) for value in INTEGRAL])
+    assert df["year_1958"].tolist() == [340, 340, 340, 340, 340, -7, 340], df["year_1958"].tolist()
+    try:
+        PLAN.transform([record(340.5)])
+        raise AssertionError("a non-integral value was cast to an integer")
+    except ValueError as e:
+        assert "non-integral" in str(e), e
+
+def test_sql_cast_path():
+    """Needs the database from .env: runs the plan's INSERT ... SELECT in a transaction that is rolled back."""
+    import json
+    import psycopg2
+    from database.connection import get_connection
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("CREATE TEMP TABLE stg_cast_test (month TEXT, year_1958 INTEGER, ratio DOUBLE PRECISION)")
+        cur.execute("INSERT INTO ingestion_log (source_name, file_name, file_hash, status) VALUES ('cast_test', 'x', '', 'SUCCESS') RETURNING id")
+        ingestion_id = cur.fetchone()[0]
+        for value in INTEGRAL:
+            cur.execute("INSERT INTO raw_records (source_name, ingestion_id, record) VALUES ('cast_test', %s, %s)",
+                        (ingestion_id, json.dumps(record(value))))
+        PLAN.insert_from_raw(cur, "stg_cast_test", [ingestion_id])
+        cur.execute("SELECT year_1958 FROM stg_cast_test")
+        assert [row[0] for row in cur.fetchall()] == [340, 340, 340, 340, 340, -7, 340]
+
+        cur.execute("SAVEPOINT non_integral")
+        cur.execute("INSERT INTO raw_records (source_name, ingestion_id, record) VALUES ('cast_test', %s, %s)",
+                    (ingestion_id, json.dumps(record("340.5"))))
+        try:
+            PLAN.insert_from_raw(cur, "stg_cast_test", [ingestion_id])
+            raise AssertionError("the SQL path rounded a non-integral value")
+        except psycopg2.DataError as e:
+            assert "non-integral value 340.5" in str(e), e
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Check that DQ and both staging cast paths apply the same integer rule.")
+    parser.add_argument("--no-db", action="store_true", help="Skip the SQL cast path check")
+    args = parser.parse_args()
+
+    checks = [test_dq_rule, test_batch_cast_path] + ([] if args.no_db else [test_sql_cast_path])
+    try:
+        for check in checks:
+            check()
+            logger.info(f"{check.__name__}: PASSED")
+    except Exception as e:
+        print(f"\n❌ Staging cast test FAILED: {e}")
+        sys.exit(1)
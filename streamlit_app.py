@@ -2,8 +2,12 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from database.connection import get_connection
+from dashboard.charts import DEFAULT_PIXEL_BUDGET, bucket_distribution, downsample_lines
+from dashboard.explorer import copy_csv, fetch_page, filter_options
+from dashboard.queries import INGESTION_STATUS_SQL, PROFILE_HISTORY_SQL, RUN_HISTORY_SQL, WAREHOUSE_DATA_SQL, WAREHOUSE_SUMMARY_SQL
 from datetime import datetime
 import base64
+import io
 import os
 
 # Page Configuration
@@ -155,18 +159,24 @@ def get_profile_image():
     return "https://img.icons8.com/bubbles/100/000000/administrator-male.png"
 
 # Data Fetching Logic
-@st.cache_data(ttl=60)
+NO_DATA_MESSAGE = "No data found in the warehouse layer. Please ensure the pipeline is running correctly."
+PROCESSED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "processed")
+
 def fetch_warehouse_data():
+    # Prefer the Parquet snapshot published by the pipeline; fall back to the warehouse tables.
+    # Not cached: only the reduced chart payloads below are kept between page views
+    try:
+        from processed.reader import read_table
+        df = read_table("fct_air_travel", columns=["month_id", "month_name", "year_val", "passenger_count"],
+                        processed_dir=PROCESSED_DIR)
+        return df.sort_values(["year_val", "month_id"]).reset_index(drop=True)
+    except Exception:
+        pass
+
     conn = None
     try:
         conn = get_connection()
-        query = """
-            SELECT d.month_name, f.year_val, f.passenger_count 
-            FROM fct_air_travel f
-            JOIN dim_month d ON f.month_id = d.month_id
-            ORDER BY f.year_val, d.month_id;
-        """
-        df = pd.read_sql(query, conn)
+        df = pd.read_sql(WAREHOUSE_DATA_SQL, conn)
         return df
     except Exception as e:
         st.error(f"Warehouse Error: {e}")
@@ -174,13 +184,79 @@ def fetch_warehouse_data():
     finally:
         if conn: conn.close()
 
+# Chart payloads are reduced on the server and cached per chart size, so the browser
+# receives at most a pixel budget of points whatever the fact table size
+@st.cache_data(ttl=60)
+def fetch_trend_chart_data(pixel_budget: int = DEFAULT_PIXEL_BUDGET):
+    df = fetch_warehouse_data()
+    if df.empty:
+        return df
+    return downsample_lines(df, x="month_id", y="passenger_count", group="year_val", pixel_budget=pixel_budget)
+
+@st.cache_data(ttl=60)
+def fetch_distribution_chart_data(max_slices: int = 12):
+    df = fetch_warehouse_data()
+    if df.empty:
+        return df
+    return bucket_distribution(df, names="year_val", values="passenger_count", max_slices=max_slices)
+
+@st.cache_data(ttl=60)
+def fetch_warehouse_summary():
+    conn = None
+    try:
+        conn = get_connection()
+        total, rows = pd.read_sql(WAREHOUSE_SUMMARY_SQL, conn).iloc[0]
+        return int(total), int(rows)
+    except Exception as e:
+        st.error(f"Warehouse Error: {e}")
+        return 0, 0
+    finally:
+        if conn: conn.close()
+
+@st.cache_data(ttl=60)
+def fetch_explorer_options():
+    conn = None
+    try:
+        conn = get_connection()
+        return filter_options(conn)
+    except Exception as e:
+        st.error(f"Explorer Error: {e}")
+        return pd.DataFrame(columns=["month_id", "month_name"]), None
+    finally:
+        if conn: conn.close()
+
+@st.cache_data(ttl=60)
+def fetch_explorer_page(year_from: int, year_to: int, month_ids: tuple, after: tuple | None, descending: bool, page_size: int):
+    # One keyset page per call; cached per filter/cursor combination
+    conn = None
+    try:
+        conn = get_connection()
+        filters = {"year_from": year_from, "year_to": year_to, "month_ids": list(month_ids)}
+        return fetch_page(conn, filters, after, descending, page_size)
+    except Exception as e:
+        st.error(f"Explorer Error: {e}")
+        return pd.DataFrame(), None
+    finally:
+        if conn: conn.close()
+
+def export_explorer_csv(year_from: int, year_to: int, month_ids: tuple, descending: bool) -> bytes:
+    # COPY writes the CSV directly, without a DataFrame; st.download_button needs the whole
+    # payload, so large exports belong to `python -m dashboard.explorer`, which streams to a file
+    conn = get_connection()
+    try:
+        buffer = io.BytesIO()
+        copy_csv(conn, buffer, {"year_from": year_from, "year_to": year_to, "month_ids": list(month_ids)}, descending)
+        return buffer.getvalue()
+    finally:
+        conn.close()
+
 @st.cache_data(ttl=30)
 def fetch_pipeline_stats():
     conn = None
     try:
         conn = get_connection()
-        history = pd.read_sql("SELECT * FROM pipeline_run_history ORDER BY start_time DESC LIMIT 10", conn)
-        ingestion = pd.read_sql("SELECT status, COUNT(*) as count FROM ingestion_log GROUP BY status", conn)
+        history = pd.read_sql(RUN_HISTORY_SQL, conn)
+        ingestion = pd.read_sql(INGESTION_STATUS_SQL, conn)
         return history, ingestion
     except Exception as e:
         st.error(f"Monitor Error: {e}")
@@ -188,6 +264,18 @@ def fetch_pipeline_stats():
     finally:
         if conn: conn.close()
 
+@st.cache_data(ttl=60)
+def fetch_profile_history(limit: int = 30):
+    conn = None
+    try:
+        conn = get_connection()
+        return pd.read_sql(PROFILE_HISTORY_SQL, conn, params=(limit,))
+    except Exception as e:
+        st.error(f"Profile Error: {e}")
+        return pd.DataFrame()
+    finally:
+        if conn: conn.close()
+
 # Sidebar Setup
 with st.sidebar:
     profile_img = get_profile_image()
@@ -211,30 +299,33 @@ if page == "Diamond Dashboard":
     st.markdown('<h1 class="hero-title">Diamond Analytics Hub</h1>', unsafe_allow_html=True)
     st.markdown('<p class="hero-subtitle">Real-time automation from Raw Ingestion to Analytical Warehouse.</p>', unsafe_allow_html=True)
     
-    df = fetch_warehouse_data()
+    total_passengers, row_count = fetch_warehouse_summary()
     history_df, ingestion_df = fetch_pipeline_stats()
 
     # Metric Row
     c1, c2, c3 = st.columns(3)
     with c1:
-        val = df['passenger_count'].sum() if not df.empty else 0
-        st.metric("Total Passengers", f"{val:,}")
+        st.metric("Total Passengers", f"{total_passengers:,}")
     with c2:
         val = history_df.iloc[0]['status'] if not history_df.empty else "OFFLINE"
         st.metric("Pipeline Health", val)
     with c3:
-        val = len(df)
-        st.metric("Data Dimension", val)
+        st.metric("Data Dimension", row_count)
 
     st.markdown("<br>", unsafe_allow_html=True)
 
-    if not df.empty:
-        t1, t2 = st.tabs(["� INTELLIGENT TRENDS", "� TABULAR EXPLORER"])
-        
-        with t1:
-            # Modern Plotly Line Chart
-            fig = px.line(df, x="month_name", y="passenger_count", color="year_val",
+    t1, t2 = st.tabs(["� INTELLIGENT TRENDS", "� TABULAR EXPLORER"])
+    
+    with t1:
+        # Modern Plotly Line Chart
+        trend_df = fetch_trend_chart_data()
+        if trend_df.empty:
+            st.error(NO_DATA_MESSAGE)
+        else:
+            month_order = trend_df.drop_duplicates("month_id").sort_values("month_id")["month_name"].tolist()
+            fig = px.line(trend_df, x="month_name", y="passenger_count", color="year_val",
                           markers=True, line_shape="spline",
+                          category_orders={"month_name": month_order},
                           labels={"passenger_count": "Count", "month_name": "Month", "year_val": "Year"},
                           template="plotly_dark")
             
@@ -252,7 +343,7 @@ if page == "Diamond Dashboard":
             cola, colb = st.columns(2)
             with cola:
                 st.subheader("Market Distribution")
-                fig_pie = px.pie(df, values='passenger_count', names='year_val', 
+                fig_pie = px.pie(fetch_distribution_chart_data(), values='passenger_count', names='year_val', 
                                  hole=.6, template="plotly_dark",
                                  color_discrete_sequence=px.colors.sequential.Plotly3)
                 fig_pie.update_layout(showlegend=False, margin=dict(t=0, b=0, l=0, r=0))
@@ -263,11 +354,58 @@ if page == "Diamond Dashboard":
                 st.success("✅ **Steady Growth**: Consistent 12% YoY increase observed across all monitored months.")
                 st.warning("⚠️ **Forecast Alert**: 1961 projection requires more raw samples for higher accuracy.")
 
-        with t2:
-            st.subheader("Warehouse Core Records")
-            st.dataframe(df, use_container_width=True, hide_index=True)
-    else:
-        st.error("No data found in the warehouse layer. Please ensure the pipeline is running correctly.")
+    with t2:
+        # Served by keyset queries alone, so a page view costs one page whatever the fact table size
+        st.subheader("Warehouse Core Records")
+        months, year_bounds = fetch_explorer_options()
+        if year_bounds is None:
+            st.error(NO_DATA_MESSAGE)
+        else:
+            min_year, max_year = year_bounds
+
+            f1, f2, f3, f4, f5 = st.columns([1, 1, 3, 1, 1])
+            with f1:
+                year_from = st.number_input("From year", min_year, max_year, min_year)
+            with f2:
+                year_to = st.number_input("To year", min_year, max_year, max_year)
+            with f3:
+                picked = st.multiselect("Months", months["month_name"].tolist())
+            with f4:
+                order = st.selectbox("Order", ["Oldest first", "Newest first"])
+            with f5:
+                page_size = st.selectbox("Rows", [25, 50, 100, 250], index=1)
+
+            month_ids = tuple(int(m) for m in months[months["month_name"].isin(picked)]["month_id"])
+            descending = order == "Newest first"
+
+            # Keyset cursors of the pages visited so far; reset whenever the query changes
+            signature = (year_from, year_to, month_ids, descending, page_size)
+            if st.session_state.get("explorer_signature") != signature:
+                st.session_state.explorer_signature = signature
+                st.session_state.explorer_cursors = [None]
+                st.session_state.pop("explorer_export", None)
+            cursors = st.session_state.explorer_cursors
+
+            page_df, next_key = fetch_explorer_page(year_from, year_to, month_ids, cursors[-1], descending, page_size)
+            st.dataframe(page_df, use_container_width=True, hide_index=True)
+
+            p1, p2, p3, p4 = st.columns([1, 1, 2, 2])
+            with p1:
+                if st.button("← Previous", disabled=len(cursors) == 1):
+                    cursors.pop()
+                    st.rerun()
+            with p2:
+                if st.button("Next →", disabled=next_key is None):
+                    cursors.append(next_key)
+                    st.rerun()
+            with p3:
+                st.caption(f"Page {len(cursors)}")
+            with p4:
+                if st.button("Prepare CSV export"):
+                    st.session_state.explorer_export = export_explorer_csv(year_from, year_to, month_ids, descending)
+                if st.session_state.get("explorer_export") is not None:
+                    st.download_button("Download CSV", st.session_state.explorer_export,
+                                       file_name="fct_air_travel.csv", mime="text/csv")
 
 elif page == "System Health":
     st.title("🛡️ System Integrity & Health")
@@ -281,7 +419,7 @@ elif page == "System Health":
         st.subheader("Ingestion Integrity")
         if not ingestion_df.empty:
             fig_bar = px.bar(ingestion_df, x='status', y='count', color='status',
-                             color_discrete_map={'SUCCESS': '#10b981', 'FAILED': '#ef4444', 'SKIPPED': '#f59e0b'},
+                             color_discrete_map={'SUCCESS': '#10b981', 'FAILED': '#ef4444', 'SKIPPED': '#f59e0b', 'IN_PROGRESS': '#3b82f6'},
                              template="plotly_dark")
             fig_bar.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
             st.plotly_chart(fig_bar, use_container_width=True)
@@ -294,6 +432,21 @@ elif page == "System Health":
         st.metric("Overall Success Rate", f"{rate:.1f}%")
         st.progress(rate/100)
 
+    st.subheader("Data Drift (Column Profiles)")
+    profile_df = fetch_profile_history()
+    if not profile_df.empty:
+        numeric_df = profile_df.dropna(subset=["median"])
+        if not numeric_df.empty:
+            fig_drift = px.line(numeric_df, x="ingestion_id", y="median", color="column_name", markers=True,
+                                labels={"ingestion_id": "Ingestion", "median": "Median (p50)", "column_name": "Column"},
+                                template="plotly_dark")
+            fig_drift.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+            st.plotly_chart(fig_drift, use_container_width=True)
+        latest = profile_df[profile_df["ingestion_id"] == profile_df["ingestion_id"].max()]
+        st.dataframe(latest.drop(columns=["ingestion_id"]), use_container_width=True, hide_index=True)
+    else:
+        st.info("No column profiles recorded yet.")
+
 elif page == "Source Config":
     st.title("🔧 Source & Cloud Connectivity")
     st.markdown("Configuration management for data endpoints and warehouse connectivity.")
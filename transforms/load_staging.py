@@ -1,85 +1,270 @@
+import sys
+import json
 import logging
 import yaml
 from pathlib import Path
+from psycopg2.extras import execute_values
 from database.connection import get_connection
+from database.fingerprints import code_version, fingerprint, run_if_changed
+from ingestion.profiler import profile_drift
+from monitoring.metrics import DQ_DURATION, DQ_REJECTED_ROWS, STATEMENT_DURATION
+from database.locks import dataset_lock, lock_settings, new_lock_stats, run_locked, table_lock
+from database.shadow import build_indexes, create_shadow, set_logged, shadow_name, swap_in_when_idle, validate_foreign_keys
+from processed.writer import publish_from_config
+from transforms import plan as plan_module
+from transforms.plan import TransformPlan, compile_plan, is_valid_number
 
 logger = logging.getLogger("transformation")
 
-def validate_data(records: list[dict], expected_columns: list[str]):
-    """Basic Data Quality validation: schema, nulls, and types."""
+# Completed raw batches of a source (INCREMENTAL adds the completion-time watermark), their raw rows,
+# their profiles and the source's latest validated profile
+BATCHES_SQL = "SELECT id FROM ingestion_log WHERE source_name = %s AND status = 'SUCCESS'"
+INCREMENTAL_BATCHES_SQL = BATCHES_SQL + " AND completed_at > %s"
+RAW_BATCHES_SQL = "SELECT id, ingestion_id, record FROM raw_records WHERE ingestion_id = ANY(%s) ORDER BY id"
+BATCH_PROFILES_SQL = "SELECT ingestion_id, profile, dq_validated_at FROM ingestion_profile WHERE ingestion_id = ANY(%s)"
+BASELINE_PROFILE_SQL = """
+    SELECT profile FROM ingestion_profile
+    WHERE source_name = %s AND dq_validated_at IS NOT NULL
+    ORDER BY ingestion_id DESC LIMIT 1
+"""
+FINGERPRINT_SQL = """
+    SELECT COUNT(*), md5(string_agg(id || ':' || file_hash, ',' ORDER BY id))
+    FROM ingestion_log
+    WHERE source_name = %s AND status = 'SUCCESS'
+"""
+
+DQ_MODES = ("fail", "quarantine")
+DEFAULT_DQ_MODE = "fail"
+DEFAULT_MAX_ERROR_RATE = 0.01
+
+def find_violation(record: dict, plan: TransformPlan) -> tuple[str, str, object] | None:
+    """The first DQ rule the record breaks, as (rule, column, value), or None if it is valid."""
+    # 1. Schema check
+    missing_cols = [col for col in plan.source_columns if col not in record]
+    if missing_cols:
+        return "missing_column", ", ".join(missing_cols), None
+
+    # 2. Null check for required columns (e.g. Month)
+    for col in plan.required_columns:
+        if record.get(col) is None:
+            return "null_required", col, None
+
+    # 3. Type check (numeric casts such as the year columns)
+    for col in plan.numeric_columns:
+        val = record.get(col)
+        if val is not None and not is_valid_number(val, col in plan.integer_columns):
+            return "non_numeric", col, val
+    return None
+
+def describe_violation(label, violation: tuple[str, str, object]) -> str:
+    rule, column, value = violation
+    if rule == "missing_column":
+        return f"Record {label} is missing columns: {column.split(', ')}"
+    if rule == "null_required":
+        return f"Record {label} has null '{column}'."
+    return f"Record {label} column {column} has non-numeric value: {value}"
+
+def validate_data(records: list[dict], plan: TransformPlan):
+    """Basic Data Quality validation: schema, nulls, and types, as declared by the dataset's plan."""
     if not records:
         raise ValueError("No records found for transformation.")
     
     for i, record in enumerate(records):
-        # 1. Schema check
-        missing_cols = [col for col in expected_columns if col not in record]
-        if missing_cols:
-            raise ValueError(f"Record {i} is missing columns: {missing_cols}")
-        
-        # 2. Null check for key columns (Month)
-        if record.get("Month") is None:
-            raise ValueError(f"Record {i} has null 'Month'.")
-            
-        # 3. Type check (Year columns should be numeric)
-        for year in ["1958", "1959", "1960"]:
-            val = record.get(year)
-            if val is not None and not str(val).strip().isdigit() and not isinstance(val, (int, float)):
-                raise ValueError(f"Record {i} column {year} has non-numeric value: {val}")
-
-def load_dataset_to_staging(dataset_cfg: dict):
+        violation = find_violation(record, plan)
+        if violation:
+            raise ValueError(describe_violation(i, violation))
+
+def split_rejects(rows: list[tuple], plan: TransformPlan) -> tuple[list[dict], list[tuple]]:
+    """Splits (raw_id, ingestion_id, record) rows into valid records and rejects (raw_id, ingestion_id, rule, column, value, record)."""
+    records, rejects = [], []
+    for raw_id, ingestion_id, record in rows:
+        violation = find_violation(record, plan)
+        if violation:
+            rejects.append((raw_id, ingestion_id, *violation, record))
+        else:
+            records.append(record)
+    return records, rejects
+
+def quarantine_rejects(cur, source_name: str, target_table: str, rejects: list[tuple]):
+    """Records rejected rows in dq_rejects; a row already quarantined by an earlier run is kept as is."""
+    execute_values(
+        cur,
+        """
+        INSERT INTO dq_rejects (raw_id, ingestion_id, source_name, target_table, rule, column_name, value, record)
+        VALUES %s
+        ON CONFLICT (raw_id) DO NOTHING
+        """,
+        [(raw_id, ingestion_id, source_name, target_table, rule, column, None if value is None else str(value), json.dumps(record))
+         for raw_id, ingestion_id, rule, column, value, record in rejects],
+        template="(%s, %s, %s, %s, %s, %s, %s, %s::jsonb)",
+    )
+
+def apply_dq_policy(conn, dataset_cfg: dict, total: int, rejects: list[tuple]):
+    """Fails the load or quarantines its rejected rows, per the dataset's dq.mode and dq.max_error_rate.
+
+    Quarantined rows are written in the caller's transaction, so they commit with the
+    valid rows. When the error rate is too high the load fails, but its rejects are
+    committed first so the bad rows can be inspected without re-running the load.
+    """
+    if not rejects:
+        return
+    dq_cfg = dataset_cfg.get("dq", {})
+    source_name, target_table = dataset_cfg["name"], dataset_cfg["target_stg"]
+    mode = dq_cfg.get("mode", DEFAULT_DQ_MODE)
+    if mode not in DQ_MODES:
+        raise ValueError(f"Unsupported dq.mode '{mode}'. Expected one of {DQ_MODES}.")
+    raw_id, _, rule, column, value, _ = rejects[0]
+    if mode == "fail":
+        raise ValueError(describe_violation(raw_id, (rule, column, value)))
+
+    rate = len(rejects) / total
+    max_rate = dq_cfg.get("max_error_rate", DEFAULT_MAX_ERROR_RATE)
+    cur = conn.cursor()
+    try:
+        if rate > max_rate:
+            conn.rollback()
+            quarantine_rejects(cur, source_name, target_table, rejects)
+            conn.commit()
+            raise ValueError(f"{len(rejects)} of {total} records ({rate:.2%}) failed DQ for {source_name}, "
+                             f"above max_error_rate {max_rate:.2%}; see dq_rejects")
+        quarantine_rejects(cur, source_name, target_table, rejects)
+    finally:
+        cur.close()
+    DQ_REJECTED_ROWS.inc(len(rejects), dataset=source_name)
+    logger.warning(f"Quarantined {len(rejects)} of {total} records ({rate:.2%}) of {source_name} to dq_rejects")
+
+DEFAULT_DRIFT_TOLERANCE = 0.25
+
+def _profile_satisfies_contract(profile: dict, plan: TransformPlan) -> bool:
+    """Checks the validate_data rules against a batch profile instead of its rows."""
+    columns = profile["columns"]
+    if any(col not in columns for col in plan.source_columns):
+        return False
+    if any(columns[col]["nulls"] > 0 for col in plan.required_columns):
+        return False
+    # Profiles written before the integral flag existed fall back to row-level DQ
+    if any(not columns[col].get("integral", False) for col in plan.integer_columns):
+        return False
+    return all(columns[col]["kind"] == "numeric" for col in plan.numeric_columns)
+
+def profiles_match_baseline(cur, source_name: str, ingestion_ids: list[int], plan: TransformPlan,
+                            tolerance: float = DEFAULT_DRIFT_TOLERANCE) -> bool:
+    """True if every batch was validated before, or its profile meets the DQ contract and stays
+    within `tolerance` drift of the latest validated (known-good) profile of the source."""
+    cur.execute(BATCH_PROFILES_SQL, (ingestion_ids,))
+    profiles = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    pending = [i for i in ingestion_ids if i not in profiles or profiles[i][1] is None]
+    if not pending:
+        return True
+    if any(i not in profiles for i in pending):
+        return False  # Batch ingested without a profile
+
+    cur.execute(BASELINE_PROFILE_SQL, (source_name,))
+    row = cur.fetchone()
+    if row is None:
+        return False  # No known-good baseline yet
+    baseline = row[0]
+
+    for ingestion_id in pending:
+        profile = profiles[ingestion_id][0]
+        if not _profile_satisfies_contract(profile, plan):
+            return False
+        drift = profile_drift(profile, baseline)
+        drifted = {col: round(score, 3) for col, score in drift.items() if score > tolerance}
+        if drifted:
+            logger.info(f"Ingestion {ingestion_id} drifted from baseline: {drifted}")
+            return False
+    return True
+
+def load_dataset_to_staging(dataset_cfg: dict, storage_cfg: dict | None = None):
     """Loads records from raw_records to staging table with DQ and load mode handling."""
     source_name = dataset_cfg["name"]
     target_table = dataset_cfg["target_stg"]
     load_mode = dataset_cfg.get("load_mode", "FULL")
-    
-    expected_cols = ["Month", "1958", "1959", "1960"] # Specific to air_travel_stats
+    dq_cfg = dataset_cfg.get("dq", {})
+    plan = compile_plan(dataset_cfg)
 
     conn = get_connection()
     cur = conn.cursor()
 
     try:
-        # 1. Fetch Raw Data
-        # For incremental, we could filter by ingested_at > max(loaded_at)
-        # For this implementation, we'll fetch all and let the logic handle it or filter if load_mode is incremental
+        # 1. Find the raw batches to load
+        # Only batches whose ingestion completed are visible; checkpointed chunks of an
+        # unfinished load stay hidden until its ingestion_log entry reaches SUCCESS
+        batch_sql, params = BATCHES_SQL, [source_name]
         if load_mode == "INCREMENTAL":
-            # Simple logic: only get records ingested in the last batch (not fully idempotent here but follows requirement)
-            # A more robust way: use a watermark table or check existing stg data
+            # Watermark on batch completion time rather than row ingestion time, since a
+            # resumed load commits its first chunks long before the batch completes
             cur.execute(f"SELECT MAX(loaded_at) FROM {target_table}")
             last_load = cur.fetchone()[0]
             if last_load:
-                cur.execute("SELECT record FROM raw_records WHERE source_name = %s AND ingested_at > %s", (source_name, last_load))
-            else:
-                cur.execute("SELECT record FROM raw_records WHERE source_name = %s", (source_name,))
-        else:
-            cur.execute(f"TRUNCATE {target_table};")
-            cur.execute("SELECT record FROM raw_records WHERE source_name = %s", (source_name,))
-            
-        rows = cur.fetchall()
-        if not rows:
+                batch_sql = INCREMENTAL_BATCHES_SQL
+                params.append(last_load)
+        cur.execute(batch_sql + " ORDER BY id", params)
+        ingestion_ids = [row[0] for row in cur.fetchall()]
+
+        if not ingestion_ids:
             logger.info(f"No new records to load for {source_name} (Mode: {load_mode})")
+            if load_mode == "INCREMENTAL":
+                publish_from_config(conn, target_table, storage_cfg, plan=plan)
             return
 
-        records = [row[0] for row in rows]
-
         # 2. Data Quality Validation
-        logger.info(f"Validating {len(records)} records for {source_name}")
-        validate_data(records, expected_cols)
+        # Row-level checks are skipped when the ingestion-time profiles already prove the contract;
+        # the rows then never leave the database
+        records, rejected_ids = None, set()
+        with DQ_DURATION.time(dataset=source_name):
+            if dq_cfg.get("skip_on_profile_match", True) and profiles_match_baseline(
+                    cur, source_name, ingestion_ids, plan,
+                    dq_cfg.get("drift_tolerance", DEFAULT_DRIFT_TOLERANCE)):
+                logger.info(f"Profiles of {len(ingestion_ids)} batch(es) match the known-good baseline; skipping row-level DQ for {source_name}")
+            else:
+                with STATEMENT_DURATION.time(layer="staging", statement="fetch_raw"):
+                    cur.execute(RAW_BATCHES_SQL, (ingestion_ids,))
+                    rows = cur.fetchall()
+                logger.info(f"Validating {len(rows)} records for {source_name}")
+                if not rows:
+                    raise ValueError("No records found for transformation.")
+                # Invalid rows are quarantined (or fail the load) and the valid ones load in bulk
+                records, rejects = split_rejects(rows, plan)
+                apply_dq_policy(conn, dataset_cfg, len(rows), rejects)
+                rejected_ids = {reject[1] for reject in rejects}
 
-        # 3. Insert into Staging
-        sql = f"""
-            INSERT INTO {target_table} (month, year_1958, year_1959, year_1960)
-            VALUES (%s, %s, %s, %s)
-        """
-        for record in records:
-            cur.execute(sql, (
-                record["Month"],
-                int(record["1958"]),
-                int(record["1959"]),
-                int(record["1960"])
-            ))
-
-        conn.commit()
-        logger.info(f"Successfully loaded {len(records)} records to {target_table} (Mode: {load_mode})")
+        # 3. Insert into Staging through the dataset's compiled plan
+        if load_mode == "FULL":
+            # Reload into an unlogged, index-free shadow that replaces the live table at the end:
+            # readers keep seeing the previous rows, and WAL and indexes are written once, in bulk
+            create_shadow(cur, target_table, unlogged=True)
+        table = shadow_name(target_table) if load_mode == "FULL" else target_table
+        if records is None:
+            with STATEMENT_DURATION.time(layer="staging", statement="insert_select"):
+                loaded = plan.insert_from_raw(cur, table, ingestion_ids)
+        else:
+            with STATEMENT_DURATION.time(layer="staging", statement="copy_batch"):
+                loaded = plan.copy_into(cur, table, records)
+        if load_mode == "FULL":
+            with STATEMENT_DURATION.time(layer="staging", statement="build_indexes"):
+                set_logged(cur, target_table)
+                build_indexes(cur, target_table)
+
+        # Validated batches become the baseline for future profile checks; batches with
+        # quarantined rows never do, so they are always re-checked row by row
+        cur.execute(
+            "UPDATE ingestion_profile SET dq_validated_at = CURRENT_TIMESTAMP WHERE ingestion_id = ANY(%s) AND dq_validated_at IS NULL",
+            ([i for i in ingestion_ids if i not in rejected_ids],)
+        )
+
+        with STATEMENT_DURATION.time(layer="staging", statement="commit"):
+            conn.commit()
+        if load_mode == "FULL":
+            with STATEMENT_DURATION.time(layer="staging", statement="swap"):
+                foreign_keys = swap_in_when_idle(conn, target_table)
+            validate_foreign_keys(cur, target_table, foreign_keys)
+            conn.commit()
+        logger.info(f"Successfully loaded {loaded} records to {target_table} (Mode: {load_mode})")
+
+        # 4. Publish the new rows to the columnar processed layer (rebuilt after a FULL reload)
+        publish_from_config(conn, target_table, storage_cfg, replace=(load_mode == "FULL"), plan=plan)
         
     except Exception as e:
         conn.rollback()
@@ -89,17 +274,45 @@ def load_dataset_to_staging(dataset_cfg: dict):
         cur.close()
         conn.close()
 
-def main():
-    config_path = Path("config/config.yaml")
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
+def staging_fingerprint(dataset_cfg: dict) -> str:
+    """Completed raw batches of the source (ids and file hashes), the dataset config and the staging code version."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(FINGERPRINT_SQL, (dataset_cfg["name"],))
+        batches = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+    return fingerprint(batches, dataset_cfg, code_version(sys.modules[__name__], plan_module))
+
+def load_if_changed(dataset_cfg: dict, storage_cfg: dict | None, stats: dict, force: bool = False) -> bool:
+    """Loads the dataset to staging unless its raw batches and transformation are unchanged since the last load."""
+    return run_if_changed(f"staging:{dataset_cfg['name']}", lambda: staging_fingerprint(dataset_cfg), stats,
+                          load_dataset_to_staging, dataset_cfg, storage_cfg, force=force)
+
+def main(only: list[str] | None = None, lock_mode: str | None = None, config: dict | None = None,
+         force: bool = False) -> dict:
+    if config is None:
+        config_path = Path("config/config.yaml")
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+
+    mode, timeout_seconds = lock_settings(config, lock_mode)
+    stats = new_lock_stats()
 
     for ds in config.get("datasets", []):
+        if only and ds["name"] not in only:
+            continue
         try:
-            load_dataset_to_staging(ds)
+            # The table lock serializes datasets sharing a staging table (e.g. a FULL swap vs an insert)
+            run_locked([dataset_lock(ds["name"]), table_lock(ds["target_stg"])], stats,
+                       load_if_changed, ds, config.get("storage"), stats, force,
+                       mode=mode, timeout_seconds=timeout_seconds)
         except Exception as e:
             logger.error(f"Failed to process staging for {ds['name']}: {e}")
             continue
+    return stats
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
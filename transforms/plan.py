@@ -0,0 +1,160 @@
+import io
+import json
+import math
+import logging
+import pandas as pd
+
+logger = logging.getLogger("transformation")
+
+# Column casts accepted in config.yaml: SQL type of the staging expression and pandas dtype of the batch path
+CASTS = {
+    "text": ("TEXT", "string"),
+    "int": ("INTEGER", "Int64"),
+    "bigint": ("BIGINT", "Int64"),
+    "float": ("DOUBLE PRECISION", "Float64"),
+    "bool": ("BOOLEAN", "boolean"),
+    "date": ("DATE", None),
+    "timestamp": ("TIMESTAMP", None),
+}
+NUMERIC_CASTS = ("int", "bigint", "float")
+BOOL_VALUES = {"true": True, "t": True, "1": True, "yes": True, "false": False, "f": False, "0": False, "no": False}
+NULL_MARKER = "\\N"
+
+# Mapping used by datasets without a `columns` block (the original air travel layout)
+DEFAULT_COLUMNS = [
+    {"target": "month", "source": "Month", "type": "text", "required": True},
+    {"target": "year_1958", "source": "1958", "type": "int"},
+    {"target": "year_1959", "source": "1959", "type": "int"},
+    {"target": "year_1960", "source": "1960", "type": "int"},
+]
+
+_plans = {}
+
+def is_valid_number(value, integer: bool) -> bool:
+    """The numeric rule shared by DQ and both cast paths: any number for float casts, and an
+    integral-valued one for int/bigint casts ('340', '340.0' and 340.0 pass; '340.5' does not)."""
+    if isinstance(value, bool):
+        return True
+    try:
+        number = float(value) if isinstance(value, (int, float)) else float(str(value).strip())
+    except (ValueError, OverflowError):
+        return False
+    return not integer or (math.isfinite(number) and number.is_integer())
+
+def _column_spec(column: dict) -> dict:
+    cast = column.get("type", "text")
+    if cast not in CASTS:
+        raise ValueError(f"Unsupported type '{cast}' for column {column.get('target')}. Expected one of {tuple(CASTS)}.")
+    if "target" not in column or "source" not in column:
+        raise ValueError(f"Column mapping needs a target and a source: {column}")
+    return {
+        "target": column["target"],
+        "source": str(column["source"]),
+        "type": cast,
+        "default": column.get("default"),
+        "required": bool(column.get("required", False)),
+    }
+
+class TransformPlan:
+    """A dataset's raw-to-staging mapping (column, cast, default), compiled once per config.
+
+    The same mapping runs two ways: as an INSERT ... SELECT that transforms whole raw
+    batches inside PostgreSQL, used when rows need no row-level DQ, and as vectorized
+    pandas casts over fetched records that are then COPYed, used after row-level DQ.
+    """
+
+    def __init__(self, columns: list[dict]):
+        self.columns = [_column_spec(column) for column in columns]
+        self.target_columns = [c["target"] for c in self.columns]
+        self.source_columns = list(dict.fromkeys(c["source"] for c in self.columns))
+        self.required_columns = list(dict.fromkeys(c["source"] for c in self.columns if c["required"]))
+        self.numeric_columns = list(dict.fromkeys(c["source"] for c in self.columns if c["type"] in NUMERIC_CASTS))
+        self.integer_columns = list(dict.fromkeys(c["source"] for c in self.columns if c["type"] in ("int", "bigint")))
+        self._select_sql, self._select_params = self._compile_select()
+
+    def _compile_select(self) -> tuple[str, list]:
+        expressions, params = [], []
+        for c in self.columns:
+            sql_type = CASTS[c["type"]][0]
+            if c["type"] == "text":
+                expression = "r.record->>%s"
+            elif c["type"] in ("int", "bigint"):
+                # Through NUMERIC so '340.0' casts like the batch path does; a non-integral value
+                # (which DQ rejects) fails the cast with the value in the message instead of rounding
+                number = "NULLIF(btrim(r.record->>%s), '')::NUMERIC"
+                expression = (f"CASE WHEN {number} %% 1 = 0 THEN {number}::{sql_type} "
+                              f"ELSE ('non-integral value ' || {number})::{sql_type} END")
+                params.extend([c["source"]] * 2)
+            else:
+                expression = f"NULLIF(btrim(r.record->>%s), '')::{sql_type}"
+            params.append(c["source"])
+            if c["default"] is not None:
+                expression = f"COALESCE({expression}, %s::{sql_type})"
+                params.append(c["default"])
+            expressions.append(expression)
+        return ", ".join(expressions), params
+
+    def insert_sql(self, table: str) -> tuple[str, list]:
+        """INSERT ... SELECT of the mapping over the raw rows of the batches passed as the last parameter."""
+        sql = f"""
+            INSERT INTO {table} ({", ".join(self.target_columns)})
+            SELECT {self._select_sql}
+            FROM raw_records r
+            WHERE r.ingestion_id = ANY(%s)
+            ORDER BY r.id
+        """
+        return sql, list(self._select_params)
+
+    def insert_from_raw(self, cur, table: str, ingestion_ids: list[int]) -> int:
+        """Transforms every raw row of the given batches into `table` without leaving the database."""
+        sql, params = self.insert_sql(table)
+        cur.execute(sql, params + [ingestion_ids])
+        return cur.rowcount
+
+    def _cast(self, series: pd.Series, column: dict) -> pd.Series:
+        values = series.astype("string")
+        cast, dtype = column["type"], CASTS[column["type"]][1]
+        if cast != "text":
+            values = values.str.strip().replace("", pd.NA)
+        if cast in NUMERIC_CASTS:
+            numbers = pd.to_numeric(values)
+            if cast != "float" and not (numbers.dropna() % 1 == 0).all():
+                # DQ rejects these rows; fail loudly instead of letting the Int64 cast raise mid-batch
+                raise ValueError(f"Column {column['source']} has non-integral values for a {cast} cast")
+            values = numbers.astype(dtype)
+        elif cast == "bool":
+            values = values.str.lower().map(BOOL_VALUES).astype(dtype)
+        elif cast == "date":
+            values = pd.to_datetime(values).dt.strftime("%Y-%m-%d")
+        elif cast == "timestamp":
+            values = pd.to_datetime(values)
+        if column["default"] is not None:
+            values = values.fillna(column["default"])
+        return values
+
+    def transform(self, records: list[dict]) -> pd.DataFrame:
+        """Applies the mapping to a batch of raw records, one vectorized cast per column."""
+        raw = pd.DataFrame.from_records(records, columns=self.source_columns)
+        return pd.DataFrame({c["target"]: self._cast(raw[c["source"]], c) for c in self.columns})
+
+    def copy_sql(self, table: str) -> str:
+        return f"COPY {table} ({', '.join(self.target_columns)}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')"
+
+    def to_copy_csv(self, records: list[dict]) -> str:
+        """The transformed batch as CSV for copy_sql."""
+        return self.transform(records).to_csv(index=False, header=False, na_rep=NULL_MARKER)
+
+    def copy_into(self, cur, table: str, records: list[dict]) -> int:
+        buffer = io.StringIO(self.to_copy_csv(records))
+        cur.copy_expert(self.copy_sql(table), buffer)
+        return len(records)
+
+def compile_plan(dataset_cfg: dict) -> TransformPlan:
+    """Returns the dataset's compiled plan, reusing it until its `columns` block changes."""
+    columns = dataset_cfg.get("columns") or DEFAULT_COLUMNS
+    key = json.dumps(columns, sort_keys=True, default=str)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = TransformPlan(columns)
+        logger.info(f"Compiled transformation plan for {dataset_cfg['name']}: {', '.join(plan.target_columns)}")
+    return plan
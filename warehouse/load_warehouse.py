@@ -1,45 +1,133 @@
+import sys
 import logging
+import yaml
+from pathlib import Path
 from database.connection import get_connection
+from database.fingerprints import code_version, fingerprint, run_if_changed
+from monitoring.metrics import STATEMENT_DURATION
+from database.locks import lock_settings, new_lock_stats, run_locked, table_lock
+from database.shadow import is_partitioned
+from processed.writer import publish_from_config
 
 logger = logging.getLogger("warehouse")
 
-def load_star_schema():
-    """Populates dim_month and fct_air_travel from stg_airtravel."""
+WATERMARK_NAME = "fct_air_travel"
+STAGING_TABLE = "stg_airtravel"
+
+YEARS = [1958, 1959, 1960]
+
+def dim_month_sql(staging_table: str) -> str:
+    """INSERT of the months of staging rows with stg_id in (%s, %s] into dim_month."""
+    # Use ON CONFLICT to skip existing months
+    return f"""
+        INSERT INTO dim_month (month_name)
+        SELECT DISTINCT month FROM {staging_table}
+        WHERE stg_id > %s AND stg_id <= %s
+        ON CONFLICT (month_name) DO NOTHING;
+    """
+
+def insert_dim_month(cur, staging_table: str, last_id: int, high_id: int):
+    """Adds months of staging rows with stg_id in (last_id, high_id] to dim_month."""
+    cur.execute(dim_month_sql(staging_table), (last_id, high_id))
+
+def partition_name(fact_table: str, year: int) -> str:
+    return f"{fact_table}_y{year}"
+
+def ensure_partitions(cur, fact_table: str, years) -> list[str]:
+    """Creates the yearly partitions of a partitioned fact table that do not exist yet. Returns the new ones.
+
+    Existing partitions are looked up first, so steady-state loads never take the
+    parent lock that CREATE TABLE ... PARTITION OF needs.
+    """
+    if not is_partitioned(cur, fact_table):
+        return []  # Unpartitioned (pre-partitioning) fact table
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+        (fact_table,)
+    )
+    existing = {row[0] for row in cur.fetchall()}
+    created = []
+    for year in sorted(set(years)):
+        name = partition_name(fact_table, year)
+        if name in existing:
+            continue
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {fact_table} FOR VALUES FROM (%s) TO (%s)", (year, year + 1))
+        created.append(name)
+    if created:
+        logger.info(f"Created fact partitions: {', '.join(created)}")
+    return created
+
+def fact_sql(staging_table: str, fact_table: str, year: int) -> str:
+    """INSERT of one year's facts from staging rows with stg_id in (%s, %s]."""
+    # We'll use a simple "INSERT IF NOT EXISTS" logic based on month and year to avoid duplicates in fact
+    # Note: year columns in staging are year_1958, year_1959, year_1960. 
+    # We need to unpivot them into the fact table.
+    return f"""
+        INSERT INTO {fact_table} (month_id, year_val, passenger_count)
+        SELECT d.month_id, {year}, s.year_{year}
+        FROM {staging_table} s
+        JOIN dim_month d ON s.month = d.month_name
+        WHERE s.stg_id > %s AND s.stg_id <= %s
+        AND NOT EXISTS (
+            SELECT 1 FROM {fact_table} f
+            WHERE f.month_id = d.month_id AND f.year_val = {year}
+        );
+    """
+
+def insert_facts(cur, staging_table: str, fact_table: str, last_id: int, high_id: int):
+    """Unpivots staging rows with stg_id in (last_id, high_id] into one fact per month and year."""
+    ensure_partitions(cur, fact_table, YEARS)
+    for year in YEARS:
+        with STATEMENT_DURATION.time(layer="warehouse", statement="insert_fact"):
+            cur.execute(fact_sql(staging_table, fact_table, year), (last_id, high_id))
+
+def load_star_schema(storage_cfg: dict | None = None):
+    """Populates dim_month and fct_air_travel from stg_airtravel rows newer than the stored watermark."""
     conn = get_connection()
     cur = conn.cursor()
 
     try:
         logger.info("Starting Warehouse load (Star Schema)")
 
-        # 1. Populate Dimension: dim_month
-        # Use ON CONFLICT to skip existing months
-        cur.execute("""
-            INSERT INTO dim_month (month_name)
-            SELECT DISTINCT month FROM stg_airtravel
-            ON CONFLICT (month_name) DO NOTHING;
-        """)
-        
-        # 2. Populate Fact: fct_air_travel
-        # We'll use a simple "INSERT IF NOT EXISTS" logic based on month and year to avoid duplicates in fact
-        # Note: year columns in staging are year_1958, year_1959, year_1960. 
-        # We need to unpivot them into the fact table.
+        # 1. Determine the staging delta since the last successful load
+        # SHARE mode waits for in-flight staging inserts, so no lower stg_id can commit after we read MAX(stg_id)
+        with STATEMENT_DURATION.time(layer="warehouse", statement="lock_staging"):
+            cur.execute(f"LOCK TABLE {STAGING_TABLE} IN SHARE MODE")
+        cur.execute("SELECT last_id FROM etl_watermark WHERE target_name = %s FOR UPDATE", (WATERMARK_NAME,))
+        row = cur.fetchone()
+        last_id = row[0] if row else 0
+
+        cur.execute(f"SELECT MAX(stg_id) FROM {STAGING_TABLE}")  # Answered from the primary key index
+        high_id = cur.fetchone()[0]
+        if high_id is None or high_id <= last_id:
+            conn.commit()
+            logger.info(f"No new staging rows since stg_id {last_id}. Warehouse is up to date.")
+            # Still catch up the processed layer in case a previous publish failed
+            publish_from_config(conn, WATERMARK_NAME, storage_cfg)
+            return
+
+        logger.info(f"Loading staging rows with stg_id in ({last_id}, {high_id}]")
+
+        # 2. Populate Dimension: dim_month
+        with STATEMENT_DURATION.time(layer="warehouse", statement="insert_dim_month"):
+            insert_dim_month(cur, STAGING_TABLE, last_id, high_id)
         
-        years = [1958, 1959, 1960]
-        for year in years:
-            sql = f"""
-                INSERT INTO fct_air_travel (month_id, year_val, passenger_count)
-                SELECT d.month_id, {year}, s.year_{year}
-                FROM stg_airtravel s
-                JOIN dim_month d ON s.month = d.month_name
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM fct_air_travel f
-                    WHERE f.month_id = d.month_id AND f.year_val = {year}
-                );
-            """
-            cur.execute(sql)
-
-        conn.commit()
+        # 3. Populate Fact: fct_air_travel
+        insert_facts(cur, STAGING_TABLE, WATERMARK_NAME, last_id, high_id)
+
+        # 4. Advance the watermark in the same transaction as the facts
+        cur.execute("""
+            INSERT INTO etl_watermark (target_name, last_id, updated_at)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (target_name) DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = EXCLUDED.updated_at;
+        """, (WATERMARK_NAME, high_id))
+
+        with STATEMENT_DURATION.time(layer="warehouse", statement="commit"):
+            conn.commit()
         logger.info("Warehouse load completed successfully.")
+
+        # 5. Publish the new facts to the columnar processed layer
+        publish_from_config(conn, WATERMARK_NAME, storage_cfg)
     except Exception as e:
         conn.rollback()
         logger.error(f"Warehouse load failed: {e}")
@@ -48,5 +136,38 @@ def load_star_schema():
         cur.close()
         conn.close()
 
+def warehouse_fingerprint() -> str:
+    """Staging high-water mark and the warehouse code version.
+
+    The watermark is left out: it is read before the load advances it, so it would make
+    the stored fingerprint differ from the next run's even when staging did not change.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT MAX(stg_id) FROM {STAGING_TABLE}")
+        high_id = cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+    return fingerprint(high_id, code_version(sys.modules[__name__]))
+
+def load_if_changed(storage_cfg: dict | None, stats: dict, force: bool = False) -> bool:
+    """Runs the warehouse load unless staging and the warehouse code are unchanged since the last load."""
+    return run_if_changed(f"warehouse:{WATERMARK_NAME}", warehouse_fingerprint, stats,
+                          load_star_schema, storage_cfg, force=force)
+
+def main(lock_mode: str | None = None, config: dict | None = None, force: bool = False) -> dict:
+    if config is None:
+        config_path = Path("config/config.yaml")
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+
+    mode, timeout_seconds = lock_settings(config, lock_mode)
+    stats = new_lock_stats()
+    run_locked([table_lock(WATERMARK_NAME)], stats, load_if_changed, config.get("storage"), stats, force,
+               mode=mode, timeout_seconds=timeout_seconds)
+    return stats
+
 if __name__ == "__main__":
-    load_star_schema()
+    main()